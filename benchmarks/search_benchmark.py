@@ -0,0 +1,108 @@
+'''Benchmark of the search of songs on a synthetic library.
+
+Compares the full scan of the old lib.util.search (one jaro_winkler_similarity call for every word of every song),
+the bigram SearchIndex on the title and MultiFieldSearchIndex on title, artist and album, computing the similarities in Python and,
+if numpy is installed, with numpy.
+Run from the root of the repository:
+
+    python benchmarks/search_benchmark.py --songs 20000 --queries 30
+'''
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from nltk.metrics.distance import jaro_winkler_similarity
+from lib.platform.searchindex import SearchIndex, MultiFieldSearchIndex
+from lib.platform.vectorsearch import VECTOR_SEARCH_AVAILABLE
+
+_syllables = ["la", "ve", "mo", "ri", "ta", "ne", "so", "ka", "lu", "di", "ba", "che", "tro", "ma", "ni", "go", "pa", "re", "sta", "bel", "on", "in", "ar", "el"]
+
+
+def full_scan(input, songs, field="title", top=5, accepted_precentage=1):
+    '''The search of lib.util.search before the indexes'''
+    words = input.lower().split(" ")
+
+    def get_rank(other):
+        rank = 0.0
+        for w in words:
+            val = 1 - max([jaro_winkler_similarity(w, o[: len(w)], max_l=2) for o in other])
+            rank += val if val < accepted_precentage else 1
+        return rank
+
+    ranks = [(s, get_rank(s[field].lower().split(" "))) for s in songs]
+    ranks = sorted(ranks, key=lambda x: x[1])
+    return [r[0] for r in ranks][:top]
+
+
+def create_library(songs_count, seed):
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choice(_syllables) for _ in range(rng.randint(1, 4))) for _ in range(max(1000, songs_count // 2))]
+    # Few words are very common, like in real titles
+    weights = [1 / (i + 1) for i in range(len(vocabulary))]
+    artists = [" ".join(rng.choices(vocabulary, k=rng.randint(1, 2))) for _ in range(max(1, songs_count // 20))]
+    albums = [" ".join(rng.choices(vocabulary, k=rng.randint(1, 3))) for _ in range(max(1, songs_count // 8))]
+    return [{"title": " ".join(rng.choices(vocabulary, weights, k=rng.randint(1, 5))), "artist": rng.choice(artists), "album": rng.choice(albums), "id": i}
+            for i in range(songs_count)]
+
+
+def create_queries(songs, queries_count, seed):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(queries_count):
+        words = rng.choice(songs)[rng.choice(["title", "title", "artist", "album"])].split(" ")
+        queries.append(" ".join(w[:rng.randint(1, len(w))] for w in words[:rng.randint(1, 2)]))
+    return queries
+
+
+def _songs_only(index):
+    return lambda query: [s for s, _ in index.search(query)]
+
+
+def measure(name, build, queries, baseline=None):
+    start = time.perf_counter()
+    search = build()
+    build_time = time.perf_counter() - start
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append([s["id"] for s in search(query)])
+    query_time = (time.perf_counter() - start) / len(queries)
+    same = ""
+    if baseline is not None:
+        same = f"{sum([a == b for a, b in zip(results, baseline)])}/{len(queries)} same top"
+    print(f"{name:<24} build {build_time * 1000:9.1f} ms   query {query_time * 1000:9.2f} ms   {same}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the search of songs")
+    parser.add_argument("--songs", type=int, default=20000, help="Number of songs of the library")
+    parser.add_argument("--queries", type=int, default=30, help="Number of queries")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the synthetic library")
+    parser.add_argument("--skip-full-scan", action="store_true", help="Do not run the full scan, slow on big libraries")
+    args = parser.parse_args()
+
+    songs = create_library(args.songs, args.seed)
+    queries = create_queries(songs, args.queries, args.seed)
+    print(f"{args.songs} songs, {args.queries} queries")
+
+    title_baseline = None
+    if not args.skip_full_scan:
+        title_baseline = measure("full scan (title)", lambda: lambda q: full_scan(q, songs), queries)
+    SearchIndex.vectorized = False
+    measure("SearchIndex (title)", lambda: SearchIndex(songs).search, queries, title_baseline)
+    multi = measure("MultiFieldSearchIndex", lambda: _songs_only(MultiFieldSearchIndex(songs)), queries)
+    if VECTOR_SEARCH_AVAILABLE:
+        SearchIndex.vectorized = True
+        measure("SearchIndex (numpy)", lambda: SearchIndex(songs).search, queries, title_baseline)
+        measure("MultiField... (numpy)", lambda: _songs_only(MultiFieldSearchIndex(songs)), queries, multi)
+    else:
+        print("numpy                    skipped, numpy is not installed")
+
+
+if __name__ == "__main__":
+    main()
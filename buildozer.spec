@@ -38,7 +38,7 @@ version = 0.4
 
 # (list) Application requirements
 # comma separated e.g. requirements = sqlite3,kivy
-requirements = python3,kivy,pillow,kivymd==1.0.1,mutagen,ffpyplayer,nltk,regex,plyer
+requirements = python3,kivy,pillow,kivymd==1.0.1,mutagen,ffpyplayer,nltk,regex,plyer,numpy
 
 # (str) Custom source folders for requirements
 # Sets custom source for any requirements with recipes
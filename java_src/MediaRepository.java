@@ -14,9 +14,14 @@ import org.json.JSONException;
 import org.json.JSONObject;
 
 import java.io.*;
+import java.nio.ByteBuffer;
+import java.nio.charset.StandardCharsets;
+import java.util.zip.CRC32;
 import java.util.ArrayList;
 import java.util.Arrays;
+import java.util.HashMap;
 import java.util.List;
+import java.util.Map;
 
 public class MediaRepository {
     private final static String TAG = "MediaRepository";
@@ -25,6 +30,13 @@ public class MediaRepository {
     private static String lastPlaylist = "";
     private static String lastPlaylistName = "";
     private static final String STORAGE_FILE_NAME = "playlist.json";
+    // Playback state, written often. Same fixed layout of lib/platform/playbackstate.py
+    private static final String STATE_FILE_NAME = "playlist.state";
+    private static final byte[] STATE_MAGIC = new byte[]{'N', 'M', 'P', 'S'};
+    private static final short STATE_VERSION = 1;
+    private static final int STATE_TEXT_SIZE = 232;
+    private static final int STATE_SIZE = 4 + 2 + 2 + 8 * 4 + (2 + STATE_TEXT_SIZE) * 2 + 4;
+    private static long stateSequence = 0;
     private static Long lastMediaItemPosition = -1L;
     private static final List<JSONObject> savedItems = new ArrayList<>();
 
@@ -105,9 +117,19 @@ public class MediaRepository {
                 }
                 
             }
+            // The state file is newer than the configuration, if present
+            loadState(new File(dir, STATE_FILE_NAME));
 
             JSONObject data = store.getJSONObject("data");
             JSONArray songs = data.getJSONArray("songs");
+            // The ids are stable, not the rows: the removed songs leave a null until the list is compacted
+            Map<Integer, JSONObject> songsById = new HashMap<>();
+            for (int i = 0; i < songs.length(); i++) {
+                JSONObject song = songs.optJSONObject(i);
+                if (song != null) {
+                    songsById.put(song.getInt("id"), song);
+                }
+            }
 
             String[] categories = new String[]{"artist", "album", "playlist"};
             int addedMediaItems = 0;
@@ -119,7 +141,11 @@ public class MediaRepository {
                     JSONArray subDataSongsId = subData.getJSONObject(j).getJSONArray("songs");
                     for (int k = 0; k < subDataSongsId.length(); k++) {
                         int songId = subDataSongsId.getInt(k);
-                        JSONObject obj = songs.getJSONObject(songId);
+                        JSONObject obj = songsById.get(songId);
+                        if (obj == null) {
+                            Log.w(TAG, "Song not found: " + songId);
+                            continue;
+                        }
                         MediaItem newItem = MediaRepository.createMediaItem(
                                 obj.getString("file"),
                                 obj.getString("artist"),
@@ -212,35 +238,96 @@ public class MediaRepository {
         MediaRepository.lastMediaItemPosition = position;
     }
 
-    public static void saveLastData(Context context) {
+    // Save the playback state in its own small file, without rewriting the library.
+    // The file is written aside and renamed, so it is replaced atomically. Cheap enough to be called every few seconds
+    public static synchronized void saveLastData(Context context) {
         File dir = new File(context.getFilesDir(), "app");
-        File file = new File(dir, STORAGE_FILE_NAME);
-        if (!file.exists()) return;
-        JSONObject store = null;
-        try (BufferedReader reader = new BufferedReader(new FileReader(file))) {
-            StringBuilder builder = new StringBuilder();
-            String line;
-            while ((line = reader.readLine()) != null) {
-                builder.append(line);
-            }
-            store = new JSONObject(builder.toString());
-        } catch (IOException | JSONException e) {
-            Log.e(TAG, "Failed to load media items from storage", e);
-            return;
+        File file = new File(dir, STATE_FILE_NAME);
+        File tmpFile = new File(dir, STATE_FILE_NAME + ".tmp");
+        long songId = -1;
+        try {
+            songId = Long.parseLong(lastMediaItemId);
+        } catch (NumberFormatException e) {
+            // No song playing
         }
+        byte[] playlist = truncateText(lastPlaylist);
+        byte[] playlistName = truncateText(lastPlaylistName);
+        stateSequence++;
 
-        try (BufferedWriter writer = new BufferedWriter(new FileWriter(file))) {
-            JSONObject config = store.getJSONObject("config");
-            JSONObject lastData = config.getJSONObject("last_data");
-            lastData.put("last_song", lastMediaItemId);
-            lastData.put("last_song_time", lastMediaItemPosition);
-            lastData.put("last_playlist", lastPlaylist);
-            lastData.put("last_playlist_name", lastPlaylistName);
+        ByteBuffer buffer = ByteBuffer.allocate(STATE_SIZE);
+        buffer.put(STATE_MAGIC);
+        buffer.putShort(STATE_VERSION);
+        buffer.putShort((short) 0);
+        buffer.putLong(stateSequence);
+        buffer.putLong(songId);
+        buffer.putLong(lastMediaItemPosition);
+        buffer.putLong(System.currentTimeMillis());
+        buffer.putShort((short) playlist.length);
+        buffer.put(Arrays.copyOf(playlist, STATE_TEXT_SIZE));
+        buffer.putShort((short) playlistName.length);
+        buffer.put(Arrays.copyOf(playlistName, STATE_TEXT_SIZE));
+        CRC32 crc = new CRC32();
+        crc.update(buffer.array(), 0, STATE_SIZE - 4);
+        buffer.putInt((int) crc.getValue());
 
-            writer.write(store.toString());
-        } catch (IOException | JSONException e) {
-            Log.e(TAG, "Failed to save media", e);
+        try (FileOutputStream out = new FileOutputStream(tmpFile)) {
+            out.write(buffer.array());
+        } catch (IOException e) {
+            Log.e(TAG, "Failed to save the playback state", e);
             return;
         }
+        if (!tmpFile.renameTo(file)) {
+            Log.e(TAG, "Failed to replace the playback state");
+        }
+    }
+
+    private static void loadState(File file) {
+        if (!file.exists() || file.length() != STATE_SIZE) return;
+        byte[] data = new byte[STATE_SIZE];
+        try (DataInputStream in = new DataInputStream(new FileInputStream(file))) {
+            in.readFully(data);
+        } catch (IOException e) {
+            Log.e(TAG, "Failed to load the playback state", e);
+            return;
+        }
+        ByteBuffer buffer = ByteBuffer.wrap(data);
+        CRC32 crc = new CRC32();
+        crc.update(data, 0, STATE_SIZE - 4);
+        if (buffer.getInt(STATE_SIZE - 4) != (int) crc.getValue()) {
+            Log.w(TAG, "Playback state not valid");
+            return;
+        }
+        byte[] magic = new byte[STATE_MAGIC.length];
+        buffer.get(magic);
+        if (!Arrays.equals(magic, STATE_MAGIC) || buffer.getShort() != STATE_VERSION) {
+            Log.w(TAG, "Playback state version not supported");
+            return;
+        }
+        buffer.getShort();
+        stateSequence = buffer.getLong();
+        long songId = buffer.getLong();
+        lastMediaItemPosition = buffer.getLong();
+        buffer.getLong();
+        lastMediaItemId = songId < 0 ? "" : "" + songId;
+        lastPlaylist = readText(buffer);
+        lastPlaylistName = readText(buffer);
+    }
+
+    private static byte[] truncateText(String text) {
+        byte[] data = text.getBytes(StandardCharsets.UTF_8);
+        if (data.length <= STATE_TEXT_SIZE) return data;
+        // Do not cut a character in half
+        int size = STATE_TEXT_SIZE;
+        while (size > 0 && (data[size] & 0xC0) == 0x80) {
+            size--;
+        }
+        return Arrays.copyOf(data, size);
+    }
+
+    private static String readText(ByteBuffer buffer) {
+        int size = Math.min(buffer.getShort() & 0xFFFF, STATE_TEXT_SIZE);
+        byte[] text = new byte[STATE_TEXT_SIZE];
+        buffer.get(text);
+        return new String(text, 0, size, StandardCharsets.UTF_8);
     }
 }
@@ -32,6 +32,8 @@ import android.app.NotificationManager;
 import android.content.Context;
 import android.content.Intent;
 import android.net.Uri;
+import android.os.Handler;
+import android.os.Looper;
 import android.util.Log;
 
 import com.google.common.util.concurrent.Futures;
@@ -66,6 +68,10 @@ public class PlaybackService extends MediaLibraryService {
     private MyCarConnectionHandler carConnectionHandler = null;
     private MyCarConnectionHandler.CarConnectionListener listener = null;
     private AudioFocusManager audioFocusManager;
+    // Save the playing song and its position every few seconds, in the small state file
+    private static final long CHECKPOINT_INTERVAL_MS = 5000;
+    private final Handler checkpointHandler = new Handler(Looper.getMainLooper());
+    private Runnable checkpoint = null;
 
     public static void startService(Activity activity){
         activity.startForegroundService(new Intent(activity, PlaybackService.class));
@@ -88,6 +94,17 @@ public class PlaybackService extends MediaLibraryService {
         mediaLibrarySession = new MediaLibrarySession.Builder(this, player, new MyMediaLibraryCallback()).build();
         Context thisContext = this;
 
+        checkpoint = () -> {
+            MediaItem currentItem = player.getCurrentMediaItem();
+            if (currentItem != null){
+                MediaRepository.setLastMediaItemId(currentItem.mediaId);
+                MediaRepository.setLastMediaItemPosition(player.getContentPosition());
+                MediaRepository.saveLastData(thisContext);
+            }
+            if (player.isPlaying()){
+                checkpointHandler.postDelayed(checkpoint, CHECKPOINT_INTERVAL_MS);
+            }
+        };
 
         // Player listners
         // Get the focus and raise the internal player volume when the player is playing
@@ -96,6 +113,9 @@ public class PlaybackService extends MediaLibraryService {
             @Override
             public void onIsPlayingChanged(boolean isPlaying) {
                 Player.Listener.super.onIsPlayingChanged(isPlaying);
+                // Save now, when paused the last position must not be lost
+                checkpointHandler.removeCallbacks(checkpoint);
+                checkpointHandler.post(checkpoint);
                 if (isPlaying){
                     audioFocusManager.requestAudioFocus();
                     audioFocusManager.raiseVolume();
@@ -165,6 +185,8 @@ public class PlaybackService extends MediaLibraryService {
 
     @Override
     public void onDestroy() {
+        checkpointHandler.removeCallbacks(checkpoint);
+        MediaRepository.saveLastData(this);
         if (mediaLibrarySession != null) {
             Player player = mediaLibrarySession.getPlayer();
             audioFocusManager.abandonAudioFocus();
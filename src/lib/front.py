@@ -14,6 +14,7 @@ from functools import partial
 from lib.util import show_snackbar
 from kivymd.app import MDApp
 from kivy.logger import Logger
+import time
 
 class Front(Screen):
     '''Front screen that contains the main page of the app.
@@ -47,6 +48,8 @@ class Front(Screen):
     broken_state: bool = False
     '''True if the application is not usable due to missing memory permissions'''
 
+    _start_time: float = None
+
     def on_start(self, status=True, **kwargs) -> None:
         '''Callback called when loading for the application. Launch a thread in order to load the data asynchronously.
         
@@ -64,6 +67,7 @@ class Front(Screen):
             return
         self.loading_spinner = self.ids["loading_spinner"]
         self._previous_state = True
+        self._start_time = time.perf_counter()
         t = Thread(target=self.load_data)
         t.daemon = True
         t.start()
@@ -142,21 +146,40 @@ class Front(Screen):
         # So the thread is restarted until it return not None
         data_manager = get_data_manager(callback=self.on_start)
         if data_manager is not None:
+            if self._start_time is not None:
+                Logger.info(f"Startup: data loaded in {time.perf_counter() - self._start_time:.3f}s")
             Clock.schedule_once(partial(self.__on_loading_ended))
-            if data_manager.check_and_run_update():
-                Clock.schedule_once(partial(self.__on_loading_ended))
+            # The new songs are shown while they are found (eg. the first launch)
+            library_changed = Clock.create_trigger(self.__on_library_changed, 0.5)
+            if data_manager.check_and_run_update(on_batch=library_changed):
+                library_changed()
+            data_manager.start_watcher(library_changed)
 
     def __on_loading_ended(self, _):
         data_manager = get_data_manager()
         logging.info(f'Last category: {data_manager.store["config"]["last_data"]["last_category"]}')
         self.set_category(data_manager.store["config"]["last_data"]["last_category"], force_reload=True)
 
+    def __on_library_changed(self, _):
+        data_manager = get_data_manager()
+        category = data_manager.store["config"]["last_data"]["last_category"]
+        if not self.ids["playlist_container"].update_data(data_manager.get_library().get_category(category)):
+            # The category is still loading, retry when it ends
+            Clock.schedule_once(self.__on_library_changed, 0.5)
+
     def __change_category_async_function(self, selected_category):
         data_manager = get_data_manager()
         data_manager.put_data(["config", 'last_data', "last_category"], selected_category)
-        category_elements = data_manager.store["data"][selected_category]
+        category_elements = data_manager.get_library().get_category(selected_category)
         last_schedule_delay = self.ids["playlist_container"].set_data(category_elements)
-        Clock.schedule_once(lambda _: self.__set_loading_state(False), last_schedule_delay + 0.2)
+        Clock.schedule_once(lambda _: self.__on_category_shown(), last_schedule_delay + 0.2)
+
+    def __on_category_shown(self):
+        self.__set_loading_state(False)
+        if self._start_time is not None:
+            # Time to first rendered category, measured only once
+            Logger.info(f"Startup: first category shown in {time.perf_counter() - self._start_time:.3f}s")
+            self._start_time = None
 
     def __set_loading_state(self, state):
         if state and not self._previous_state:
@@ -27,7 +27,7 @@ class Menu(MDNavigationDrawer):
                 
                 dest_file = f'{filename} ({i}).{ext}'
 
-            data = json.dumps(data_manager.store._data)
+            data = data_manager.export_data()
 
             # with open(data_manager.store.filename, 'r') as f:
             #     data = f.readlines()
@@ -56,8 +56,7 @@ class Menu(MDNavigationDrawer):
             if platform == 'android':
                 def on_selection(uri, content):
                     data = json.loads(content)
-                    with open(data_manager.store.filename, 'w') as f:
-                        json.dump(data, f, indent=data_manager.store.indent, sort_keys=data_manager.store.sort_keys)
+                    data_manager.import_data(data)
                     reload_data_manager()
                     MDApp.get_running_app().front.load_data()
                 load_external_file(on_selection)
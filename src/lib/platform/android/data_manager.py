@@ -4,7 +4,7 @@ from lib.platform.android.util import save_external_file, load_external_file
 from kivy.clock import Clock
 from typing import Callable
 from android.runnable import run_on_ui_thread # type:ignore
-from android.storage import primary_external_storage_path # type: ignore
+from android.storage import primary_external_storage_path, secondary_external_storage_path # type: ignore
 from android.permissions import request_permissions, Permission, check_permission # type: ignore
 from kivy.logger import Logger
 from jnius import autoclass
@@ -33,7 +33,10 @@ class AndroidDataManager(DataManager):
         data_file_name : str
             path to the configuration file. Default "~/playlist.json"
         '''
-        super().__init__(os.path.join(primary_external_storage_path(), "Music"), data_file_name)
+        # The SD card, if any, is a library root too
+        sd_card = secondary_external_storage_path()
+        super().__init__(os.path.join(primary_external_storage_path(), "Music"), data_file_name,
+                         library_roots=[os.path.join(sd_card, "Music")] if sd_card else [])
 
     @staticmethod
     def ask_permissions(callback: Callable[[], bool]):
@@ -139,8 +139,8 @@ class AndroidPlaylist(Playlist):
         else:
             id = int(mediaitem.mediaId)
         data_manager = get_data_manager()
-        song = data_manager.store['data']['songs'][id]
-        assert song['id'] == id
+        song = data_manager.get_song(id)
+        assert song is not None and song['id'] == id
 
         Clock.schedule_once(lambda _: callback(song))
 
@@ -20,6 +20,8 @@ class AudioPlayer(ABC):
         Load the sound and start to play it
     playpayse_sound() -> None
         Change the status of the reprodution between play and pause
+    get_position() -> int
+        Get the position in the current song
     '''
     on_song_end = None
     state = False
@@ -42,6 +44,10 @@ class AudioPlayer(ABC):
     def playpause_sound(self):
         pass
 
+    def get_position(self) -> int:
+        '''Get the position in the current song in milliseconds. -1 if unknown'''
+        return -1
+
 def get_audio_player() -> AudioPlayer:
     '''Get the AudioPlayer based on the platform the program is running on. Use lazy approach
     
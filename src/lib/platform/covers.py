@@ -0,0 +1,55 @@
+from hashlib import sha1
+import os
+
+_extensions = {"image/png": ".png", "image/gif": ".gif", "image/bmp": ".bmp", "image/webp": ".webp"}
+
+
+class CoverCache():
+    '''Content addressed cache of the covers embedded in the songs. Identical covers (eg. the same cover in every song of an album) are saved only once
+
+    Attributes
+    ----------
+    folder : str
+        Folder where the covers are saved
+
+    Methods
+    -------
+    save(data: bytes, mime: str) -> str
+        Save a cover if not already present and return its path
+    '''
+
+    folder: str = None
+    '''Folder where the covers are saved'''
+
+    def __init__(self, folder: str):
+        '''Create a new CoverCache
+
+        Arguments
+        ---------
+        folder : str
+            Folder where the covers are saved. Created if missing
+        '''
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def save(self, data: bytes, mime: str) -> str:
+        '''Save a cover if not already present. The name of the file is the hash of its content
+
+        Arguments
+        ---------
+        data : bytes
+            The encoded image
+        mime : str
+            Mime type of the image. Used for the extension of the file
+
+        Returns
+        -------
+        Path to the saved cover
+        '''
+        path = os.path.join(self.folder, sha1(data).hexdigest() + _extensions.get(mime.lower(), ".jpg"))
+        if not os.path.exists(path):
+            tmp_file_name = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_file_name, "wb") as f:
+                f.write(data)
+            os.replace(tmp_file_name, path)
+        return path
@@ -1,16 +1,26 @@
 from kivy.utils import platform
-from kivy.storage.jsonstore import JsonStore
-from mutagen.easyid3 import EasyID3
+from kivy.storage import AbstractStore
 from plyer import filechooser
 from kivy.logger import Logger
+from kivy.clock import Clock
 
 from lib.platform.localization import get_localization
-
+from lib.platform.scanner import read_songs, song_order, FingerprintCache, LibraryRoot, DEFAULT_IMAGE
+from lib.platform.thumbnails import ThumbnailCache
+from lib.platform.covers import CoverCache
+from lib.platform.storage import open_store, to_json
+from lib.platform.songtable import SongTable
+from lib.platform.library import LibrarySnapshot, LIBRARY_CATEGORIES
+from lib.platform.playbackstate import PlaybackState
+
+from typing import Any, Callable
+from threading import RLock, Thread
+from queue import Queue, Empty
+from hashlib import sha1
+from bisect import bisect_right
 import random
-from typing import Any
 import os
 import re
-from pathlib import Path
 import json
 
 
@@ -20,8 +30,20 @@ implemented_platoforms = ["Windows", "Android", "Linux"]
 __data_manager = None
 
 
+def flush_data_manager():
+    '''Write the pending changes of the data manager, if it is already created. Used when the application is paused'''
+    if __data_manager is not None:
+        __data_manager.flush()
+
+def stop_data_manager():
+    '''Stop the watcher of the data manager and write its pending changes, if it is already created. Used when the application is stopped'''
+    if __data_manager is not None:
+        __data_manager.stop_watcher()
+        __data_manager.flush()
+
 def reload_data_manager(callback=lambda:None):
     global __data_manager
+    stop_data_manager()
     __data_manager = None
     return get_data_manager(callback)
 
@@ -70,42 +92,139 @@ class DataManager():
     Attributes
     ----------
     base_path : str
-        The default path for all songs. Used to save a bit the space of the json file
-    store : JsonStore
-        Kivy object that save and read the data. Use only to read values, NOT to write.
+        The default path for all songs. Used to save a bit the space of the json file. It is the first of the library roots
+    library_roots : list[LibraryRoot]
+        Folders of the library, each one with its own fingerprints and directory index. Scanned concurrently and merged in the same library
+    store : AbstractStore
+        Kivy object that save and read the data. Use only to read values, NOT to write. The UI reads the library from get_library instead
+    storage_backend : str
+        Backend of the store, one of lib.platform.storage.STORAGE_BACKENDS. The JSON file is imported by the other backends the first time
+    store_flush_delay : float
+        Seconds waited by the store before writing a change, so a burst of changes is written once. If 0 every change is written immediately
+    thumbnails : ThumbnailCache
+        Covers scaled to fixed sizes. Saved next to the data file
+    covers : CoverCache
+        Covers extracted from the songs without an image in their folder. Saved next to the data file
+    playback_state : PlaybackState
+        Playing song, position and playlist. Saved in a small file next to the data file, so it can be updated often without writing the library
+    scan_workers : int
+        Number of workers used to read the tags of the songs. If None use the number of cores
+    scan_timeout : float
+        Seconds to wait for the tags of a single song before skipping it
+    scan_processes : bool
+        If True read the tags on a pool of processes instead of a pool of threads
+    scan_first_batch_size : int
+        Number of new songs saved in the first batch of a scan. The next batches are twice as big
+    scan_max_batch_size : int
+        Max number of new songs saved in a batch of a scan
+    scan_root_timeout : float
+        Seconds a scan waits for news from a root being walked, eg. a slow network share. When elapsed the root is skipped until the next scan
+    songs_compact_ratio : float
+        Fraction of removed songs (tombstones) in the songs list that makes it compacted in background
 
     Methods
     -------
     put_data(path: str, value: Any) -> None
         Save the data in the file following a path. eg. store["field1"]["field2"]["field3"] = value <=> put_fata(["field1", "field2", "field3"], value)
+    get_library() -> LibrarySnapshot
+        Get the current immutable version of the library
+    get_song(song_id: int) -> dict|None
+        Get a song by its id
+    get_songs(song_ids: list[int]) -> list[dict]
+        Get the songs with the given ids. The removed songs are skipped
+    get_all_songs() -> list[dict]
+        Get all the songs of the library
+    compact_songs() -> None
+        Remove the tombstones of the removed songs from the songs list
+    import_data(data: dict) -> None
+        Replace all the saved data. eg. with a configuration file loaded by the user
+    export_data() -> str
+        Get all the saved data in JSON. eg. to save a configuration file for the user
+    flush() -> None
+        Write the pending changes of the store now
     get_image(songs: list[str])  -> str
         Search an image in a list of songs. Search for an image in the same folder of the songs.
+    get_thumbnail(image: str, size: float, callback: (str) -> None) -> str|None
+        Get a version of an image scaled for a widget of the given size
+    check_and_run_update(on_batch: () -> None) -> bool
+        Check if the music folder is changed and update the storage file
+    apply_changes(new_songs: set[str], removed_songs: set[str], changed_songs: set[str], unknown_songs: set[str]) -> bool
+        Apply a batch of changes of the music folder to the storage file
+    start_watcher(on_changed: () -> None) -> bool
+        Keep the library updated while the application is running
+    stop_watcher() -> None
+        Stop keeping the library updated
     '''
 
     base_path: str = None
-    store: JsonStore = None
+    store: AbstractStore = None
+    library_roots: list[LibraryRoot] = None
+    thumbnails: ThumbnailCache = None
+    covers: CoverCache = None
+    playback_state: PlaybackState = None
+
+    storage_backend: str = "json"
+    '''Backend of the store, one of lib.platform.storage.STORAGE_BACKENDS. The JSON file is imported by the other backends the first time'''
+
+    store_flush_delay: float = 1
+    '''Seconds waited by the store before writing a change, so a burst of changes is written once. If 0 every change is written immediately'''
+
+    scan_workers: int = None
+    '''Number of workers used to read the tags of the songs. If None use the number of cores'''
+
+    scan_timeout: float = 30
+    '''Seconds to wait for the tags of a single song before skipping it'''
+
+    scan_processes: bool = False
+    '''If True read the tags on a pool of processes instead of a pool of threads'''
+
+    scan_first_batch_size: int = 100
+    '''Number of new songs saved in the first batch of a scan. The next batches are twice as big'''
+
+    scan_max_batch_size: int = 5000
+    '''Max number of new songs saved in a batch of a scan'''
+
+    scan_root_timeout: float = 300
+    '''Seconds a scan waits for news from a root being walked, eg. a slow network share. When elapsed the root is skipped until the next scan'''
+
+    songs_compact_ratio: float = 0.25
+    '''Fraction of removed songs (tombstones) in the songs list that makes it compacted in background'''
 
     def __init__(self,
                  base_path=os.path.expanduser("~/Music"),
-                 data_file_name=os.path.expanduser("~/playlist.json")):
+                 data_file_name=os.path.expanduser("~/playlist.json"),
+                 library_roots: list[str] = None):
         '''Create new DataManager
         
         Arguments
         ---------
         base_path : str
-            Base path for all the songs
+            Base path for all the songs. It is the first library root
         data_file_name : str
             Path to the file to use as memory
+        library_roots : list[str]
+            Other folders of the library, eg. an SD card. They are saved in config.library_roots, with the folders added by the user
         '''
+        library_roots = [] if library_roots is None else library_roots
         self.base_path = base_path
-        self.store = JsonStore(data_file_name)
+        self._update_lock = RLock()
+        self._library = LibrarySnapshot()
+        self.store = open_store(data_file_name, self.storage_backend, lock=self._update_lock, flush_delay=self.store_flush_delay)
+        self.thumbnails = ThumbnailCache(os.path.splitext(data_file_name)[0] + ".thumbnails")
+        self.covers = CoverCache(os.path.splitext(data_file_name)[0] + ".covers")
 
 
         if not self.store.exists("data"):
-            new_data = self.__build_json(self.base_path)
-            self.store.put("data", **new_data)
+            # The songs are added by check_and_run_update in batches
+            self.store.put("data", **{
+                "songs": [],
+                "artist": [],
+                "album": [],
+                "playlist": [{"name": get_localization()["favorites"], "pinned": True, "songs": []}],
+            })
             self.store.put("config", **{
                 "base_path": base_path,
+                "library_roots": [],
                 "shuffle": True,
                 "last_data": {
                     "last_category": "artist",
@@ -116,6 +235,17 @@ class DataManager():
                 }
             })
             Logger.info(f"Data Saved in {data_file_name}")
+        # The roots are remembered, so the songs of a root that is not found (eg. the SD card is removed) are not removed
+        known_roots = self.store["config"].get("library_roots", [])
+        new_roots = [p for p in library_roots if p not in known_roots]
+        if len(new_roots) > 0:
+            self.put_data(["config", "library_roots"], [*known_roots, *new_roots])
+        self.library_roots = self.__create_roots(data_file_name, [base_path, *known_roots, *new_roots])
+        self.playback_state = PlaybackState(os.path.splitext(data_file_name)[0] + ".state")
+        # The first time the state is taken from the old configuration
+        self.playback_state.load(self.store["config"]["last_data"])
+        self.__index_songs()
+        self.__publish()
     
     def put_data(self, path:list[str], value: Any):
         '''Save the data in the file following a path. eg. store["field1"]["field2"]["field3"] = value <=> put_fata(["field1", "field2", "field3"], value)
@@ -127,11 +257,101 @@ class DataManager():
         value : Any
             Value to save
         '''
-        self.store[path[0]] = self.__put_data_rec(self.store[path[0]], path[1:], value)
+        with self._update_lock:
+            if len(path) > 1:
+                # Only the changed value is written, if the store support it
+                self.store.put_path(path, value)
+            else:
+                self.store[path[0]] = value
+            if path[0] == "data":
+                if len(path) == 1:
+                    self.__index_songs()
+                    self.__publish()
+                else:
+                    self.__publish(songs=path[1] == "songs", categories=[c for c in LIBRARY_CATEGORIES if c == path[1]])
         Logger.info(f"Data updated: {path}")
 
+    def import_data(self, data: dict):
+        '''Replace all the saved data. eg. with a configuration file loaded by the user
+
+        Arguments
+        ---------
+        data : dict
+            The new data. Same format of the JSON data file
+        '''
+        with self._update_lock:
+            for key in self.store.keys():
+                if key not in data:
+                    self.store.delete(key)
+            for key, value in data.items():
+                self.store[key] = value
+            self.__index_songs()
+            self.__publish()
+        Logger.info(f"Data imported: {list(data.keys())}")
+
+    def export_data(self) -> str:
+        '''Get all the saved data in JSON. eg. to save a configuration file for the user. Same format of the JSON data file'''
+        with self._update_lock:
+            return to_json(self.store._data)
+
+    def flush(self):
+        '''Write the pending changes of the store now. The store writes them anyway after store_flush_delay'''
+        self.store.flush()
+
+    def get_library(self) -> LibrarySnapshot:
+        '''Get the current version of the library. It never changes, so it can be read from any thread without locks while a scan is running.
+        Compare its generation with the one of get_library to know if it is stale
+        '''
+        return self._library
+
+    def get_song(self, song_id: int) -> dict|None:
+        '''Get a song by its id, in the current version of the library.
+        The ids are stable: they never change and are never reused, while the position of a song in the songs list can change
+
+        Arguments
+        ---------
+        song_id : int
+            Id of the song
+
+        Returns
+        -------
+        The song, or None if it was removed
+        '''
+        return self._library.get_song(song_id)
+
+    def get_songs(self, song_ids: list[int]) -> list[dict]:
+        '''Get the songs with the given ids, eg. the songs of a playlist. The removed songs are skipped
+
+        Arguments
+        ---------
+        song_ids : list[int]
+            Ids of the songs
+
+        Returns
+        -------
+        The songs in the same order of the ids
+        '''
+        return self._library.get_songs(song_ids)
+
+    def get_all_songs(self) -> list[dict]:
+        '''Get all the songs of the current version of the library. The songs list contains also the tombstones (None) of the removed songs, they are skipped'''
+        return self._library.get_all_songs()
+
+    def compact_songs(self) -> None:
+        '''Remove the tombstones of the removed songs from the songs list. The ids do not change, only the rows of the songs'''
+        with self._update_lock:
+            songs = self.store["data"]["songs"]
+            if len(songs) == len(self._song_rows):
+                return
+            self.store["data"]["songs"] = songs.compact()
+            self.__index_songs()
+            self.__publish(categories=[])
+            self.store.changed(["data", "songs"])
+            Logger.info(f"Songs compacted: {len(songs) - len(self._song_rows)} tombstones removed")
+
     def get_image(self, songs: list[str], is_random=False) -> str:
         '''Search an image in a list of songs. Search for an image in the same folder of the songs.
+        The folders are looked up in the directory index filled while scanning, so no file system access is needed
         
         Arguments
         ---------
@@ -141,168 +361,469 @@ class DataManager():
         Returns
         -------
         image_path : str
-            Path to an image. If not image is found return ""
+            Path to an image. If not image is found return the default image
         '''
-        folders = set([os.path.dirname(s) for s in songs])
-        all_images = set()
-        for dirname in folders:
-            regex = re.compile("\.(jpg|png)$")
-            for path, _, files in os.walk(os.path.join(self.base_path, dirname)):
-                for file in files:
-                    if regex.search(file):
-                        all_images.add(os.path.join(path, file))
-                        if not is_random:
-                            return all_images.pop()
-        if len(all_images) > 0:
-            return random.sample(list(all_images), 1)[0]
-        return "assets/gelbe_Note.png"
-
-    def check_and_run_update(self):
-        '''Check if there are new songs in the music folder or if some songs are removed. It update the storage file'''
-        all_songs = set(self.__traverse_folder(self.base_path, re.compile("\.(wav|mp3|flac)$")))
-        old_songs = set([s["file"] for s in self.store["data"]["songs"]])
-        removed_songs = old_songs - all_songs
-        new_songs = all_songs - old_songs
-
-        Logger.info(f"Removed songs {removed_songs}")
-        Logger.info(f"Added songs {new_songs}")
+        images = []
+        for root, files in self.__group_by_root([os.path.join(self.base_path, s) for s in songs]).items():
+            image = root.directories.find_image(files, is_random)
+            if image != DEFAULT_IMAGE:
+                if not is_random:
+                    return image
+                images.append(image)
+        return random.choice(images) if len(images) > 0 else DEFAULT_IMAGE
+
+    def get_thumbnail(self, image: str, size: float, callback: Callable[[str], None] = None) -> str|None:
+        '''Get a version of an image scaled for a widget of the given size. The image is decoded only the first time
+
+        Arguments
+        ---------
+        image : str
+            Path to the image. Usually returned by get_image
+        size : float
+            The biggest side in pixel of the widget that show the image
+        callback : (str) -> None
+            If given the image is decoded in a background thread, not to block the UI, and callback is called in the kivy thread with the path to the scaled image.
+            If None the image is decoded in the calling thread
+
+        Returns
+        -------
+        Path to the scaled image. None if it is being created and callback will get it
+        '''
+        if callback is None:
+            return self.thumbnails.get_thumbnail(image, size)
+        return self.thumbnails.get_thumbnail(image, size, lambda thumbnail: Clock.schedule_once(lambda _: callback(thumbnail)))
+
+    def check_and_run_update(self, on_batch: Callable[[], None] = None) -> bool:
+        '''Check if there are new songs in the music folder, if some songs are removed or if some songs are changed. It update the storage file.
+        Only the tags of the new and changed songs are read, the others are checked with their fingerprint.
+        The library roots are walked concurrently, each one in its own thread, and the changes of a root are applied when its walk ends,
+        so a slow root does not delay the others. A root that is not available (eg. an unmounted SD card) is skipped and its songs are kept.
+        The new songs are added in batches while the music folder is walked, every batch is saved before reading the next one,
+        so an interrupted scan (eg. the first one) continue from where it stopped the next time
+
+        Arguments
+        ---------
+        on_batch : () -> None
+            Callback called, in the calling thread, after each batch of new songs is saved
+
+        Returns
+        -------
+        True if the library is changed
+        '''
+        with self._update_lock:
+            old_files = {root: set() for root in self.library_roots}
+            removed_songs = set()
+            for f in self._file_ids:
+                root = self.__find_root(f)
+                if root is not None:
+                    old_files[root].add(f)
+                else:
+                    # The root was removed from the library
+                    removed_songs.add(f)
+            old_sizes = set().union(*[root.fingerprints.sizes() for root in self.library_roots])
+
+        events = Queue()
+        for root in self.library_roots:
+            Thread(target=self.__scan_root, args=(root, old_files[root], old_sizes, events), daemon=True).start()
+        scanning = len(self.library_roots)
 
         changes = False
+        maybe_moved_songs = set()
+        while scanning > 0:
+            try:
+                root, new_songs, result = events.get(timeout=self.scan_root_timeout)
+            except Empty:
+                Logger.warning(f"{scanning} library roots not scanned in {self.scan_root_timeout}s, skipped")
+                break
+            changed_songs = set()
+            unknown_songs = set()
+            if new_songs is None:
+                # The walk of the root ended
+                scanning -= 1
+                if result is None:
+                    continue
+                all_songs, new_songs, root_maybe_moved_songs, changed_songs, unknown_songs = result
+                # The moves can be between roots, they are found when all the roots are walked
+                removed_songs |= old_files[root] - all_songs
+                maybe_moved_songs |= root_maybe_moved_songs
+            if self.apply_changes(new_songs, set(), changed_songs, unknown_songs):
+                changes = True
+                if on_batch is not None:
+                    on_batch()
+
+        return self.apply_changes(maybe_moved_songs, removed_songs) or changes
+
+    def apply_changes(self, new_songs: set[str], removed_songs: set[str], changed_songs: set[str] = None, unknown_songs: set[str] = None) -> bool:
+        '''Apply a batch of changes of the music folder to the storage file. Can be called from any thread.
+        The tags and the content hashes are read before taking the lock, that is held only while the library is changed
+
+        A new file with the same content hash of a removed one is considered the same song moved: only its path is updated,
+        so it keeps its id and its playlists and its tags are not read again
+
+        Arguments
+        ---------
+        new_songs : set[str]
+            Files to add to the library
+        removed_songs : set[str]
+            Files to remove from the library
+        changed_songs : set[str]
+            Files already in the library whose tags must be read again
+        unknown_songs : set[str]
+            Files already in the library without a fingerprint. Their fingerprint is saved, so their next changes are found
+
+        Returns
+        -------
+        True if the library is changed
+        '''
+        changed_songs = set() if changed_songs is None else changed_songs
+        unknown_songs = set() if unknown_songs is None else unknown_songs
+        with self._update_lock:
+            # A song can be found by the scan and by the watcher
+            new_songs = set([f for f in new_songs if f not in self._file_ids])
+            removed_hashes = self.__get_content_hashes(removed_songs)
+            sizes = set().union(*[root.fingerprints.sizes() for root in self.library_roots]) if len(removed_hashes) > 0 else set()
+
+        # The files are read without the lock, so a slow file system does not block the readers and put_data
+        moved_songs = self.__find_moved_songs(new_songs, removed_hashes, sizes)
+        new_songs = new_songs - set(moved_songs.values())
+        removed_songs = removed_songs - set(moved_songs.keys())
+        added_songs = self.__create__list(new_songs)
+        updated_songs = self.__create__list(changed_songs)
+        fingerprints = {f: self.__read_fingerprint(f, with_content_hash=True) for f in new_songs | changed_songs | unknown_songs}
+
+        with self._update_lock:
+            # Meanwhile another batch can have changed the same files
+            moved_songs = {old: new for old, new in moved_songs.items() if old in self._file_ids and new not in self._file_ids}
+            new_songs = set([f for f in new_songs if f not in self._file_ids])
+            added_songs = [s for s in added_songs if s["file"] in new_songs]
+
+            Logger.info(f"Moved songs {moved_songs}")
+            Logger.info(f"Removed songs {removed_songs}")
+            Logger.info(f"Added songs {new_songs}")
+            Logger.info(f"Changed songs {changed_songs}")
+
+            changes = False
+
+            if len(moved_songs) > 0:
+                self.__move_songs(moved_songs)
+                changes = True
+
+            if len(removed_songs) > 0:
+                self.__remove_songs(removed_songs)
+                for f in removed_songs:
+                    self.__get_root(f).fingerprints.remove(f)
+                changes = True
+                if len(self.store["data"]["songs"]) - len(self._song_rows) > len(self.store["data"]["songs"]) * self.songs_compact_ratio:
+                    Thread(target=self.compact_songs, daemon=True).start()
+
+            if len(new_songs) > 0:
+                self.__add_songs(added_songs)
+                for f in new_songs:
+                    self.__save_fingerprint(f, fingerprints[f])
+                changes = True
+
+            if len(changed_songs) > 0:
+                self.__update_songs(updated_songs)
+                for f in changed_songs:
+                    self.__save_fingerprint(f, fingerprints[f])
+                changes = True
+
+            unknown_songs = set([f for f in unknown_songs if f in self._file_ids])
+            for f in unknown_songs:
+                self.__save_fingerprint(f, fingerprints[f])
+
+            if changes:
+                self.__publish()
+            for root in self.__group_by_root(new_songs | removed_songs | changed_songs | unknown_songs | set(moved_songs.values())):
+                root.save()
+            return changes
+
+    def start_watcher(self, on_changed: Callable[[], None]) -> bool:
+        '''Keep the library updated while the application is running. Not every platform has a watcher
 
-        if len(removed_songs) > 0:
-            self.__remove_songs(removed_songs)
-            changes = True
+        Arguments
+        ---------
+        on_changed : () -> None
+            Callback called, in the watcher thread, after a batch of changes is applied to the library
+
+        Returns
+        -------
+        True if the watcher is running
+        '''
+        return False
 
-        if len(new_songs) > 0:
-            self.__add_songs(new_songs)
-            changes = True
-        return changes
+    def stop_watcher(self) -> None:
+        '''Stop keeping the library updated. The changes already found by the watcher and not applied yet are found by the next scan'''
+        pass
 
     def __remove_songs(self, files):
+        # The rows of the removed songs become tombstones, so the other songs keep their rows and their ids
+        songs = self.store["data"]["songs"]
+        removed_ids = set()
+        # name -> removed ids for artist and album: a song is only in the groups of its artist and of its album
+        removed_groups = {cateogry: {} for cateogry in ["artist", "album"]}
+        changed = []
         for file in files:
-            for song in self.store["data"]["songs"].copy():
-                if song["file"] == file:
-                    del self.store["data"]["songs"][song["id"]]
-                    for s in self.store["data"]["songs"][song["id"]:]:
-                        s["id"] -=1
-                    for cateogry in ["artist", "album", "playlist"]:
-                        i = 0
-                        while i < len(self.store["data"][cateogry]):
-                            el = self.store["data"][cateogry][i]
-                            el["songs"] = [index if index < song["id"] else index-1 for index in el["songs"] if index != song["id"]]
-                            if len(el["songs"]) == 0:
-                                del self.store["data"][cateogry][i]
-                            i+=1
-                    Logger.info(f"Removed {song['title']}")
-                    break
-        self.store["data"] = self.store["data"]
-
-    def __add_songs(self, files):
-        songs = self.__create__list(files, self.base_path)
-        if len(self.store["data"]["songs"]) == 0:
-            previous_last_id = 0
-        else:
-            previous_last_id = max([s["id"] for s in self.store["data"]["songs"]])
+            song_id = self._file_ids.pop(file, None)
+            if song_id is None:
+                continue
+            row = self._song_rows.pop(song_id)
+            song = songs[row]
+            Logger.info(f"Removed {song['title']}")
+            for cateogry in ["artist", "album"]:
+                removed_groups[cateogry].setdefault(song[cateogry], set()).add(song_id)
+            songs[row] = None
+            removed_ids.add(song_id)
+            changed.append(["data", "songs", row])
+        self.store.changed(*changed)
+        for cateogry in ["artist", "album"]:
+            index = self.__group_index(cateogry)
+            touched = []
+            for name, ids in removed_groups[cateogry].items():
+                group = index.get(name)
+                if group is not None:
+                    group["songs"] = [i for i in group["songs"] if i not in ids]
+                    touched.append(group)
+            self.__save_groups(cateogry, touched)
+        # The playlists are made by the user, a song can be in any of them
+        touched = []
+        for el in self.store["data"]["playlist"]:
+            if not removed_ids.isdisjoint(el["songs"]):
+                el["songs"] = [i for i in el["songs"] if i not in removed_ids]
+                touched.append(el)
+        self.__save_groups("playlist", touched)
+
+    def __add_songs(self, songs):
+        # The ids of the removed songs are never reused
+        next_song_id = self.store["data"].get("next_song_id", len(self.store["data"]["songs"]))
         for s in songs:
-            s["id"] += previous_last_id + 1
+            s["id"] += next_song_id
+        self.store["data"]["next_song_id"] = next_song_id + len(songs)
 
+        groups = {cateogry: self.__group_index(cateogry) for cateogry in ["artist", "album"]}
+        touched = {cateogry: [] for cateogry in ["artist", "album"]}
         for s in songs:
+            self._song_rows[s["id"]] = len(self.store["data"]["songs"])
+            self._file_ids[s["file"]] = s["id"]
             self.store["data"]["songs"].append(s)
             for cateogry in ["artist", "album"]:
-                ok = True
-                
-                for el in self.store["data"][cateogry]:
-                    if el["name"] == s[cateogry]:
-                        el["songs"].append(s["id"])
-                        ok = False
-                        Logger.info(f"Added {s['title']} to {cateogry}")
-                if ok:
-                    Logger.info(f"Added new category({cateogry} - {s[cateogry]}) with: {s['title']}")
-                    self.store["data"][cateogry].append({
-                            "name": s[cateogry], "songs": [s["id"]]
-                        })
-        self.store["data"] = self.store["data"]
-
-    def __put_data_rec(self, base, path, value):
-        if len(path) > 0:
-            base[path[0]] = self.__put_data_rec(base[path[0]], path[1:], value) 
-            return base
-        return value
-
-    def __create__list(self, files, music_folder):
-        # TODO multithread
-        def get_title(filename):
-            title = re.match(r"[\d\s\-#\.]*(.+)", Path(filename).stem)
-            if title is not None:
-                return title[1]
-            else:
-                return re.sub(r"^([0-9]*)?\s?[-#.]?\s?(.*)$", r"\2", Path(filename).stem),
-        songs = []
+                touched[cateogry].append(self.__add_to_group(groups[cateogry], cateogry, s[cateogry], s["id"], song_order(s)))
+        Logger.info(f"Added {len(songs)} songs")
+        self.store.changed(*[["data", "songs", self._song_rows[s["id"]]] for s in songs], ["data", "next_song_id"])
+        for cateogry in ["artist", "album"]:
+            self.__save_groups(cateogry, touched[cateogry])
+
+    def __update_songs(self, songs):
+        songs = {s["file"]: s for s in songs}
+        groups = {cateogry: self.__group_index(cateogry) for cateogry in ["artist", "album"]}
+        touched = {cateogry: [] for cateogry in ["artist", "album"]}
+        updated = []
+        for song in self.__get_live_songs([self._file_ids[f] for f in songs if f in self._file_ids]):
+            new_song = songs[song["file"]]
+            for cateogry in ["artist", "album"]:
+                if song[cateogry] != new_song[cateogry]:
+                    old_group = groups[cateogry].get(song[cateogry])
+                    if old_group is not None and song["id"] in old_group["songs"]:
+                        old_group["songs"].remove(song["id"])
+                        touched[cateogry].append(old_group)
+                    touched[cateogry].append(self.__add_to_group(groups[cateogry], cateogry, new_song[cateogry], song["id"], song_order(new_song)))
+            song.update({k: v for k, v in new_song.items() if k != "id"})
+            updated.append(["data", "songs", self._song_rows[song["id"]]])
+            Logger.info(f"Updated {song['title']}")
+        self.store.changed(*updated)
+        for cateogry in ["artist", "album"]:
+            self.__save_groups(cateogry, touched[cateogry])
+
+    def __group_index(self, cateogry):
+        # name -> group, built once for a batch of changes instead of searching the groups for every song
+        index = {}
+        for el in self.store["data"][cateogry]:
+            index.setdefault(el["name"], el)
+        return index
+
+    def __add_to_group(self, index, cateogry, name, song_id, order):
+        group = index.get(name)
+        if group is None:
+            Logger.info(f"Added new category({cateogry} - {name})")
+            group = {"name": name, "songs": []}
+            self.store["data"][cateogry].append(group)
+            index[name] = group
+        # In order of track, also when an album is added in more batches
+        songs = self.store["data"]["songs"]
+        position = bisect_right(group["songs"], order, key=lambda i: song_order(songs[self._song_rows[i]]))
+        group["songs"].insert(position, song_id)
+        return group
+
+    def __save_groups(self, cateogry, touched):
+        # Remove the empty groups and save only the changed ones, so a change costs as much as the groups it touches (see JournalStore)
+        groups = self.store["data"][cateogry]
+        empty = [i for i, el in enumerate(groups) if len(el["songs"]) == 0]
+        if len(empty) > 0:
+            self.store["data"][cateogry] = [el for el in groups if len(el["songs"]) > 0]
+            # From the last, so every removal does not move the next ones
+            self.store.removed(*[["data", cateogry, i] for i in reversed(empty)])
+        touched = set([id(el) for el in touched])
+        changed = [["data", cateogry, i] for i, el in enumerate(self.store["data"][cateogry]) if id(el) in touched]
+        if len(changed) > 0:
+            self.store.changed(*changed)
+
+    def __get_content_hashes(self, files):
+        # content hash -> files with that hash
+        hashes = {}
         for f in files:
+            content_hash = self.__get_root(f).fingerprints.get_content_hash(f)
+            if content_hash is not None:
+                hashes.setdefault(content_hash, []).append(f)
+        return hashes
+
+    def __find_moved_songs(self, new_songs, removed_hashes, sizes):
+        if len(removed_hashes) == 0:
+            return {}
+        moved_songs = {}
+        for f in sorted(new_songs):
+            size = self.__get_size(f)
+            # Only the files with the size of a known file are read. An empty file can not be recognized
+            if size > 0 and size in sizes:
+                try:
+                    content_hash = FingerprintCache.content_hash(f, size)
+                except OSError:
+                    continue
+                candidates = removed_hashes.get(content_hash, [])
+                if len(candidates) > 0:
+                    # Between identical files prefer the one with the same name
+                    old_file = next((c for c in candidates if os.path.basename(c) == os.path.basename(f)), candidates[0])
+                    candidates.remove(old_file)
+                    moved_songs[old_file] = f
+        return moved_songs
+
+    def __move_songs(self, moved_songs):
+        updated = []
+        for song in self.__get_live_songs([self._file_ids[f] for f in moved_songs if f in self._file_ids]):
+            old_file = song["file"]
+            song["file"] = moved_songs[old_file]
+            self._file_ids[song["file"]] = self._file_ids.pop(old_file)
+            song["image"] = self.get_image([song["file"]])
+            content_hash = self.__get_root(old_file).fingerprints.get_content_hash(old_file)
+            self.__get_root(old_file).fingerprints.remove(old_file)
+            self.__save_fingerprint(song["file"], self.__read_fingerprint(song["file"]))
+            self.__get_root(song["file"]).fingerprints.set_content_hash(song["file"], content_hash)
+            updated.append(["data", "songs", self._song_rows[song["id"]]])
+            Logger.info(f"Moved {song['title']} to {song['file']}")
+        self.store.changed(*updated)
+
+    def __get_live_songs(self, song_ids):
+        # The songs being changed, not the ones of the published library
+        songs = self.store["data"]["songs"]
+        return [songs[self._song_rows[i]] for i in song_ids if i in self._song_rows]
+
+    def __publish(self, songs=True, categories=LIBRARY_CATEGORIES):
+        # The readers see the changes only now, all together, in a new snapshot
+        self._library = self._library.next(songs=self.store["data"]["songs"] if songs else None,
+                                           song_rows=self._song_rows,
+                                           groups={c: self.store["data"][c] for c in categories})
+
+    def __index_songs(self):
+        if not isinstance(self.store["data"]["songs"], SongTable):
+            # Kept in memory as columns, the store saves it as a list
+            self.store["data"]["songs"] = SongTable(self.store["data"]["songs"])
+        # id -> row in the songs list and file -> id. The songs that are None are tombstones of removed songs
+        self._song_rows = {}
+        self._file_ids = {}
+        for row, song in enumerate(self.store["data"]["songs"]):
+            if song is not None:
+                self._song_rows[song["id"]] = row
+                self._file_ids[song["file"]] = song["id"]
+
+    def __get_size(self, file):
+        try:
+            return os.stat(file).st_size
+        except OSError:
+            return -1
+
+    def __read_fingerprint(self, file, with_content_hash=False):
+        '''Read the stat and the content hash of a file, to save them later with __save_fingerprint. None if the file is not found'''
+        try:
+            stat = os.stat(file)
+        except OSError:
+            return None
+        content_hash = None
+        if with_content_hash:
             try:
-                id3 = EasyID3(f)
-
-                songs.append({
-                    "title": get_title(id3["title"][0]),
-                    "album": id3["album"][0],
-                    "artist": id3["artist"][0],
-                    "track": int(id3["tracknumber"][0]),
-                    "file": f,
-                    "image": self.get_image([f])
-                })
-            except:
-                def get_track(f):
-                    try:
-                        return int(re.sub(r"^([0-9]*)?\s?[-#.]?\s?(.*)\.(wav|mp3|flac])$", r"\1", f))
-                    except ValueError:
-                        return 0
-
-                def get_artist(music_folder, file):
-                    folder_name = os.path.dirname(file)
-                    while os.path.dirname(folder_name) != music_folder:
-                        folder_name = os.path.dirname(folder_name)
-                    return os.path.basename(folder_name)
-                
-                songs.append({
-                    "title": get_title(f),
-                    "album": re.sub(r"^^([0-9]*)?\s?[\.#-]?\s?(.*) ((\(*[0-9]{4}\)?))?$", r"\2", os.path.basename(os.path.dirname(f))+ ("" if os.path.basename(os.path.dirname(f)).endswith(")") else " ")),
-                    "artist": get_artist(music_folder, f),
-                    "track": get_track(os.path.basename(f)),
-                    "file": f,
-                    "image": self.get_image([f])
-                })
-        songs = sorted(songs, key=lambda song:song["artist"]+song["album"]+str(song["track"])+song["title"])
+                content_hash = FingerprintCache.content_hash(file, stat.st_size)
+            except OSError:
+                pass
+        return stat, content_hash
+
+    def __save_fingerprint(self, file, fingerprint):
+        if fingerprint is None:
+            return
+        stat, content_hash = fingerprint
+        fingerprints = self.__get_root(file).fingerprints
+        fingerprints.update(file, stat)
+        if content_hash is not None:
+            fingerprints.set_content_hash(file, content_hash)
+
+    def __create__list(self, files):
+        songs = []
+        # The artist can be guessed from the first folder inside the root of the song
+        for root, root_files in self.__group_by_root(files).items():
+            songs += read_songs(root_files, root.path, self.get_image, self.__save_cover,
+                                workers=self.scan_workers,
+                                timeout=self.scan_timeout,
+                                use_processes=self.scan_processes)
         for k, s in enumerate(songs):
             s["id"] = k
         return songs
 
-    def __build_json(self, music_folder):
-        
-        files = self.__traverse_folder(music_folder, re.compile("\.(wav|mp3|flac)$"))
-        songs = self.__create__list(files, music_folder)
-
-        return {
-            "songs": songs,
-            "artist": self.__filter_by_field(songs, "artist"),
-            "album": self.__filter_by_field(songs, "album"),
-            "playlist": [{"name": get_localization()["favorites"], "pinned": True, "songs": []}], 
-        }
-
-    def __filter_by_field(self, songs, field):
-        tuples = [(k, song[field]) for k, song in enumerate(songs)]
-        ret = {}
-        for t in tuples:
-            if t[1] in ret.keys():
-                ret[t[1]]["songs"].append(t[0])
-            else:
-                ret[t[1]] = {"name": t[1], "songs": [t[0]]}
-        return list(ret.values())
-
-
-    def __traverse_folder(self, folder, regex):
-        ret = []
-        for path, _, files in os.walk(folder):
-            for name in files:
-                if regex.search(name):
-                    ret.append(os.path.join(path, name))
-        return list(set(ret))
\ No newline at end of file
+    def __save_cover(self, file, mime, data):
+        image = self.covers.save(data, mime)
+        self.__get_root(file).directories.set_cover(os.path.dirname(file), image)
+        return image
+
+    def __create_roots(self, data_file_name, paths):
+        roots = []
+        paths = [os.path.normpath(p) for p in paths]
+        for path in paths:
+            # A folder inside another root is already walked with it
+            if any(path == r.path or path.startswith(os.path.join(r.path, "")) for r in roots):
+                continue
+            if any(path != other and path.startswith(os.path.join(other, "")) for other in paths):
+                continue
+            shard_name = os.path.splitext(data_file_name)[0]
+            if len(roots) > 0:
+                shard_name += "." + sha1(path.encode()).hexdigest()[:12]
+            roots.append(LibraryRoot(path, shard_name))
+        return roots
+
+    def __find_root(self, file):
+        for root in self.library_roots:
+            if root.contains(file):
+                return root
+        return None
+
+    def __get_root(self, file):
+        # The files outside the roots (eg. of a removed root) are kept by the first one until they are removed
+        root = self.__find_root(file)
+        return root if root is not None else self.library_roots[0]
+
+    def __group_by_root(self, files):
+        groups = {}
+        for f in files:
+            groups.setdefault(self.__get_root(f), []).append(f)
+        return groups
+
+    def __scan_root(self, root, old_files, old_sizes, events):
+        # Runs in its own thread: the changes are applied by check_and_run_update
+        try:
+            # Also the check can hang, eg. on a network share that is not reachable
+            if not root.is_available():
+                Logger.warning(f"Library root {root.path} not available, skipped")
+                events.put((root, None, None))
+                return
+            result = root.scan(re.compile(r"\.(wav|mp3|flac)$"), old_files, old_sizes,
+                               lambda new_songs: events.put((root, new_songs, None)),
+                               self.scan_first_batch_size, self.scan_max_batch_size)
+        except Exception as e:
+            Logger.error(f"Library root {root.path} not scanned: {e}")
+            result = None
+        events.put((root, None, result))
@@ -0,0 +1,154 @@
+from types import MappingProxyType
+from lib.platform.songtable import SongTable
+
+LIBRARY_CATEGORIES = ["artist", "album", "playlist"]
+'''Categories of groups of songs in the library'''
+
+
+class LibrarySnapshot():
+    '''Immutable version of the library. The readers (eg. the UI) take the current snapshot and read it without locks,
+    while the writers (eg. a scan) change the data in the store and publish a new snapshot when a batch of changes is done.
+    A snapshot never changes: a reader that keeps it sees a consistent library, maybe an old one
+
+    Attributes
+    ----------
+    generation : int
+        Number of the version of the library. Incremented at every publication, compare it to know if a snapshot is stale
+    songs : SongTable
+        Read only table of the songs. The removed songs are tombstones (None)
+
+    Methods
+    -------
+    get_song(song_id: int) -> dict|None
+        Get a song by its id
+    get_songs(song_ids: list[int]) -> list[dict]
+        Get the songs with the given ids. The removed songs are skipped
+    get_all_songs() -> list[dict]
+        Get all the songs of the library
+    get_category(category: str) -> tuple[dict]
+        Get the groups of a category
+    get_group(category: str, name: str) -> dict|None
+        Get a group of a category by its name
+    next(songs: SongTable, song_rows: dict[int, int], groups: dict[str, list[dict]]) -> LibrarySnapshot
+        Create the next version of the library
+    '''
+
+    generation: int = 0
+    '''Number of the version of the library. Incremented at every publication, compare it to know if a snapshot is stale'''
+
+    songs: SongTable = None
+    '''Read only table of the songs. The removed songs are tombstones (None)'''
+
+    def __init__(self, generation: int = 0, songs: SongTable = None, song_rows: dict[int, int] = None, categories: dict[str, tuple] = None):
+        '''Create a new LibrarySnapshot. Use next to create it from the data of the store
+
+        Arguments
+        ---------
+        generation : int
+            Number of the version of the library
+        songs : SongTable
+            Read only table of the songs
+        song_rows : dict[int, int]
+            Row of every song in the table by its id. Not copied, must not be changed
+        categories : dict[str, tuple[MappingProxyType]]
+            Frozen groups of every category
+        '''
+        self.generation = generation
+        self.songs = songs if songs is not None else SongTable().copy(read_only=True)
+        self._song_rows = song_rows if song_rows is not None else {}
+        self._categories = categories if categories is not None else {category: () for category in LIBRARY_CATEGORIES}
+
+    def get_song(self, song_id: int) -> dict|None:
+        '''Get a song by its id
+
+        Arguments
+        ---------
+        song_id : int
+            Id of the song
+
+        Returns
+        -------
+        The song, or None if it is not in this version of the library
+        '''
+        row = self._song_rows.get(song_id)
+        return self.songs[row] if row is not None else None
+
+    def get_songs(self, song_ids: list[int]) -> list[dict]:
+        '''Get the songs with the given ids, eg. the songs of a playlist. The removed songs are skipped
+
+        Arguments
+        ---------
+        song_ids : list[int]
+            Ids of the songs
+
+        Returns
+        -------
+        The songs in the same order of the ids
+        '''
+        return [s for s in [self.get_song(i) for i in song_ids] if s is not None]
+
+    def get_all_songs(self) -> list[dict]:
+        '''Get all the songs of the library, without the tombstones of the removed songs'''
+        return [s for s in self.songs if s is not None]
+
+    def get_category(self, category: str) -> tuple[dict]:
+        '''Get the groups of a category. A group is a read only dictionary ("name", "songs", ...) and its songs are a tuple of ids
+
+        Arguments
+        ---------
+        category : str
+            One of LIBRARY_CATEGORIES (artist, album, playlist)
+        '''
+        return self._categories[category]
+
+    def get_group(self, category: str, name: str) -> dict|None:
+        '''Get a group of a category by its name, eg. the album of a song
+
+        Arguments
+        ---------
+        category : str
+            One of LIBRARY_CATEGORIES (artist, album, playlist)
+        name : str
+            Name of the group
+
+        Returns
+        -------
+        The read only group, or None if the category does not have a group with that name
+        '''
+        for group in self._categories[category]:
+            if group["name"] == name:
+                return group
+        return None
+
+    def next(self, songs: SongTable = None, song_rows: dict[int, int] = None, groups: dict[str, list[dict]] = None) -> "LibrarySnapshot":
+        '''Create the next version of the library. The parts that are not given are shared with this version
+
+        Arguments
+        ---------
+        songs : SongTable
+            The changed songs. They are copied
+        song_rows : dict[int, int]
+            Row of every song in the table by its id. Required with songs. It is copied
+        groups : dict[str, list[dict]]
+            The changed categories. Their groups are copied. Default None
+
+        Returns
+        -------
+        The new snapshot, with the next generation
+        '''
+        categories = dict(self._categories)
+        for category, category_groups in (groups or {}).items():
+            categories[category] = tuple([_freeze_group(group) for group in category_groups])
+        if songs is not None:
+            songs = songs.copy(read_only=True)
+            song_rows = dict(song_rows)
+        else:
+            songs = self.songs
+            song_rows = self._song_rows
+        return LibrarySnapshot(self.generation + 1, songs, song_rows, categories)
+
+
+def _freeze_group(group: dict) -> MappingProxyType:
+    frozen = dict(group)
+    frozen["songs"] = tuple(group["songs"])
+    return MappingProxyType(frozen)
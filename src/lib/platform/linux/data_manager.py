@@ -1,14 +1,78 @@
 import os
+import re
+from typing import Callable
+from kivy.logger import Logger
 from lib.platform.datamanager import DataManager
 
 class LinuxDataManager(DataManager):
     '''DataManager for Linux  OSs'''
-    def __init__(self, data_file_name=os.path.expanduser("~/playlist.json")):
+
+    storage_backend = "sqlite"
+    '''The data is saved in a SQLite database next to the JSON file'''
+
+    watchers: list = None
+    '''LibraryWatcher of every library root, that keep the library updated. None if not started'''
+
+    def __init__(self, data_file_name=os.path.expanduser("~/playlist.json"), watch_library=True):
         '''Create a new LinuxDataManager
 
         Arguments
         ---------
         data_file_name : str
             path to the configuration file. Default "~/playlist.json"
+        watch_library : bool
+            If True start_watcher keep the library updated using inotify. Default True
         '''
-        super().__init__(os.path.join(os.path.expanduser("~"), "Music"), data_file_name)
\ No newline at end of file
+        super().__init__(os.path.join(os.path.expanduser("~"), "Music"), data_file_name)
+        self.watch_library = watch_library
+
+    def start_watcher(self, on_changed: Callable[[], None]) -> bool:
+        '''Keep the library updated while the application is running using inotify on the available library roots
+
+        Arguments
+        ---------
+        on_changed : () -> None
+            Callback called, in the watcher thread, after a batch of changes is applied to the library
+
+        Returns
+        -------
+        True if the watcher is running
+        '''
+        if not self.watch_library:
+            return False
+        if self.watchers is None:
+            from lib.platform.linux.library_watcher import LibraryWatcher
+            watchers = []
+            for root in self.library_roots:
+                if not root.is_available():
+                    continue
+                try:
+                    watchers.append(LibraryWatcher(
+                        root.path,
+                        on_changes=lambda added, removed: self.__on_changes(added, removed, on_changed),
+                        on_overflow=lambda: self.check_and_run_update() and on_changed(),
+                        regex=re.compile(r"\.(wav|mp3|flac)$")))
+                except (OSError, AttributeError) as e:
+                    Logger.warning(f"Library watcher not available for {root.path}: {e}")
+            if len(watchers) == 0:
+                return False
+            for watcher in watchers:
+                watcher.start()
+            self.watchers = watchers
+        return True
+
+    def stop_watcher(self) -> None:
+        '''Stop the inotify watchers of the library roots. start_watcher can start them again'''
+        if self.watchers is not None:
+            for watcher in self.watchers:
+                watcher.stop()
+            self.watchers = None
+
+    def __on_changes(self, added, removed, on_changed):
+        with self._update_lock:
+            old_songs = set([s["file"] for s in self.get_all_songs()])
+            removed_songs = set([f for f in old_songs if any(f == r or f.startswith(os.path.join(r, "")) for r in removed)])
+            added = set([f for f in added if os.path.exists(f)])
+            changes = self.apply_changes(added - old_songs, removed_songs - added, added & old_songs)
+        if changes:
+            on_changed()
@@ -0,0 +1,197 @@
+from kivy.logger import Logger
+
+from threading import Thread
+from typing import Callable
+import ctypes
+import ctypes.util
+import select
+import struct
+import time
+import os
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+'''Events watched on every directory'''
+
+_event_header = struct.Struct("iIII")
+
+
+class LibraryWatcher():
+    '''Watch a folder and all its sub folders using inotify. The events are debounced and passed in batches to a callback
+
+    Attributes
+    ----------
+    folder : str
+        The watched folder
+    debounce : float
+        Seconds without events to wait before passing the batch to the callback
+    max_delay : float
+        Max seconds to wait before passing the batch to the callback when the events never stop
+
+    Methods
+    -------
+    start() -> None
+        Start watching in a daemon thread
+    stop() -> None
+        Stop watching
+    is_alive() -> bool
+        Check if the thread is still watching
+    '''
+
+    folder: str = None
+    '''The watched folder'''
+
+    debounce: float = 2
+    '''Seconds without events to wait before passing the batch to the callback'''
+
+    max_delay: float = 10
+    '''Max seconds to wait before passing the batch to the callback when the events never stop'''
+
+    def __init__(self,
+                 folder: str,
+                 on_changes: Callable[[set[str], set[str]], None],
+                 on_overflow: Callable[[], None],
+                 regex=None):
+        '''Create a new LibraryWatcher
+
+        Arguments
+        ---------
+        folder : str
+            The folder to watch
+        on_changes : (set[str], set[str]) -> None
+            Callback called in the watcher thread with the written or added files and the removed files or folders
+        on_overflow : () -> None
+            Callback called in the watcher thread when some events are lost and a full scan is required
+        regex : re.Pattern
+            Regex that the name of the files must match. If None all files are passed
+
+        Raises
+        ------
+        OSError
+            If inotify is not available
+        '''
+        self.folder = folder
+        self.on_changes = on_changes
+        self.on_overflow = on_overflow
+        self.regex = regex
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches = {}
+        self._added = set()
+        self._removed = set()
+        self._running = False
+        self._thread = None
+        self.__add_watch_recursive(folder)
+
+    def start(self) -> None:
+        '''Start watching in a daemon thread'''
+        self._running = True
+        self._thread = Thread(target=self.__run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self) -> None:
+        '''Stop watching. The thread ends within a second, the changes not passed to the callback yet are dropped'''
+        self._running = False
+
+    def is_alive(self) -> bool:
+        '''Check if the thread is still watching'''
+        return self._thread is not None and self._thread.is_alive()
+
+    def __run(self):
+        first_event = None
+        last_event = None
+        try:
+            while self._running:
+                # At most a second, so a stop is seen also while waiting for the end of a batch
+                timeout = 1 if last_event is None else max(0, min(1, last_event + self.debounce - time.monotonic(), first_event + self.max_delay - time.monotonic()))
+                ready, _, _ = select.select([self._fd], [], [], timeout)
+                if len(ready) > 0 and self.__read_events():
+                    last_event = time.monotonic()
+                    if first_event is None:
+                        first_event = last_event
+                # Checked whatever select returned, so a steady stream of events is still applied every max_delay
+                now = time.monotonic()
+                if self._running and last_event is not None and (now >= last_event + self.debounce or now >= first_event + self.max_delay):
+                    self.__flush()
+                    first_event = last_event = None
+        finally:
+            os.close(self._fd)
+
+    def __flush(self):
+        added, removed = self._added, self._removed
+        self._added, self._removed = set(), set()
+        if len(added) > 0 or len(removed) > 0:
+            try:
+                self.on_changes(added, removed)
+            except Exception as e:
+                Logger.error(f"LibraryWatcher: changes not applied: {e}")
+
+    def __read_events(self):
+        try:
+            buffer = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        relevant = False
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = _event_header.unpack_from(buffer, offset)
+            offset += _event_header.size
+            name = buffer[offset:offset + length].rstrip(b"\0").decode(errors="surrogateescape")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                Logger.warning("LibraryWatcher: event queue overflow")
+                self._added, self._removed = set(), set()
+                self.on_overflow()
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            if wd not in self._watches or mask & IN_DELETE_SELF:
+                continue
+
+            path = os.path.join(self._watches[wd], name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._removed.discard(path)
+                    self.__add_watch_recursive(path, add_files=True)
+                    relevant = True
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._added = set([f for f in self._added if not f.startswith(os.path.join(path, ""))])
+                    self._removed.add(path)
+                    relevant = True
+            elif self.regex is None or self.regex.search(name):
+                if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    self._removed.discard(path)
+                    self._added.add(path)
+                    relevant = True
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._added.discard(path)
+                    self._removed.add(path)
+                    relevant = True
+        return relevant
+
+    def __add_watch_recursive(self, folder, add_files=False):
+        for path, _, files in os.walk(folder):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                Logger.warning(f"LibraryWatcher: {path} not watched (errno {ctypes.get_errno()})")
+                continue
+            self._watches[wd] = path
+            if add_files:
+                # Files created before the watch was added does not generate events
+                self._added.update([os.path.join(path, f) for f in files if self.regex is None or self.regex.search(f)])
@@ -0,0 +1,163 @@
+from struct import Struct
+from zlib import crc32
+from threading import Lock
+import os
+import time
+
+PLAYBACK_STATE_VERSION = 1
+'''Version of the layout of the playback state file'''
+
+PLAYBACK_STATE_TEXT_SIZE = 232
+'''Max size in bytes of the UTF-8 encoded category and name of the playlist'''
+
+# magic, version, reserved, sequence, song id, position (ms), update time (ms since epoch),
+# length and bytes of the category of the playlist, length and bytes of the name of the playlist.
+# Big endian, the same layout is read and written by MediaRepository.java
+_layout = Struct(f">4sHHqqqqH{PLAYBACK_STATE_TEXT_SIZE}sH{PLAYBACK_STATE_TEXT_SIZE}s")
+_crc = Struct(">I")
+_magic = b"NMPS"
+
+PLAYBACK_STATE_SIZE = _layout.size + _crc.size
+'''Size in bytes of the playback state file. Always the same'''
+
+
+class PlaybackState():
+    '''Small fixed size record with the state of the playback: the playing song, its position and the playing playlist.
+    It is saved in its own file, next to the data file, so a checkpoint writes 512 bytes instead of the whole library.
+    The file is replaced atomically and ends with a CRC32, so a torn or corrupted file is ignored
+
+    Attributes
+    ----------
+    file_name : str
+        Path to the state file
+    song_id : int
+        Id of the last played song. -1 if none
+    position : int
+        Position in milliseconds in the last played song. -1 if unknown
+    playlist : str
+        Category of the last played playlist
+    playlist_name : str
+        Name of the last played playlist
+    sequence : int
+        Number of the last write. Incremented at every save
+
+    Methods
+    -------
+    load(fallback: dict) -> bool
+        Read the state file
+    save(song_id: int, position: int, playlist: str, playlist_name: str) -> None
+        Update the state and write it
+    '''
+
+    file_name: str = None
+    '''Path to the state file'''
+
+    song_id: int = -1
+    '''Id of the last played song. -1 if none'''
+
+    position: int = -1
+    '''Position in milliseconds in the last played song. -1 if unknown'''
+
+    playlist: str = ""
+    '''Category of the last played playlist'''
+
+    playlist_name: str = ""
+    '''Name of the last played playlist'''
+
+    sequence: int = 0
+    '''Number of the last write. Incremented at every save'''
+
+    def __init__(self, file_name: str):
+        '''Create a new PlaybackState. The file is not read until load is called
+
+        Arguments
+        ---------
+        file_name : str
+            Path to the state file
+        '''
+        self.file_name = file_name
+        self._lock = Lock()
+
+    def load(self, fallback: dict = None) -> bool:
+        '''Read the state file. If it is missing or not valid the state is taken from fallback
+
+        Arguments
+        ---------
+        fallback : dict
+            The "last_data" of the old configuration, with "last_song", "last_song_time", "last_playlist" and "last_playlist_name"
+
+        Returns
+        -------
+        True if the state file was read, False otherwise
+        '''
+        try:
+            with open(self.file_name, "rb") as f:
+                data = f.read(PLAYBACK_STATE_SIZE + 1)
+            self.__decode(data)
+            return True
+        except (OSError, ValueError):
+            pass
+        if fallback is not None:
+            try:
+                self.song_id = int(fallback.get("last_song", -1))
+            except ValueError:
+                self.song_id = -1
+            self.position = int(fallback.get("last_song_time", -1))
+            self.playlist = fallback.get("last_playlist", "")
+            self.playlist_name = fallback.get("last_playlist_name", "")
+        return False
+
+    def save(self, song_id: int = None, position: int = None, playlist: str = None, playlist_name: str = None) -> None:
+        '''Update the state and write it. Cheap enough to be called every few seconds
+
+        Arguments
+        ---------
+        song_id : int
+            Id of the playing song. None keeps the current value
+        position : int
+            Position in milliseconds in the playing song. None keeps the current value
+        playlist : str
+            Category of the playing playlist. None keeps the current value
+        playlist_name : str
+            Name of the playing playlist. None keeps the current value
+        '''
+        with self._lock:
+            if song_id is not None:
+                self.song_id = song_id
+            if position is not None:
+                self.position = position
+            if playlist is not None:
+                self.playlist = playlist
+            if playlist_name is not None:
+                self.playlist_name = playlist_name
+            self.sequence += 1
+            data = self.__encode()
+            tmp_file_name = f"{self.file_name}.{os.getpid()}.tmp"
+            with open(tmp_file_name, "wb") as f:
+                f.write(data)
+            os.replace(tmp_file_name, self.file_name)
+
+    def __encode(self):
+        playlist = _truncate(self.playlist)
+        playlist_name = _truncate(self.playlist_name)
+        data = _layout.pack(_magic, PLAYBACK_STATE_VERSION, 0, self.sequence, self.song_id, self.position,
+                            int(time.time() * 1000), len(playlist), playlist, len(playlist_name), playlist_name)
+        return data + _crc.pack(crc32(data))
+
+    def __decode(self, data):
+        if len(data) != PLAYBACK_STATE_SIZE or _crc.unpack_from(data, _layout.size)[0] != crc32(data[:_layout.size]):
+            raise ValueError("Playback state not valid")
+        magic, version, _, sequence, song_id, position, _, playlist_size, playlist, name_size, name = _layout.unpack_from(data)
+        if magic != _magic or version != PLAYBACK_STATE_VERSION:
+            raise ValueError(f"Playback state version {version} not supported")
+        self.sequence = sequence
+        self.song_id = song_id
+        self.position = position
+        self.playlist = playlist[:playlist_size].decode("utf-8")
+        self.playlist_name = name[:name_size].decode("utf-8")
+
+
+def _truncate(text: str) -> bytes:
+    data = text.encode("utf-8")[:PLAYBACK_STATE_TEXT_SIZE]
+    # Do not cut a character in half
+    return data.decode("utf-8", errors="ignore").encode("utf-8")
@@ -94,12 +94,16 @@ class Playlist():
     next_song = None
     '''Next song to play. Can be a song of the songs list or of the added_song list'''
 
+    checkpoint_interval: float = 5
+    '''Seconds between two saves of the playing song and its position in the playback state'''
+
     def __init__(self,
                  ):
         super().__init__()
         self.player = get_audio_player()
         self.player.on_song_end = lambda _: self.next()
         self.current_song = None
+        Clock.schedule_interval(self.__checkpoint, self.checkpoint_interval)
         
 
     
@@ -132,10 +136,16 @@ class Playlist():
         try:
             self.player.open_sound(os.path.join(data_manager.base_path, self.current_song["file"]), self.current_song)
             Clock.schedule_once(lambda _:self.on_song_changed(self.current_song))
+            data_manager.playback_state.save(song_id=self.current_song["id"], position=0)
             return True, ""
         except Exception as e:
             return False, str(e)
         
+    def __checkpoint(self, _):
+        # Only the small playback state file is written, not the library
+        if self.current_song is not None and self.player.state:
+            get_data_manager().playback_state.save(song_id=self.current_song["id"], position=self.player.get_position())
+
     def get_state(self, callback):
         callback(self.player.state)
         
@@ -200,4 +210,6 @@ class Playlist():
             The desired state of the player. True if play, False for pause        
         '''
         if state is None or (state and not self.player.state) or (not state and self.player.state):
-            self.player.playpause_sound()
\ No newline at end of file
+            self.player.playpause_sound()
+            if self.current_song is not None:
+                get_data_manager().playback_state.save(position=self.player.get_position())
\ No newline at end of file
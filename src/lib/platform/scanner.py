@@ -0,0 +1,609 @@
+from kivy.logger import Logger
+
+from lib.platform.tags import read_tags
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Iterator
+from hashlib import sha1
+from pathlib import Path
+import random
+import time
+import json
+import os
+import re
+
+
+IMAGE_REGEX = re.compile(r"\.(jpg|png)$")
+'''Regex that the name of the images must match'''
+
+DEFAULT_IMAGE = "assets/gelbe_Note.png"
+'''Image used when a song does not have one'''
+
+CONTENT_HASH_BLOCK = 8 * 1024
+'''Bytes read from the start and from the end of a file to calculate its content hash'''
+
+READ_POLL_INTERVAL = 0.1
+'''Seconds between the checks of which reads started, when read_songs has a timeout'''
+
+
+def read_song(file: str, music_folder: str, with_picture=False) -> dict:
+    '''Read the data of a single song. Use the tags if complete, otherwise try to guess the data from the path of the file.
+    Defined at module level so it can be sent to a worker process.
+
+    Arguments
+    ---------
+    file : str
+        Path of the song
+    music_folder : str
+        Root folder of the scan. Used to guess the artist from the path
+    with_picture : bool
+        If True add the field "picture" with the embedded cover (mime, data), when present
+
+    Returns
+    -------
+    song : dict["title": str, "album": str, "artist": str, "file": str, "track": int, "duration": int]
+        The song without the id and the image
+    '''
+    def get_title(filename):
+        title = re.match(r"[\d\s\-#\.]*(.+)", Path(filename).stem)
+        if title is not None:
+            return title[1]
+        else:
+            return re.sub(r"^([0-9]*)?\s?[-#.]?\s?(.*)$", r"\2", Path(filename).stem),
+
+    try:
+        tags = read_tags(file, with_picture)
+    except Exception:
+        tags = {}
+
+    if all(field in tags for field in ["title", "album", "artist", "track"]):
+        song = {
+            "title": get_title(tags["title"]),
+            "album": tags["album"],
+            "artist": tags["artist"],
+            "track": tags["track"],
+            "file": file,
+        }
+    else:
+        def get_track(f):
+            try:
+                return int(re.sub(r"^([0-9]*)?\s?[-#.]?\s?(.*)\.(wav|mp3|flac])$", r"\1", f))
+            except ValueError:
+                return 0
+
+        def get_artist(music_folder, file):
+            # The first folder inside music_folder
+            parts = Path(os.path.relpath(os.path.dirname(file), music_folder)).parts
+            return parts[0] if len(parts) > 0 and parts[0] != ".." else os.path.basename(os.path.dirname(file))
+
+        song = {
+            "title": get_title(file),
+            "album": re.sub(r"^^([0-9]*)?\s?[\.#-]?\s?(.*) ((\(*[0-9]{4}\)?))?$", r"\2", os.path.basename(os.path.dirname(file))+ ("" if os.path.basename(os.path.dirname(file)).endswith(")") else " ")),
+            "artist": get_artist(music_folder, file),
+            "track": get_track(os.path.basename(file)),
+            "file": file,
+        }
+    song["duration"] = tags.get("duration", 0)
+    if "picture" in tags:
+        song["picture"] = tags["picture"]
+    return song
+
+
+def song_order(song: dict) -> str:
+    '''Get the key that sorts the songs by artist, album, track and title, the order of the songs in the library and in its groups
+
+    Arguments
+    ---------
+    song : dict
+        The song, with its artist, album, track and title
+    '''
+    return song["artist"] + song["album"] + str(song["track"]) + song["title"]
+
+
+def read_songs(files,
+               music_folder: str,
+               find_image: Callable[[list[str]], str],
+               save_picture: Callable[[str, str, bytes], str] = None,
+               workers: int = None,
+               timeout: float = None,
+               use_processes=False) -> list[dict]:
+    '''Read the data of many songs on a pool of workers. The songs are sorted by artist, album, track and title and the id is the position in the list.
+    When a song has not an image in its folder its embedded cover is read in the same pass
+
+    Arguments
+    ---------
+    files : Iterable[str]
+        Paths of the songs
+    music_folder : str
+        Root folder of the scan
+    find_image : (list[str]) -> str
+        Function that return the image of a list of songs. Called in the calling thread
+    save_picture : (str, str, bytes) -> str
+        Function that save the embedded cover (file, mime, data) of a song and return the path to use as image. Called in the calling thread.
+        If None the embedded covers are not read
+    workers : int
+        Size of the pool. If None use the number of cores
+    timeout : float
+        Seconds to wait for a single file, measured from when its read starts. If the time is elapsed the file is skipped. If None wait forever.
+        A read that timed out is abandoned, not stopped: its worker stays busy until the read returns. When all the workers are busy with
+        abandoned reads the files not read yet are skipped too
+    use_processes : bool
+        If True use a pool of processes instead of a pool of threads
+
+    Returns
+    -------
+    songs : list[dict["title": str, "album": str, "artist": str, "file": str, "track": int, "duration": int, "image": str, "id": int]]
+        The songs read. Files that failed or timed out are not present
+    '''
+    workers = workers or os.cpu_count() or 1
+    executor = (ProcessPoolExecutor if use_processes else ThreadPoolExecutor)(max_workers=workers)
+    songs = []
+    try:
+        futures = {}
+        for f in files:
+            image = find_image([f])
+            with_picture = save_picture is not None and image == DEFAULT_IMAGE
+            futures[executor.submit(read_song, f, music_folder, with_picture)] = (f, image)
+        pending = set(futures)
+        # When every read started, seen by polling, and the abandoned reads that are still running
+        started = {}
+        abandoned = set()
+        while len(pending) > 0:
+            poll = None
+            if timeout is not None:
+                now = time.monotonic()
+                for future in pending:
+                    if future not in started and future.running():
+                        started[future] = now
+                deadlines = [started[future] + timeout for future in pending if future in started]
+                poll = min(deadlines + [now + READ_POLL_INTERVAL]) - now
+            done, pending = wait(pending, timeout=max(0, poll) if poll is not None else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                f, image = futures[future]
+                try:
+                    song = future.result()
+                    picture = song.pop("picture", None)
+                    song["image"] = image if picture is None else save_picture(f, *picture)
+                    songs.append(song)
+                except Exception as e:
+                    Logger.warning(f"Skipped {f}: {e}")
+            if timeout is None:
+                continue
+            now = time.monotonic()
+            for future in [future for future in pending if future in started and now >= started[future] + timeout]:
+                pending.remove(future)
+                abandoned.add(future)
+                Logger.warning(f"Skipped {futures[future][0]}: timeout of {timeout}s elapsed")
+            abandoned = set([future for future in abandoned if not future.done()])
+            if len(abandoned) >= workers and len(pending) > 0:
+                for future in pending:
+                    future.cancel()
+                Logger.warning(f"Skipped {len(pending)} files: all the workers are stuck reading")
+                pending = set()
+    finally:
+        # A file that is still being read must not block the scan
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    songs = sorted(songs, key=song_order)
+    for k, s in enumerate(songs):
+        s["id"] = k
+    return songs
+
+
+class FingerprintCache():
+    '''Persisted fingerprint (size, mtime, inode) of every scanned file. Used to find the files changed since the last scan with only a stat of the file.
+    Optionally a file has also a content hash, that does not change when the file is moved or renamed
+
+    Attributes
+    ----------
+    file_name : str
+        Path to the file where the fingerprints are saved
+
+    Methods
+    -------
+    is_changed(file: str, stat: os.stat_result) -> bool
+        Check if a file is changed since its fingerprint was saved
+    has(file: str) -> bool
+        Check if a file has a fingerprint
+    update(file: str, stat: os.stat_result) -> None
+        Save the fingerprint of a file
+    remove(file: str) -> None
+        Forget the fingerprint of a file
+    content_hash(file: str, size: int) -> str
+        Calculate a cheap hash of the content of a file
+    get_content_hash(file: str) -> str|None
+        Get the content hash saved for a file
+    set_content_hash(file: str, content_hash: str) -> None
+        Save the content hash of a file
+    sizes() -> set[int]
+        Get the sizes of all the files with a fingerprint
+    save() -> None
+        Write the fingerprints in the file
+    '''
+
+    file_name: str = None
+    '''Path to the file where the fingerprints are saved'''
+
+    def __init__(self, file_name: str):
+        '''Create a new FingerprintCache loading the fingerprints saved in file_name, if any
+
+        Arguments
+        ---------
+        file_name : str
+            Path to the file where the fingerprints are saved
+        '''
+        self.file_name = file_name
+        self._fingerprints = {}
+        if os.path.exists(file_name):
+            try:
+                with open(file_name, "r") as f:
+                    self._fingerprints = json.load(f)
+            except (OSError, ValueError) as e:
+                Logger.warning(f"Fingerprints not loaded from {file_name}: {e}")
+
+    @staticmethod
+    def fingerprint(stat: os.stat_result) -> list[int]:
+        '''Get the fingerprint of a file from its stat'''
+        return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+    @staticmethod
+    def content_hash(file: str, size: int) -> str:
+        '''Calculate a cheap hash of the content of a file, from its size, its first and its last CONTENT_HASH_BLOCK bytes
+
+        Arguments
+        ---------
+        file : str
+            Path of the file
+        size : int
+            Size of the file
+        '''
+        h = sha1(str(size).encode())
+        with open(file, "rb") as f:
+            h.update(f.read(CONTENT_HASH_BLOCK))
+            if size > CONTENT_HASH_BLOCK:
+                f.seek(max(CONTENT_HASH_BLOCK, size - CONTENT_HASH_BLOCK))
+                h.update(f.read(CONTENT_HASH_BLOCK))
+        return h.hexdigest()
+
+    def is_changed(self, file: str, stat: os.stat_result) -> bool:
+        '''Check if a file is changed since its fingerprint was saved. A file without fingerprint is not considered changed
+
+        Arguments
+        ---------
+        file : str
+            Path of the file
+        stat : os.stat_result
+            Current stat of the file
+        '''
+        return file in self._fingerprints and self._fingerprints[file][:3] != self.fingerprint(stat)
+
+    def has(self, file: str) -> bool:
+        '''Check if a file has a fingerprint, eg. a song of a library created before the fingerprints does not have it'''
+        return file in self._fingerprints
+
+    def update(self, file: str, stat: os.stat_result) -> None:
+        '''Save the fingerprint of a file. The content hash is kept only if the file is not changed'''
+        fingerprint = self.fingerprint(stat)
+        if file in self._fingerprints and self._fingerprints[file][:3] == fingerprint:
+            return
+        self._fingerprints[file] = fingerprint
+
+    def get_content_hash(self, file: str) -> str|None:
+        '''Get the content hash saved for a file. None if not saved'''
+        fingerprint = self._fingerprints.get(file)
+        return fingerprint[3] if fingerprint is not None and len(fingerprint) > 3 else None
+
+    def set_content_hash(self, file: str, content_hash: str) -> None:
+        '''Save the content hash of a file. The file must have a fingerprint'''
+        if file in self._fingerprints:
+            self._fingerprints[file] = self._fingerprints[file][:3] + [content_hash]
+
+    def sizes(self) -> set[int]:
+        '''Get the sizes of all the files with a fingerprint'''
+        return set([fingerprint[0] for fingerprint in self._fingerprints.values()])
+
+    def remove(self, file: str) -> None:
+        '''Forget the fingerprint of a file'''
+        self._fingerprints.pop(file, None)
+
+    def save(self) -> None:
+        '''Write the fingerprints in the file. Use a temporary file so an interrupted write does not corrupt the previous one'''
+        tmp_file_name = self.file_name + ".tmp"
+        with open(tmp_file_name, "w") as f:
+            # A copy, the fingerprints can be read by the walk of a root in another thread
+            json.dump(dict(self._fingerprints), f)
+        os.replace(tmp_file_name, self.file_name)
+
+
+class DirectoryIndex():
+    '''Persisted listing of every scanned directory with its mtime. A directory is listed again only if its mtime changed since the last scan.
+    The same listing is used to find the images of the songs without accessing the file system
+
+    Attributes
+    ----------
+    file_name : str
+        Path to the file where the index is saved
+
+    Methods
+    -------
+    walk(folder: str, regex: re.Pattern) -> Iterator[str]
+        Stream the files inside a folder and its sub folders whose name match a regex
+    find_image(songs: list[str], is_random=False) -> str
+        Search an image in the folders of a list of songs
+    set_cover(folder: str, image: str) -> None
+        Set the image to use for a folder without images
+    save() -> None
+        Write the index in the file
+    '''
+
+    file_name: str = None
+    '''Path to the file where the index is saved'''
+
+    def __init__(self, file_name: str):
+        '''Create a new DirectoryIndex loading the index saved in file_name, if any
+
+        Arguments
+        ---------
+        file_name : str
+            Path to the file where the index is saved
+        '''
+        self.file_name = file_name
+        self._directories = {}
+        if os.path.exists(file_name):
+            try:
+                with open(file_name, "r") as f:
+                    self._directories = json.load(f)
+            except (OSError, ValueError) as e:
+                Logger.warning(f"Directory index not loaded from {file_name}: {e}")
+
+    def walk(self, folder: str, regex: re.Pattern) -> Iterator[str]:
+        '''Stream the files inside a folder and its sub folders whose name match a regex. Only the directories changed since the last walk are listed,
+        for the others the previous listing is used. Like os.walk the symbolic links to directories are not followed
+
+        Arguments
+        ---------
+        folder : str
+            Root of the walk
+        regex : re.Pattern
+            Regex that the name of the files must match
+
+        Returns
+        -------
+        Iterator over the path of the files
+        '''
+        visited = set()
+        stack = [folder]
+        while len(stack) > 0:
+            path = stack.pop()
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            entry = self._directories.get(path)
+            if entry is None or entry[0] != mtime:
+                old_entry = entry
+                entry = self.__list_directory(path, mtime)
+                if entry is None:
+                    continue
+                if old_entry is not None:
+                    # Keep the cover extracted from the songs
+                    entry += old_entry[3:]
+                self._directories[path] = entry
+            visited.add(path)
+
+            for name in entry[1]:
+                if regex.search(name):
+                    yield os.path.join(path, name)
+            stack.extend([os.path.join(path, name) for name in reversed(entry[2])])
+
+        # Forget the directories under folder that does not exist anymore
+        for path in list(self._directories.keys()):
+            if path not in visited and (path == folder or path.startswith(os.path.join(folder, ""))):
+                del self._directories[path]
+
+    def find_image(self, songs: list[str], is_random=False) -> str:
+        '''Search an image in a list of songs. Search for an image in the same folder of the songs or in its sub folders.
+        Use the listing of the last walk, a folder is listed only if it was never walked
+
+        Arguments
+        ---------
+        songs : list[str]
+            List of songs where search the image
+        is_random : bool
+            If True choose a random image between all the images found. Otherwise return the first one
+
+        Returns
+        -------
+        image_path : str
+            Path to an image. If not image is found return DEFAULT_IMAGE
+        '''
+        all_images = []
+        covers = []
+        for dirname in set([os.path.dirname(s) for s in songs]):
+            stack = [dirname]
+            while len(stack) > 0:
+                path = stack.pop()
+                entry = self._directories.get(path)
+                if entry is None:
+                    try:
+                        entry = self.__list_directory(path, os.stat(path).st_mtime_ns)
+                    except OSError:
+                        entry = None
+                    if entry is None:
+                        continue
+                    self._directories[path] = entry
+                for name in entry[1]:
+                    if IMAGE_REGEX.search(name):
+                        if not is_random:
+                            return os.path.join(path, name)
+                        all_images.append(os.path.join(path, name))
+                covers += entry[3:]
+                stack.extend([os.path.join(path, name) for name in reversed(entry[2])])
+        if len(all_images) > 0:
+            return random.choice(list(set(all_images)))
+        if len(covers) > 0:
+            return random.choice(list(set(covers))) if is_random else covers[0]
+        return DEFAULT_IMAGE
+
+    def set_cover(self, folder: str, image: str) -> None:
+        '''Set the image to use for a folder without images, usually the cover embedded in its songs
+
+        Arguments
+        ---------
+        folder : str
+            The folder. Must be already listed by walk
+        image : str
+            Path to the image
+        '''
+        entry = self._directories.get(folder)
+        if entry is not None:
+            self._directories[folder] = entry[:3] + [image]
+
+    def save(self) -> None:
+        '''Write the index in the file. Use a temporary file so an interrupted write does not corrupt the previous one'''
+        tmp_file_name = self.file_name + ".tmp"
+        with open(tmp_file_name, "w") as f:
+            # A copy, the directories can be changed by a walk in another thread
+            json.dump(dict(self._directories), f)
+        os.replace(tmp_file_name, self.file_name)
+
+    def __list_directory(self, path, mtime):
+        files = []
+        directories = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            directories.append(entry.name)
+                    else:
+                        files.append(entry.name)
+        except OSError as e:
+            Logger.warning(f"Directory {path} not listed: {e}")
+            return None
+        return [mtime, files, directories]
+
+
+class LibraryRoot():
+    '''A folder of the library (eg. the internal storage, an SD card, a mounted network share) with its own shard of the index:
+    its FingerprintCache and its DirectoryIndex. The roots are scanned concurrently and merged in the same library
+
+    Attributes
+    ----------
+    path : str
+        The folder
+    fingerprints : FingerprintCache
+        Fingerprint of every song file of the root
+    directories : DirectoryIndex
+        Listing and mtime of every directory of the root
+
+    Methods
+    -------
+    is_available() -> bool
+        Check if the folder can be read, eg. the SD card is mounted
+    contains(file: str) -> bool
+        Check if a file is inside the root
+    scan(regex: re.Pattern, old_files: set[str], old_sizes: set[int], on_new_files: (set[str]) -> None, first_batch_size: int, max_batch_size: int) -> tuple|None
+        Walk the root and find the new, changed, maybe moved and not fingerprinted files
+    save() -> None
+        Write the shard of the index
+    '''
+
+    path: str = None
+    '''The folder'''
+
+    fingerprints: FingerprintCache = None
+    '''Fingerprint of every song file of the root'''
+
+    directories: DirectoryIndex = None
+    '''Listing and mtime of every directory of the root'''
+
+    def __init__(self, path: str, shard_name: str):
+        '''Create a new LibraryRoot loading its shard, if any
+
+        Arguments
+        ---------
+        path : str
+            The folder
+        shard_name : str
+            Path without extension of the files of the shard, eg. "~/playlist" for "~/playlist.fingerprints.json"
+        '''
+        self.path = path
+        self.fingerprints = FingerprintCache(shard_name + ".fingerprints.json")
+        self.directories = DirectoryIndex(shard_name + ".directories.json")
+
+    def is_available(self) -> bool:
+        '''Check if the folder can be read, eg. the SD card is mounted or the network share is reachable'''
+        return os.path.isdir(self.path)
+
+    def contains(self, file: str) -> bool:
+        '''Check if a file is inside the root'''
+        return file.startswith(os.path.join(self.path, ""))
+
+    def scan(self,
+             regex: re.Pattern,
+             old_files: set[str],
+             old_sizes: set[int],
+             on_new_files: Callable[[set[str]], None],
+             first_batch_size: int,
+             max_batch_size: int) -> tuple[set[str], set[str], set[str], set[str], set[str]]|None:
+        '''Walk the root and find the new, changed, maybe moved and not fingerprinted files.
+        The fingerprints are only read, so it can run in its own thread
+
+        Arguments
+        ---------
+        regex : re.Pattern
+            Regex that the name of the songs must match
+        old_files : set[str]
+            Songs of the root already in the library
+        old_sizes : set[int]
+            Sizes of all the songs of the library. A new file with one of these sizes can be a moved song
+        on_new_files : (set[str]) -> None
+            Called, in the calling thread, with every batch of new files found, while the walk continue
+        first_batch_size : int
+            Size of the first batch of new files. The next batches are twice as big
+        max_batch_size : int
+            Max size of a batch of new files
+
+        Returns
+        -------
+        (all_files, new_files, maybe_moved_files, changed_files, unknown_files) with the new files not yet passed to on_new_files
+        and the old files without a fingerprint (eg. added before the fingerprints or imported), whose change can not be checked.
+        None if the root was not available until the end of the walk
+        '''
+        all_files = set()
+        new_files = set()
+        maybe_moved_files = set()
+        changed_files = set()
+        unknown_files = set()
+        batch_size = first_batch_size
+        for f in self.directories.walk(self.path, regex):
+            all_files.add(f)
+            try:
+                stat = os.stat(f)
+            except OSError:
+                stat = None
+            if f in old_files:
+                if stat is not None and self.fingerprints.is_changed(f, stat):
+                    changed_files.add(f)
+                elif stat is not None and not self.fingerprints.has(f):
+                    unknown_files.add(f)
+            elif stat is not None and stat.st_size in old_sizes:
+                # Can be a moved song, wait to know the removed songs
+                maybe_moved_files.add(f)
+            else:
+                new_files.add(f)
+                if len(new_files) >= batch_size:
+                    on_new_files(new_files)
+                    new_files = set()
+                    # Few songs are shown fast, then bigger batches to save the file less often
+                    batch_size = min(batch_size * 2, max_batch_size)
+        if not self.is_available():
+            # Unmounted during the walk: the missing files are not removed songs
+            return None
+        return all_files, new_files, maybe_moved_files, changed_files, unknown_files
+
+    def save(self) -> None:
+        '''Write the shard of the index'''
+        self.fingerprints.save()
+        self.directories.save()
@@ -0,0 +1,534 @@
+from lib.platform.vectorsearch import encode_tokens, encode_groups, group_members, group_max, start_similarities, top_rows, union_rows, \
+    VECTOR_SEARCH_AVAILABLE, VECTOR_MIN_WORDS, VECTOR_TOKEN_WIDTH
+
+from nltk.metrics.distance import jaro_winkler_similarity
+from typing import Callable
+import heapq
+import math
+
+SEARCH_FIELD_WEIGHTS = {"title": 1.0, "artist": 0.95, "album": 0.9}
+'''Default weight of the fields searched by MultiFieldSearchIndex. A match on the title is worth more than one on the artist or the album'''
+
+
+class SearchCancelled(Exception):
+    '''Raised by a search when its cancelled callback returns True, eg. because the user typed another query'''
+
+
+def normalise(text: str) -> list[str]:
+    '''Split a text in the tokens used by the search: lower case words'''
+    return [t for t in text.lower().split(" ") if t != ""]
+
+
+def grams(token: str) -> set[str]:
+    '''Get the grams of a token used to find the candidates of a query word: its bigrams, with a space before the first letter so the first gram is the prefix'''
+    padded = " " + token
+    return set([padded[i:i + 2] for i in range(len(token))])
+
+
+class SearchIndex():
+    '''Inverted index of the words of a field of the songs. Built once for a version of the library, it finds the best songs for a query
+    without comparing the query with every song: only the words that share enough grams with a query word are compared, with the
+    Jaro-Winkler similarity, and only the songs with the best words are ranked.
+    The rank of a song approximates the one of a full scan: for every query word 1 - the best similarity with the start of a word of the song.
+    It is the same when the best word of the song shares at least a third of the grams of the query word (eg. a typo or a missing letter);
+    a word that shares fewer grams, even if similar for Jaro-Winkler (eg. many letters swapped), is not compared and counts as not found.
+    With numpy the similarities of the candidate words, and of the songs that have them, are computed at once (see lib.platform.vectorsearch)
+
+    Attributes
+    ----------
+    songs : list[dict]
+        The indexed songs
+    field : str
+        The indexed field of the songs
+    vectorized : bool
+        If True the similarities are computed with numpy. Default True if numpy is installed
+
+    Methods
+    -------
+    search(query: str, top: int, accepted_percentage: float) -> list[dict]
+        Get the songs that match a query the best
+    '''
+
+    songs: list[dict] = None
+    '''The indexed songs'''
+
+    field: str = "title"
+    '''The indexed field of the songs'''
+
+    vectorized: bool = VECTOR_SEARCH_AVAILABLE
+    '''If True the similarities are computed with numpy. Default True if numpy is installed'''
+
+    def __init__(self, songs: list[dict], field="title"):
+        '''Create a new SearchIndex
+
+        Arguments
+        ---------
+        songs : list[dict]
+            The songs to index. The list must not change while the index is used
+        field : str
+            The field of the songs to index. Default "title"
+        '''
+        self.songs = songs
+        self.field = field
+        self._tokens = []
+        token_ids = {}
+        # Words of every song and songs of every word, by position in the lists
+        self._song_tokens = []
+        self._token_songs = []
+        for i, song in enumerate(songs):
+            song_tokens = []
+            for token in normalise(song[field]):
+                token_id = token_ids.get(token)
+                if token_id is None:
+                    token_id = len(self._tokens)
+                    token_ids[token] = token_id
+                    self._tokens.append(token)
+                    self._token_songs.append([])
+                if token_id not in song_tokens:
+                    song_tokens.append(token_id)
+                    self._token_songs[token_id].append(i)
+            self._song_tokens.append(song_tokens)
+        # Arrays for numpy, built by the first vectorized search
+        self._codes = None
+        self._gram_tokens = {}
+        for token_id, token in enumerate(self._tokens):
+            for gram in grams(token):
+                self._gram_tokens.setdefault(gram, []).append(token_id)
+
+    def search(self, query: str, top=5, accepted_percentage=1) -> list[dict]:
+        '''Get the songs that match a query the best
+
+        Arguments
+        ---------
+        query : str
+            The text to search
+        top : int
+            Number of songs to return. Default 5
+        accepted_percentage : float
+            Max distance (1 - similarity) of a query word with a word of the song. If further the word counts as not found. Default 1
+
+        Returns
+        -------
+        Top songs ordered by rank. Between songs with the same rank, the first in the songs list come first
+        '''
+        words = normalise(query)
+        if len(words) == 0:
+            return self.songs[:top]
+        similarities = [self.word_similarities(w) for w in words]
+        return [self.songs[i] for i in self.top_songs(similarities, top, accepted_percentage)]
+
+    def word_similarities(self, word: str, candidates: dict[int, float] = None) -> dict[int, float]:
+        '''Get the similarity of a query word with the words of the index that share enough grams with it.
+        The others are considered not similar
+
+        Arguments
+        ---------
+        word : str
+            Normalised query word
+        candidates : dict[int, float]
+            If given only these words are compared, eg. the similar words of the query word before the user typed more letters
+
+        Returns
+        -------
+        Similarity by id of the word of the index. Only the words with a similarity greater than 0 are present
+        '''
+        word_grams = grams(word)
+        # A typo changes at most two bigrams, so a similar word shares many of them
+        min_shared = max(1, math.ceil(len(word_grams) / 3))
+        if len(word) > 1:
+            # The first two letters swapped is a common typo that changes the prefix
+            word_grams |= grams(word[1] + word[0])
+        shared = {}
+        for gram in word_grams:
+            for token_id in self._gram_tokens.get(gram, []):
+                if candidates is None or token_id in candidates:
+                    shared[token_id] = shared.get(token_id, 0) + 1
+        compared = [token_id for token_id, count in shared.items() if count >= min_shared]
+        similarities = {}
+        if self.vectorized and len(word) <= VECTOR_TOKEN_WIDTH and len(compared) >= VECTOR_MIN_WORDS:
+            self.__encode()
+            values = start_similarities(word, self._codes[compared], self._lengths[compared])
+            for token_id, similarity in zip(compared, values.tolist()):
+                if similarity > 0:
+                    similarities[token_id] = similarity
+            return similarities
+        # The similarity is with the start of the word, many words share it
+        cache = {}
+        for token_id in compared:
+            start = self._tokens[token_id][:len(word)]
+            similarity = cache.get(start)
+            if similarity is None:
+                similarity = jaro_winkler_similarity(word, start, max_l=2)
+                cache[start] = similarity
+            if similarity > 0:
+                similarities[token_id] = similarity
+        return similarities
+
+    def song_rows(self, similarities: dict[int, float]):
+        '''Get the songs that have some words of the index. Requires numpy
+
+        Arguments
+        ---------
+        similarities : dict[int, float]
+            Similarity by id of the word of the index, returned by word_similarities
+
+        Returns
+        -------
+        numpy.ndarray with the position of the songs, a song may be repeated
+        '''
+        self.__encode()
+        return group_members(self._token_flat, self._token_starts, list(similarities))[0]
+
+    def rows_similarities(self, similarities: dict[int, float], rows):
+        '''Get the best similarity of some songs: the best similarity of their words. Requires numpy
+
+        Arguments
+        ---------
+        similarities : dict[int, float]
+            Similarity by id of the word of the index, returned by word_similarities
+        rows : numpy.ndarray
+            Position of the songs
+
+        Returns
+        -------
+        numpy.ndarray with the similarity of every song
+        '''
+        self.__encode()
+        return group_max(similarities, len(self._tokens), self._song_flat, self._song_starts, rows)
+
+    def __encode(self):
+        if self._codes is None:
+            self._song_flat, self._song_starts = encode_groups(self._song_tokens)
+            self._token_flat, self._token_starts = encode_groups(self._token_songs)
+            self._codes, self._lengths = encode_tokens(self._tokens)
+
+    def top_songs(self, similarities: list[dict[int, float]], top: int, accepted_percentage=1) -> list[int]:
+        '''Rank the songs from the similarities of the query words. The songs are read in order of similarity of their words and the
+        search stops when no other song can be better than the ones found (threshold algorithm)
+
+        Arguments
+        ---------
+        similarities : list[dict[int, float]]
+            For every query word the similarity by id of the word of the index, returned by word_similarities
+        top : int
+            Number of songs to return
+        accepted_percentage : float
+            Max distance of a query word with a word of the song. If further the word counts as not found
+
+        Returns
+        -------
+        Position in the songs list of the top songs, ordered by rank
+        '''
+        def song_similarities(i):
+            return [max([s.get(t, 0.0) for t in self._song_tokens[i]], default=0.0) for s in similarities]
+
+        orders = [sorted(s.items(), key=lambda x: -x[1]) for s in similarities]
+        return _threshold_top(orders, self._token_songs.__getitem__, song_similarities, len(self.songs), top, accepted_percentage)
+
+
+class MultiFieldSearchIndex():
+    '''Search on several fields of the songs (eg. title, artist and album), each one with its own SearchIndex.
+    Every query word is matched with the field where it is the most similar, after multiplying the similarity by the weight of the field,
+    so a query can mix eg. words of the title and of the artist. The top songs are found with the same threshold algorithm of SearchIndex,
+    reading the words of all the fields in order of weighted similarity
+
+    Attributes
+    ----------
+    songs : list[dict]
+        The indexed songs
+    weights : dict[str, float]
+        Weight of every searched field. Between 0 and 1, the most important field should have 1
+    indexes : dict[str, SearchIndex]
+        Index of every searched field
+
+    Methods
+    -------
+    search(query: str, top: int, accepted_percentage: float) -> list[tuple[dict, str]]
+        Get the songs that match a query the best and the field that matched
+    '''
+
+    songs: list[dict] = None
+    '''The indexed songs'''
+
+    weights: dict[str, float] = None
+    '''Weight of every searched field. Between 0 and 1, the most important field should have 1'''
+
+    indexes: dict[str, SearchIndex] = None
+    '''Index of every searched field'''
+
+    def __init__(self, songs: list[dict], weights: dict[str, float] = SEARCH_FIELD_WEIGHTS, indexes: dict[str, SearchIndex] = None):
+        '''Create a new MultiFieldSearchIndex
+
+        Arguments
+        ---------
+        songs : list[dict]
+            The songs to index. The list must not change while the index is used
+        weights : dict[str, float]
+            Weight of every field to search. Default SEARCH_FIELD_WEIGHTS
+        indexes : dict[str, SearchIndex]
+            Indexes already built for the same songs. They are reused, the missing fields are indexed. Default None
+        '''
+        self.songs = songs
+        self.weights = dict(weights)
+        self.indexes = {}
+        for field in self.weights:
+            index = None if indexes is None else indexes.get(field)
+            if index is None or index.songs is not songs:
+                index = SearchIndex(songs, field)
+            self.indexes[field] = index
+
+    def search(self, query: str, top=5, accepted_percentage=1) -> list[tuple[dict, str]]:
+        '''Get the songs that match a query the best and the field that matched
+
+        Arguments
+        ---------
+        query : str
+            The text to search
+        top : int
+            Number of songs to return. Default 5
+        accepted_percentage : float
+            Max distance (1 - weighted similarity) of a query word with a word of the song. If further the word counts as not found. Default 1
+
+        Returns
+        -------
+        Top songs ordered by rank, with the field that matched the most query words. Between songs with the same rank, the first in the songs list come first
+        '''
+        words = normalise(query)
+        if len(words) == 0 or len(self.weights) == 0:
+            return [(s, next(iter(self.weights), "title")) for s in self.songs[:top]]
+        return self.top_songs([self.word_similarities(w) for w in words], top, accepted_percentage)
+
+    def word_similarities(self, word: str, candidates: list[dict[int, float]] = None) -> list[dict[int, float]]:
+        '''Get the weighted similarity of a query word with the similar words of every field
+
+        Arguments
+        ---------
+        word : str
+            Normalised query word
+        candidates : list[dict[int, float]]
+            If given only these words are compared, for every field in the order of weights. See SearchIndex.word_similarities
+
+        Returns
+        -------
+        For every field, in the order of weights, the similarity multiplied by the weight of the field by id of the word of the field index
+        '''
+        similarities = []
+        for k, (field, weight) in enumerate(self.weights.items()):
+            field_candidates = candidates[k] if candidates is not None else None
+            similarities.append({t: s * weight for t, s in self.indexes[field].word_similarities(word, field_candidates).items()})
+        return similarities
+
+    def top_songs(self, similarities: list[list[dict[int, float]]], top: int, accepted_percentage=1,
+                  song_similarities: list[dict[int, list[float]]] = None, cancelled: Callable[[], bool] = None) -> list[tuple[dict, str]]:
+        '''Rank the songs from the weighted similarities of the query words, with the same threshold algorithm of SearchIndex.top_songs
+
+        Arguments
+        ---------
+        similarities : list[list[dict[int, float]]]
+            For every query word the similarities of every field, returned by word_similarities
+        top : int
+            Number of songs to return
+        accepted_percentage : float
+            Max distance of a query word with a word of the song. If further the word counts as not found
+        song_similarities : list[dict[int, list[float]]]
+            For every query word the best similarity of every field by position of the song. Filled while the songs are ranked,
+            pass the same dictionaries to reuse them for a query with the same words. Not used when the indexes are vectorized
+        cancelled : () -> bool
+            Checked while the songs are ranked. When it returns True the search stops
+
+        Returns
+        -------
+        Top songs ordered by rank, with the field that matched the most query words
+
+        Raises
+        ------
+        SearchCancelled
+            If cancelled returned True
+        '''
+        fields = list(self.weights)
+        if all([index.vectorized for index in self.indexes.values()]):
+            return self.__top_songs_vectorized(similarities, top, accepted_percentage, cancelled)
+        if song_similarities is None:
+            song_similarities = [{} for _ in similarities]
+
+        def field_similarities(i):
+            result = []
+            for word, cache in zip(similarities, song_similarities):
+                best = cache.get(i)
+                if best is None:
+                    best = [max([s.get(t, 0.0) for t in self.indexes[f]._song_tokens[i]], default=0.0) for f, s in zip(fields, word)]
+                    cache[i] = best
+                result.append(best)
+            return result
+
+        def best_similarities(i):
+            return [max(word) for word in field_similarities(i)]
+
+        def token_songs(key):
+            return self.indexes[fields[key[0]]]._token_songs[key[1]]
+
+        orders = [sorted([((k, t), s) for k, field in enumerate(word) for t, s in field.items()], key=lambda x: -x[1]) for word in similarities]
+        results = []
+        for i in _threshold_top(orders, token_songs, best_similarities, len(self.songs), top, accepted_percentage, cancelled):
+            # The field where the most similar words are found
+            totals = [0.0] * len(fields)
+            for word in field_similarities(i):
+                best = max(range(len(fields)), key=lambda k: word[k])
+                totals[best] += word[best]
+            results.append((self.songs[i], fields[max(range(len(fields)), key=lambda k: totals[k])]))
+        return results
+
+    def __top_songs_vectorized(self, similarities, top, accepted_percentage, cancelled):
+        # Only the songs with a similar word are scored, all at once. The other songs match no word
+        indexes = [self.indexes[field] for field in self.weights]
+        rows = union_rows([index.song_rows(s) for word in similarities for index, s in zip(indexes, word) if len(s) > 0])
+        best = []
+        for word in similarities:
+            if cancelled is not None and cancelled():
+                raise SearchCancelled()
+            best.append([index.rows_similarities(s, rows) for index, s in zip(indexes, word)])
+        fields = list(self.weights)
+        return [(self.songs[i], fields[k]) for i, k in top_rows(best, rows, len(self.songs), top, accepted_percentage)]
+
+
+class IncrementalSearch():
+    '''Search as the user types. The similar words and the scores of the songs of the previous query are kept:
+    the words that did not change reuse them, and when the user types more letters of the last word only the words that were similar
+    to it are compared again. When a word is deleted or changed it is searched again in all the index.
+    The longer the query the fewer the candidates, so every key press costs less than the one before
+
+    Attributes
+    ----------
+    index : MultiFieldSearchIndex
+        The searched index
+    query : list[str]
+        Normalised words of the last query
+
+    Methods
+    -------
+    search(query: str, top: int, accepted_percentage: float) -> list[tuple[dict, str]]
+        Get the songs that match a query the best and the field that matched
+    '''
+
+    index: MultiFieldSearchIndex = None
+    '''The searched index'''
+
+    query: list[str] = None
+    '''Normalised words of the last query'''
+
+    def __init__(self, index: MultiFieldSearchIndex):
+        '''Create a new IncrementalSearch
+
+        Arguments
+        ---------
+        index : MultiFieldSearchIndex
+            The index to search. Create a new IncrementalSearch when the songs change
+        '''
+        self.index = index
+        self.query = []
+        # For every word of the query its similar words and the scores of the songs already ranked
+        self._similarities = []
+        self._song_similarities = []
+
+    def search(self, query: str, top=5, accepted_percentage=1, cancelled: Callable[[], bool] = None) -> list[tuple[dict, str]]:
+        '''Get the songs that match a query the best and the field that matched, reusing the work of the previous query.
+        A cancelled search keeps what it has done, the next query reuses it
+
+        Arguments
+        ---------
+        query : str
+            The text to search
+        top : int
+            Number of songs to return. Default 5
+        accepted_percentage : float
+            Max distance (1 - weighted similarity) of a query word with a word of the song. If further the word counts as not found. Default 1
+        cancelled : () -> bool
+            Checked between the words of the query and while the songs are ranked. When it returns True the search stops
+
+        Returns
+        -------
+        The same of MultiFieldSearchIndex.search
+
+        Raises
+        ------
+        SearchCancelled
+            If cancelled returned True
+        '''
+        words = normalise(query)
+        if len(words) == 0 or len(self.index.weights) == 0:
+            self.query = []
+            self._similarities = []
+            self._song_similarities = []
+            return self.index.search(query, top, accepted_percentage)
+        kept = 0
+        while kept < min(len(words), len(self.query)) and words[kept] == self.query[kept]:
+            kept += 1
+        similarities = self._similarities[:kept]
+        song_similarities = self._song_similarities[:kept]
+        for k in range(kept, len(words)):
+            if cancelled is not None and cancelled():
+                raise SearchCancelled()
+            candidates = None
+            if k == len(self.query) - 1 and len(self.query[k]) > 1 and words[k].startswith(self.query[k]):
+                # More letters of the last word: the similar words are between the ones of the shorter word.
+                # Not with one letter, the second one adds the grams of the swapped prefix
+                candidates = self._similarities[k]
+            similarities.append(self.index.word_similarities(words[k], candidates))
+            song_similarities.append({})
+        self.query = words
+        self._similarities = similarities
+        self._song_similarities = song_similarities
+        return self.index.top_songs(similarities, top, accepted_percentage, song_similarities, cancelled)
+
+
+def _threshold_top(orders, get_songs, get_similarities, song_count, top, accepted_percentage, cancelled=None):
+    # orders: for every query word the keys of the index (eg. word ids) sorted by decreasing similarity
+    # get_songs: positions of the songs of a key, get_similarities: similarity of every query word with a song
+    if top <= 0:
+        return []
+
+    def distance(similarity):
+        value = 1 - similarity
+        return value if value < accepted_percentage else 1
+
+    def rank(i):
+        return sum([distance(s) for s in get_similarities(i)])
+
+    positions = [0] * len(orders)
+    seen = set()
+    # Max heap of the best songs found, (-rank, -position)
+    best = []
+    while True:
+        if cancelled is not None and cancelled():
+            raise SearchCancelled()
+        progressed = False
+        for k, order in enumerate(orders):
+            if positions[k] < len(order):
+                key = order[positions[k]][0]
+                positions[k] += 1
+                progressed = True
+                for i in get_songs(key):
+                    if i not in seen:
+                        seen.add(i)
+                        item = (-rank(i), -i)
+                        if len(best) < top:
+                            heapq.heappush(best, item)
+                        elif item > best[0]:
+                            heapq.heapreplace(best, item)
+        # The best rank that a song not yet seen can have
+        threshold = sum([distance(order[p][1] if p < len(order) else 0.0) for order, p in zip(orders, positions)])
+        if not progressed or (len(best) == top and -best[0][0] < threshold):
+            break
+
+    results = sorted([(-r, -i) for r, i in best])
+    not_found = len(orders)
+    if len(results) < top or results[-1][0] >= not_found:
+        # Between the songs that match no word the order is the one of the list
+        results = [r for r in results if r[0] < not_found]
+        found = set([i for _, i in results])
+        for i in range(song_count):
+            if len(results) >= top:
+                break
+            if i not in found:
+                results.append((not_found, i))
+    return [i for _, i in results]
@@ -0,0 +1,135 @@
+from kivy.logger import Logger
+
+from lib.platform.library import LibrarySnapshot
+from lib.platform.searchindex import IncrementalSearch, MultiFieldSearchIndex, SearchCancelled, SEARCH_FIELD_WEIGHTS
+from threading import Thread, Condition
+from typing import Callable
+
+
+class SearchWorker():
+    '''Run the searches of the search screen in a daemon thread, so the UI thread never ranks the songs.
+    Every query gets a sequence number. A new query supersedes the previous one: the running search is cancelled at its next check
+    and the results of an old query are never passed to the callback. The index of the library is built in the worker thread too,
+    when the generation of the library changes. The queries are refined from the previous one by IncrementalSearch
+
+    Attributes
+    ----------
+    sequence : int
+        Sequence number of the last query. The results with another number are stale
+    top : int
+        Number of songs of the results
+    weights : dict[str, float]
+        The searched fields with their weight
+
+    Methods
+    -------
+    submit(query: str, library: LibrarySnapshot) -> int
+        Search a query in the worker thread
+    cancel() -> None
+        Cancel the running query
+    is_stale(sequence: int) -> bool
+        Check if the results of a query are stale
+    stop() -> None
+        Stop the worker thread
+    '''
+
+    sequence: int = 0
+    '''Sequence number of the last query. The results with another number are stale'''
+
+    top: int = 5
+    '''Number of songs of the results'''
+
+    weights: dict[str, float] = SEARCH_FIELD_WEIGHTS
+    '''The searched fields with their weight'''
+
+    def __init__(self, on_results: Callable[[int, list[tuple[dict, str]]], None]):
+        '''Create a new SearchWorker. The thread starts with the first query
+
+        Arguments
+        ---------
+        on_results : (int, list[tuple[dict, str]]) -> None
+            Callback called in the worker thread with the sequence number of the query and its results (see MultiFieldSearchIndex.search).
+            It must post the changes of the UI to the main thread and check is_stale there, a newer query may be submitted in the meantime
+        '''
+        self.on_results = on_results
+        self._condition = Condition()
+        self._request = None
+        self._running = False
+        self._generation = -1
+        self._search = None
+
+    def submit(self, query: str, library: LibrarySnapshot) -> int:
+        '''Search a query in the worker thread. The previous query is cancelled
+
+        Arguments
+        ---------
+        query : str
+            The text to search
+        library : LibrarySnapshot
+            The library to search
+
+        Returns
+        -------
+        The sequence number of the query
+        '''
+        with self._condition:
+            self.sequence += 1
+            self._request = (self.sequence, query, library)
+            if not self._running:
+                self._running = True
+                t = Thread(target=self.__run)
+                t.daemon = True
+                t.start()
+            self._condition.notify()
+            return self.sequence
+
+    def cancel(self) -> None:
+        '''Cancel the running query and drop its results'''
+        with self._condition:
+            self.sequence += 1
+            self._request = None
+
+    def is_stale(self, sequence: int) -> bool:
+        '''Check if the results of a query are stale, because a newer query was submitted or the query was cancelled
+
+        Arguments
+        ---------
+        sequence : int
+            Sequence number of the query
+        '''
+        return sequence != self.sequence
+
+    def stop(self) -> None:
+        '''Stop the worker thread. The running query is cancelled'''
+        with self._condition:
+            self.sequence += 1
+            self._request = None
+            self._running = False
+            self._condition.notify()
+
+    def __run(self):
+        while True:
+            with self._condition:
+                while self._running and self._request is None:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                sequence, query, library = self._request
+                self._request = None
+            try:
+                results = self.__search(query, library, lambda: self.is_stale(sequence))
+            except SearchCancelled:
+                continue
+            except Exception as e:
+                Logger.error(f"SearchWorker: search of {query} failed: {e}")
+                continue
+            if not self.is_stale(sequence):
+                self.on_results(sequence, results)
+
+    def __search(self, query, library, cancelled):
+        if self._search is None or self._generation != library.generation:
+            self._search = IncrementalSearch(MultiFieldSearchIndex(library.get_all_songs(), self.weights))
+            self._generation = library.generation
+            if cancelled():
+                raise SearchCancelled()
+        return self._search.search(query, self.top, cancelled=cancelled)
@@ -0,0 +1,346 @@
+from array import array
+from collections.abc import MutableMapping
+from typing import Iterator
+
+SONG_TABLE_VERSION = 2
+'''Version of the layout returned by SongTable.to_columns'''
+
+_MISSING = -(2 ** 62)
+# Value of the id of a removed song. A song without an id is not removed
+_TOMBSTONE = _MISSING + 1
+_int_columns = ["id", "track", "duration"]
+_pool_columns = ["artist", "album", "image"]
+
+
+class SongTable():
+    '''Compact columnar table of the songs of the library. Behaves like the list of song dictionaries it replaces:
+    an item is a SongRow, a view that reads and writes the columns, or None for the tombstone of a removed song.
+    The integers (id, track, duration) are kept in arrays, the artists, the albums, the images and the folders of the files
+    are dictionary encoded in a pool of strings, so the same strings are kept only once.
+    The keys that are not columns, or values of an unexpected type, are kept in a dictionary for the row
+
+    Attributes
+    ----------
+    read_only : bool
+        If True the table can not be changed. Changing it raise TypeError
+
+    Methods
+    -------
+    append(song: dict) -> None
+        Add a song at the end of the table
+    to_list() -> list[dict]
+        Get the songs as a list of dictionaries, eg. to serialize them
+    compact() -> SongTable
+        Get a new table without the tombstones
+    copy(read_only: bool) -> SongTable
+        Get a copy of the table, eg. a read only snapshot for the readers
+    to_columns() -> tuple
+        Get the columns of the table, to save them with marshal
+    from_columns(columns: tuple) -> SongTable
+        Create a table from the columns returned by to_columns
+    '''
+
+    read_only: bool = False
+    '''If True the table can not be changed. Changing it raise TypeError'''
+
+    def __init__(self, songs: list[dict] = ()):
+        '''Create a new SongTable
+
+        Arguments
+        ---------
+        songs : list[dict]
+            Songs to add. A None is a tombstone
+        '''
+        self._ints = {column: array("q") for column in _int_columns}
+        self._pooled = {column: array("l") for column in _pool_columns}
+        self._titles = []
+        self._folders = array("l")
+        self._names = []
+        self._strings = []
+        self._codes = {}
+        self._extra = {}
+        for song in songs:
+            self.append(song)
+
+    def __len__(self) -> int:
+        return len(self._titles)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if self._ints["id"][row] == _TOMBSTONE:
+            return None
+        return SongRow(self, row)
+
+    def __setitem__(self, row: int, song: dict|None):
+        self.__check_writable()
+        if row == len(self):
+            self.append(song)
+            return
+        if row < 0:
+            row += len(self)
+        self._extra.pop(row, None)
+        self._titles[row] = None
+        self._names[row] = ""
+        for column in _int_columns:
+            self._ints[column][row] = _MISSING
+        for column in _pool_columns:
+            self._pooled[column][row] = -1
+        self._folders[row] = -1
+        if song is None:
+            self._ints["id"][row] = _TOMBSTONE
+        else:
+            for key, value in list(song.items()):
+                self.set_value(row, key, value)
+
+    def __iter__(self) -> Iterator:
+        for row in range(len(self)):
+            yield self[row]
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, (SongTable, list)) and len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return f"SongTable({self.to_list()!r})"
+
+    def append(self, song: dict|None) -> None:
+        '''Add a song at the end of the table
+
+        Arguments
+        ---------
+        song : dict|None
+            The song. None adds a tombstone
+        '''
+        self.__check_writable()
+        self._titles.append(None)
+        self._names.append("")
+        for column in _int_columns:
+            self._ints[column].append(_MISSING)
+        for column in _pool_columns:
+            self._pooled[column].append(-1)
+        self._folders.append(-1)
+        if song is None:
+            self._ints["id"][-1] = _TOMBSTONE
+        else:
+            row = len(self._titles) - 1
+            for key, value in list(song.items()):
+                self.set_value(row, key, value)
+
+    def to_list(self) -> list[dict]:
+        '''Get the songs as a list of dictionaries, eg. to serialize them. The tombstones are None'''
+        return [dict(song) if song is not None else None for song in self]
+
+    def compact(self) -> "SongTable":
+        '''Get a new table without the tombstones'''
+        return SongTable([song for song in self if song is not None])
+
+    def copy(self, read_only=False) -> "SongTable":
+        '''Get a copy of the table. The columns are copied, so the changes of this table are not visible in the copy
+
+        Arguments
+        ---------
+        read_only : bool
+            If True the copy can not be changed, eg. a snapshot for the readers of the library
+        '''
+        table = SongTable()
+        for column in _int_columns:
+            table._ints[column] = array("q", self._ints[column])
+        for column in _pool_columns:
+            table._pooled[column] = array("l", self._pooled[column])
+        table._titles = self._titles[:]
+        table._folders = array("l", self._folders)
+        table._names = self._names[:]
+        table._extra = {row: dict(extra) for row, extra in self._extra.items()}
+        if read_only:
+            # The pool only grows and its strings never change: the codes of the copy stay valid, so it can be shared
+            table._strings = self._strings
+            table._codes = None
+        else:
+            table._strings = self._strings[:]
+            table._codes = {s: i for i, s in enumerate(table._strings)}
+        table.read_only = read_only
+        return table
+
+    def to_columns(self) -> tuple:
+        '''Get the columns of the table, made only of the types supported by marshal'''
+        return (SONG_TABLE_VERSION,
+                {column: values.tobytes() for column, values in self._ints.items()},
+                {column: values.tobytes() for column, values in self._pooled.items()},
+                self._titles, self._folders.tobytes(), self._names, self._strings, self._extra)
+
+    @staticmethod
+    def from_columns(columns: tuple) -> "SongTable":
+        '''Create a table from the columns returned by to_columns
+
+        Raises
+        ------
+        ValueError
+            If the columns have another version
+        '''
+        version, ints, pooled, titles, folders, names, strings, extra = columns
+        if version not in (1, SONG_TABLE_VERSION):
+            raise ValueError(f"SongTable version {version} not supported")
+        table = SongTable()
+        for column in _int_columns:
+            table._ints[column].frombytes(ints[column])
+        if version == 1:
+            # Every song without an id was a tombstone
+            ids = table._ints["id"]
+            for row in range(len(ids)):
+                if ids[row] == _MISSING:
+                    ids[row] = _TOMBSTONE
+        for column in _pool_columns:
+            table._pooled[column].frombytes(pooled[column])
+        table._titles = titles
+        table._folders.frombytes(folders)
+        table._names = names
+        table._strings = strings
+        table._codes = {s: i for i, s in enumerate(strings)}
+        table._extra = extra
+        return table
+
+    def get_value(self, row: int, key: str):
+        '''Get a value of a song
+
+        Raises
+        ------
+        KeyError
+            If the song does not have the key
+        '''
+        extra = self._extra.get(row)
+        if extra is not None and key in extra:
+            return extra[key]
+        if key in self._ints:
+            value = self._ints[key][row]
+        elif key in self._pooled:
+            code = self._pooled[key][row]
+            value = self._strings[code] if code >= 0 else _MISSING
+        elif key == "title":
+            value = self._titles[row] if self._titles[row] is not None else _MISSING
+        elif key == "file":
+            code = self._folders[row]
+            value = self._strings[code] + self._names[row] if code >= 0 else _MISSING
+        else:
+            value = _MISSING
+        if value is _MISSING or value == _MISSING or value == _TOMBSTONE:
+            raise KeyError(key)
+        return value
+
+    def set_value(self, row: int, key: str, value) -> None:
+        '''Set a value of a song'''
+        self.__check_writable()
+        self.__del_column(row, key)
+        extra = self._extra.get(row)
+        if extra is not None:
+            extra.pop(key, None)
+            if len(extra) == 0:
+                del self._extra[row]
+        if key in self._ints and type(value) is int and value != _MISSING and value != _TOMBSTONE:
+            self._ints[key][row] = value
+        elif key in self._pooled and type(value) is str:
+            self._pooled[key][row] = self.__intern(value)
+        elif key == "title" and type(value) is str:
+            self._titles[row] = value
+        elif key == "file" and type(value) is str:
+            # The folder is shared by all the songs of an album
+            split = max(value.rfind("/"), value.rfind("\\")) + 1
+            self._folders[row] = self.__intern(value[:split])
+            self._names[row] = value[split:]
+        else:
+            self._extra.setdefault(row, {})[key] = value
+
+    def del_value(self, row: int, key: str) -> None:
+        '''Remove a key from a song
+
+        Raises
+        ------
+        KeyError
+            If the song does not have the key
+        '''
+        self.__check_writable()
+        self.get_value(row, key)
+        extra = self._extra.get(row)
+        if extra is not None and key in extra:
+            del extra[key]
+        else:
+            self.__del_column(row, key)
+
+    def keys_of(self, row: int) -> list[str]:
+        '''Get the keys of a song'''
+        keys = []
+        for key in ["title", "album", "artist", "track", "file", "duration", "image", "id"]:
+            try:
+                self.get_value(row, key)
+                keys.append(key)
+            except KeyError:
+                pass
+        extra = self._extra.get(row)
+        if extra is not None:
+            keys.extend([k for k in extra if k not in keys])
+        return keys
+
+    def __check_writable(self):
+        if self.read_only:
+            raise TypeError("SongTable is read only")
+
+    def __del_column(self, row, key):
+        if key in self._ints:
+            self._ints[key][row] = _MISSING
+        elif key in self._pooled:
+            self._pooled[key][row] = -1
+        elif key == "title":
+            self._titles[row] = None
+        elif key == "file":
+            self._folders[row] = -1
+            self._names[row] = ""
+
+    def __intern(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self._strings)
+            self._strings.append(value)
+            self._codes[value] = code
+        return code
+
+
+class SongRow(MutableMapping):
+    '''Lightweight view of a song of a SongTable. Used as the dictionary of the song: reads and writes go to the columns of the table'''
+
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table: SongTable, row: int):
+        '''Create a view of a song
+
+        Arguments
+        ---------
+        table : SongTable
+            The table of the song
+        row : int
+            Row of the song in the table
+        '''
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, key):
+        return self._table.get_value(self._row, key)
+
+    def __setitem__(self, key, value):
+        self._table.set_value(self._row, key, value)
+
+    def __delitem__(self, key):
+        self._table.del_value(self._row, key)
+
+    def __iter__(self):
+        return iter(self._table.keys_of(self._row))
+
+    def __len__(self):
+        return len(self._table.keys_of(self._row))
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def copy(self) -> dict:
+        '''Get a dictionary with the values of the song'''
+        return dict(self)
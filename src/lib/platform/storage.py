@@ -0,0 +1,859 @@
+from kivy.storage import AbstractStore
+from kivy.storage.jsonstore import JsonStore
+from kivy.logger import Logger
+from lib.platform.songtable import SongTable, SongRow
+
+from threading import RLock, Timer
+import atexit
+import glob
+import json
+import marshal
+import os
+import sqlite3
+import struct
+import sys
+
+STORAGE_BACKENDS = ["json", "sqlite", "journal"]
+'''Implemented storage backends'''
+
+_song_columns = ["id", "file", "title", "album", "artist", "track", "duration", "image"]
+_categories = ["artist", "album", "playlist"]
+
+BINARY_SNAPSHOT_VERSION = 1
+'''Version of the layout of the binary snapshot. A snapshot with another version is ignored'''
+
+JOURNAL_MIN_COMPACT_SIZE = 256 * 1024
+'''Minimum size in bytes of the journal before it is folded into the snapshot. The journal is compacted when it is also bigger than the snapshot'''
+
+# Key of the snapshot of a JournalStore with the generation of the compaction that wrote it
+_journal_generation_key = "__journal_generation__"
+
+
+def to_json(data, **kwargs) -> str:
+    '''Serialize the data of a store in JSON. The SongTable are written as lists of songs
+
+    Arguments
+    ---------
+    data : Any
+        The data to serialize
+    kwargs : dict
+        Arguments for json.dumps
+    '''
+    return json.dumps(data, default=_json_default, **kwargs)
+
+
+def open_store(data_file_name: str, backend: str = "json", lock: RLock = None, flush_delay: float = 1) -> AbstractStore:
+    '''Open the store used by the DataManager
+
+    Arguments
+    ---------
+    data_file_name : str
+        Path of the JSON data file. The other backends save their file next to it and import it the first time
+    backend : str
+        One of STORAGE_BACKENDS
+    lock : RLock
+        Lock held by who changes the data. The data is read for writing it only with this lock
+    flush_delay : float
+        Seconds waited before writing a change, so the following changes are written together. If 0 every change is written immediately
+
+    Raises
+    ------
+    Exception
+        If the backend is not implemented
+
+    Returns
+    -------
+    The opened store
+    '''
+    if backend == "json":
+        return DataJsonStore(data_file_name, lock=lock, flush_delay=flush_delay)
+    elif backend == "sqlite":
+        return SQLiteStore(os.path.splitext(data_file_name)[0] + ".sqlite", data_file_name, lock=lock, flush_delay=flush_delay)
+    elif backend == "journal":
+        return JournalStore(data_file_name, lock=lock, flush_delay=flush_delay)
+    raise Exception(f"Storage backend not recognized({backend}). Implemented backends: {STORAGE_BACKENDS}")
+
+
+class BinarySnapshot():
+    '''Binary copy of the data of a JSON file, loaded much faster than the JSON. The file starts with a header
+    (magic, layout version, python version, mtime and size of the JSON file) followed by the data serialized with marshal.
+    A SongTable is saved as its columns, so it is loaded without creating an object for every song.
+    The snapshot is used only if the JSON file is exactly the one it was made from, so a JSON file changed by someone else is never shadowed
+
+    Attributes
+    ----------
+    file_name : str
+        Path of the snapshot
+
+    Methods
+    -------
+    load(json_file_name: str) -> dict|None
+        Load the data if the snapshot is up to date with the JSON file
+    save(data: bytes, json_file_name: str) -> None
+        Save the data serialized with dumps, after the JSON file is written
+    dumps(data: dict) -> bytes
+        Serialize the data for save
+    loads(data: bytes) -> dict
+        Deserialize the data serialized with dumps
+    '''
+
+    file_name: str = None
+    '''Path of the snapshot'''
+
+    _magic = b"NMSNAP"
+    _header = struct.Struct(">6sHBBQQ")
+
+    def __init__(self, file_name: str):
+        '''Create a new BinarySnapshot
+
+        Arguments
+        ---------
+        file_name : str
+            Path of the snapshot
+        '''
+        self.file_name = file_name
+
+    @staticmethod
+    def dumps(data: dict) -> bytes:
+        '''Serialize the data for save. Much faster than json.dumps, so it can be done while holding the lock of the data'''
+        return marshal.dumps(_encode_tables(data))
+
+    @staticmethod
+    def loads(data: bytes) -> dict:
+        '''Deserialize the data serialized with dumps'''
+        return _decode_tables(marshal.loads(data))
+
+    def load(self, json_file_name: str) -> dict|None:
+        '''Load the data if the snapshot is up to date with the JSON file
+
+        Arguments
+        ---------
+        json_file_name : str
+            Path of the JSON file the snapshot was made from
+
+        Returns
+        -------
+        The data, or None if the snapshot is missing, of another version or out of date
+        '''
+        try:
+            stat = os.stat(json_file_name)
+            with open(self.file_name, "rb") as f:
+                header = f.read(self._header.size)
+                if header != self.__header(stat):
+                    return None
+                return self.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, EOFError, TypeError) as e:
+            Logger.warning(f"Storage: binary snapshot {self.file_name} not loaded: {e}")
+            return None
+
+    def save(self, data: bytes, json_file_name: str) -> None:
+        '''Save the data after the JSON file is written. The snapshot is replaced atomically
+
+        Arguments
+        ---------
+        data : bytes
+            The data serialized with dumps
+        json_file_name : str
+            Path of the JSON file just written with the same data
+        '''
+        tmp_file_name = f"{self.file_name}.tmp"
+        with open(tmp_file_name, "wb") as f:
+            f.write(self.__header(os.stat(json_file_name)))
+            f.write(data)
+        os.replace(tmp_file_name, self.file_name)
+
+    def __header(self, stat):
+        return self._header.pack(self._magic, BINARY_SNAPSHOT_VERSION, sys.version_info[0], sys.version_info[1], stat.st_mtime_ns, stat.st_size)
+
+
+class _WriteBehind():
+    '''Base of the stores that write the changes in a background thread. The changes made within flush_delay seconds are written together'''
+
+    flush_delay: float = 1
+    '''Seconds waited before writing a change. If 0 every change is written immediately'''
+
+    def _init_write_behind(self, lock, flush_delay):
+        self._lock = lock if lock is not None else RLock()
+        self._timer_lock = RLock()
+        self._timer = None
+        self.flush_delay = flush_delay
+        # The pending changes are written also if the application is closed without on_stop
+        atexit.register(self.flush)
+
+    def _schedule_flush(self):
+        if self.flush_delay <= 0:
+            self.flush()
+            return
+        with self._timer_lock:
+            if self._timer is None:
+                self._timer = Timer(self.flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _cancel_flush(self):
+        with self._timer_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def flush(self) -> None:
+        '''Write the pending changes'''
+        raise NotImplementedError()
+
+    def removed(self, *paths: list) -> None:
+        '''Save the removal, already done in memory, of the elements of lists found following the paths. The following elements of a list
+        moved back by one. The paths of the same list must be in the order of the removals, eg. from the last element to the first
+
+        Arguments
+        ---------
+        paths : list
+            Paths of the removed elements. eg. ["data", "artist", 3] for the fourth artist
+        '''
+        # The whole lists are written
+        self.changed(*[path[:-1] for path in paths])
+
+
+class DataJsonStore(_WriteBehind, JsonStore):
+    '''JsonStore that understands the changes notified by the DataManager. The changes are written in background:
+    a burst of changes costs one rewrite of the file, made atomically with a temporary file.
+    Every time the file is written also a BinarySnapshot is written, and it is loaded instead of parsing the JSON file when it is up to date
+
+    Attributes
+    ----------
+    flush_delay : float
+        Seconds waited before writing a change. If 0 every change is written immediately
+    binary_snapshot : BinarySnapshot
+        Binary copy of the JSON file, loaded at startup
+
+    Methods
+    -------
+    put_path(path: list, value: Any) -> None
+        Save a value following a path. eg. store["field1"]["field2"] = value <=> put_path(["field1", "field2"], value)
+    changed(*paths: list) -> None
+        Save the values, already changed in memory, found following the paths
+    removed(*paths: list) -> None
+        Save the removal, already done in memory, of the elements of lists found following the paths
+    flush() -> None
+        Write the pending changes now
+    '''
+
+    def __init__(self, filename: str, lock: RLock = None, flush_delay: float = 1, **kwargs):
+        '''Open or create a DataJsonStore
+
+        Arguments
+        ---------
+        filename : str
+            Path of the JSON file
+        lock : RLock
+            Lock held by who changes the data. The data is read for writing it only with this lock
+        flush_delay : float
+            Seconds waited before writing a change. If 0 every change is written immediately
+        '''
+        self._init_write_behind(lock, flush_delay)
+        self._write_lock = RLock()
+        self._generation = 0
+        self._written_generation = 0
+        self.binary_snapshot = BinarySnapshot(os.path.splitext(filename)[0] + ".snapshot")
+        super().__init__(filename, **kwargs)
+        self._is_changed = False
+
+    def store_load(self):
+        data = self.binary_snapshot.load(self.filename)
+        if data is not None:
+            self._data = data
+            return
+        super().store_load()
+        if os.path.exists(self.filename):
+            # The next startup is fast
+            self.binary_snapshot.save(BinarySnapshot.dumps(self._data), self.filename)
+
+    def store_sync(self):
+        if self._is_changed:
+            self._schedule_flush()
+
+    def flush(self) -> None:
+        '''Write the pending changes now. The file is replaced atomically, so it is never found half written'''
+        self._cancel_flush()
+        with self._lock:
+            if not self._is_changed:
+                return
+            binary_data = BinarySnapshot.dumps(self._data)
+            self._is_changed = False
+            self._generation += 1
+            generation = self._generation
+        # The file is written without the lock, so the data can be changed meanwhile
+        self._write_snapshot(binary_data, generation)
+
+    def _write_snapshot(self, binary_data, generation):
+        # The JSON is created from the binary copy, not from the data that can be changed meanwhile
+        data = to_json(BinarySnapshot.loads(binary_data), indent=self.indent, sort_keys=self.sort_keys)
+        tmp_file_name = f"{self.filename}.{generation}.tmp"
+        with open(tmp_file_name, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        with self._write_lock:
+            if generation > self._written_generation:
+                os.replace(tmp_file_name, self.filename)
+                self.binary_snapshot.save(binary_data, self.filename)
+                self._written_generation = generation
+            else:
+                # A newer version is already written
+                os.remove(tmp_file_name)
+
+    def put_path(self, path: list, value) -> None:
+        '''Save a value following a path. eg. store["field1"]["field2"] = value <=> put_path(["field1", "field2"], value)
+
+        Arguments
+        ---------
+        path : list
+            Fields names (or indexes for lists) to navigate. Every field except the last must exist
+        value : Any
+            Value to save
+        '''
+        with self._lock:
+            _set_path(self._data, path, value)
+            self.changed(path)
+
+    def changed(self, *paths: list) -> None:
+        '''Save the values, already changed in memory, found following the paths. The file is written after flush_delay
+
+        Arguments
+        ---------
+        paths : list
+            Paths of the changed values. eg. ["data", "songs", 3] for the song with id 3
+        '''
+        self._is_changed = True
+        self.store_sync()
+
+
+class JournalStore(DataJsonStore):
+    '''Store that appends every change as a small record to a journal next to the JSON file (the snapshot), so a write costs as much as the change.
+    When opened the journal is replayed over the snapshot. When the journal grows bigger than the snapshot (and than JOURNAL_MIN_COMPACT_SIZE)
+    it is folded into a new snapshot. A record is a JSON line that sets a path to a value or removes an element of a list, so a record half written by a crash is just discarded
+
+    Attributes
+    ----------
+    journal_file_name : str
+        Path of the journal
+    flush_delay : float
+        Seconds waited before writing a change. If 0 every change is written immediately
+
+    Methods
+    -------
+    put_path(path: list, value: Any) -> None
+        Save a value following a path. eg. store["field1"]["field2"] = value <=> put_path(["field1", "field2"], value)
+    changed(*paths: list) -> None
+        Save the values, already changed in memory, found following the paths
+    removed(*paths: list) -> None
+        Save the removal, already done in memory, of the elements of lists found following the paths
+    flush() -> None
+        Append the pending changes to the journal now
+    compact() -> None
+        Fold the journal into the snapshot
+    '''
+
+    journal_file_name: str = None
+    '''Path of the journal'''
+
+    def __init__(self, filename: str, journal_file_name: str = None, lock: RLock = None, flush_delay: float = 1, **kwargs):
+        '''Open or create a JournalStore
+
+        Arguments
+        ---------
+        filename : str
+            Path of the JSON snapshot
+        journal_file_name : str
+            Path of the journal. Default the snapshot with the ".journal" extension
+        lock : RLock
+            Lock held by who changes the data. The data is read for writing it only with this lock
+        flush_delay : float
+            Seconds waited before writing a change. If 0 every change is written immediately
+        '''
+        self.journal_file_name = journal_file_name if journal_file_name is not None else os.path.splitext(filename)[0] + ".journal"
+        self._pending = {}
+        # Records of the changes made before a removal, written by the next flush
+        self._records = []
+        self._journal = None
+        super().__init__(filename, lock=lock, flush_delay=flush_delay, **kwargs)
+
+    def store_load(self):
+        super().store_load()
+        with self._lock:
+            # Generation of the compaction that wrote the snapshot: the journals up to it are already in the snapshot
+            covered = self._data.pop(_journal_generation_key, 0)
+            # Journals left by a compaction interrupted before the new snapshot was saved, or before they were removed
+            old_journals = sorted(glob.glob(glob.escape(self.journal_file_name) + ".*.old"), key=lambda f: int(f.split(".")[-2]))
+            # The compaction removes the journals with a generation up to its own
+            self._generation = max([covered] + [int(journal.split(".")[-2]) for journal in old_journals])
+            for journal in old_journals:
+                if int(journal.split(".")[-2]) <= covered:
+                    os.remove(journal)
+            old_journals = [journal for journal in old_journals if int(journal.split(".")[-2]) > covered]
+            clean = True
+            for journal in old_journals + [self.journal_file_name]:
+                clean = self.__replay(journal) and clean
+            self._journal = open(self.journal_file_name, "a")
+            if not clean or self._generation > covered:
+                # Start from a clean snapshot, the old files are removed by the compaction
+                self.compact()
+
+    def store_put(self, key, value):
+        self._data[key] = value
+        self.changed([key])
+        return False
+
+    def store_delete(self, key):
+        del self._data[key]
+        self.changed([key])
+        return False
+
+    def changed(self, *paths: list) -> None:
+        '''Save the values, already changed in memory, found following the paths. The records are appended after flush_delay
+
+        Arguments
+        ---------
+        paths : list
+            Paths of the changed values. eg. ["data", "songs", 3] for the song with id 3
+        '''
+        with self._lock:
+            for path in paths:
+                self._pending[tuple(path)] = None
+        self._schedule_flush()
+
+    def removed(self, *paths: list) -> None:
+        '''Save the removal, already done in memory, of the elements of lists found following the paths. A record is appended for every
+        removed element, instead of the whole list. The paths of the same list must be in the order of the removals, eg. from the last element to the first
+
+        Arguments
+        ---------
+        paths : list
+            Paths of the removed elements. eg. ["data", "artist", 3] for the fourth artist
+        '''
+        with self._lock:
+            # The lists written whole are already without the elements
+            removals = [(tuple(path[:-1]), path[-1]) for path in paths if not any([tuple(path[:-1])[:len(p)] == p for p in self._pending])]
+            if len(removals) == 0:
+                return
+            # The pending changes are recorded now, with the indexes the lists had before the removals: the next elements are read
+            # from their new position and a removed one is written as a placeholder, so the removal finds it also if it was added after the last flush
+            records = []
+            for p in sorted(_uncovered_paths(self._pending), key=_path_order):
+                data_path = p
+                for parent, index in removals:
+                    depth = len(parent)
+                    if len(data_path) > depth and data_path[:depth] == parent and isinstance(data_path[depth], int) and data_path[depth] >= index:
+                        if data_path[depth] == index:
+                            data_path = None
+                            break
+                        data_path = parent + (data_path[depth] - 1,) + data_path[depth + 1:]
+                if data_path is not None:
+                    records.append(self.__record(p, data_path))
+                else:
+                    placeholder = {"path": list(p[:depth + 1]), "value": None}
+                    if placeholder not in records:
+                        records.append(placeholder)
+            records.extend([{"path": list(parent) + [index], "remove": True} for parent, index in removals])
+            self._records.extend([to_json(record) for record in records])
+            self._pending = {}
+        self._schedule_flush()
+
+    def flush(self) -> None:
+        '''Append the pending changes to the journal now. Compact the journal if it is too big'''
+        self._cancel_flush()
+        with self._lock:
+            if len(self._pending) == 0 and len(self._records) == 0:
+                return
+            records = self._records + [to_json(self.__record(path)) for path in sorted(_uncovered_paths(self._pending), key=_path_order)]
+            self._records = []
+            self._pending = {}
+            self._journal.write("\n".join(records) + "\n")
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            journal_size = self._journal.tell()
+        try:
+            snapshot_size = os.path.getsize(self.filename)
+        except OSError:
+            snapshot_size = 0
+        if journal_size > max(JOURNAL_MIN_COMPACT_SIZE, snapshot_size):
+            self.compact()
+
+    def compact(self) -> None:
+        '''Fold the journal into the snapshot. The journal is moved aside until the new snapshot is saved,
+        so a crash during the compaction loses nothing'''
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            binary_data = BinarySnapshot.dumps(dict(self._data, **{_journal_generation_key: generation}))
+            self._journal.close()
+            old_journal = f"{self.journal_file_name}.{generation}.old"
+            os.replace(self.journal_file_name, old_journal)
+            self._journal = open(self.journal_file_name, "a")
+        self._write_snapshot(binary_data, generation)
+        for journal in glob.glob(glob.escape(self.journal_file_name) + ".*.old"):
+            if int(journal.split(".")[-2]) <= generation:
+                os.remove(journal)
+        Logger.info(f"Storage: journal compacted in {self.filename}")
+
+    def __record(self, path, data_path=None):
+        # Record that sets path to the value now found following data_path, by default the same path
+        data_path = data_path if data_path is not None else path
+        if data_path[0] not in self._data:
+            return {"path": list(path), "delete": True}
+        return {"path": list(path), "value": _get_path(self._data, data_path)}
+
+    def __replay(self, journal):
+        if not os.path.exists(journal):
+            return True
+        with open(journal) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Record half written by a crash, it is the last one
+                    return False
+                path = record["path"]
+                if record.get("remove", False):
+                    del _get_path(self._data, path[:-1])[path[-1]]
+                elif record.get("delete", False):
+                    self._data.pop(path[0], None)
+                elif len(path) == 1:
+                    self._data[path[0]] = record["value"]
+                else:
+                    parent = _get_path(self._data, path[:-1])
+                    if isinstance(parent, (list, SongTable)) and path[-1] == len(parent):
+                        parent.append(record["value"])
+                    else:
+                        parent[path[-1]] = record["value"]
+        return True
+
+
+class SQLiteStore(_WriteBehind, AbstractStore):
+    '''Store that keeps the data in a SQLite database. The songs, the categories (artist, album, playlist) and every leaf of the other keys
+    are saved in separate rows, so a change writes only the rows that are changed.
+    All the data is also kept in memory, so the reads are the same of a JsonStore.
+    The changes are written in background, the ones made within flush_delay in a single transaction
+
+    Attributes
+    ----------
+    filename : str
+        Path of the database
+    json_file_name : str
+        Path of the JSON data file imported when the database is empty. Removed once imported
+    flush_delay : float
+        Seconds waited before writing a change. If 0 every change is written immediately
+
+    Methods
+    -------
+    put_path(path: list, value: Any) -> None
+        Save a value following a path. eg. store["field1"]["field2"] = value <=> put_path(["field1", "field2"], value)
+    changed(*paths: list) -> None
+        Save the values, already changed in memory, found following the paths
+    removed(*paths: list) -> None
+        Save the removal, already done in memory, of the elements of lists found following the paths
+    flush() -> None
+        Write the pending changes now
+    '''
+
+    filename: str = None
+    '''Path of the database'''
+
+    json_file_name: str = None
+    '''Path of the JSON data file imported when the database is empty. Removed once imported'''
+
+    indent = None
+    sort_keys = False
+
+    def __init__(self, filename: str, json_file_name: str = None, lock: RLock = None, flush_delay: float = 1, **kwargs):
+        '''Open or create a SQLiteStore
+
+        Arguments
+        ---------
+        filename : str
+            Path of the database
+        json_file_name : str
+            Path of the JSON data file imported the first time. The file is removed once imported, so a stale copy is never taken for the data
+        lock : RLock
+            Lock held by who changes the data. The data is read for writing it only with this lock
+        flush_delay : float
+            Seconds waited before writing a change. If 0 every change is written immediately
+        '''
+        self.filename = filename
+        self.json_file_name = json_file_name
+        self._data = {}
+        self._group_rows = {category: [] for category in _categories}
+        self._song_ids = []
+        self._pending = {}
+        self._init_write_behind(lock, flush_delay)
+        # The database is written from the flush timer and from the thread that calls flush, always under _lock
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self.__create_tables()
+        super().__init__(**kwargs)
+
+    def store_load(self):
+        with self._lock:
+            if self._db.execute("SELECT value FROM meta WHERE key = 'created'").fetchone() is None:
+                self.__import_json()
+                return
+            data = {}
+            for key, path, value in self._db.execute("SELECT key, path, value FROM tree_values ORDER BY key, path"):
+                node = data.setdefault(key, {})
+                parts = path.split("/") if path != "" else []
+                for p in parts[:-1]:
+                    node = node.setdefault(p, {})
+                if len(parts) > 0:
+                    node[parts[-1]] = json.loads(value)
+            if self._db.execute("SELECT value FROM meta WHERE key = 'data'").fetchone() is not None:
+                # The songs are loaded without the tombstones of the removed ones
+                data.setdefault("data", {})["songs"] = [self.__song_from_row(row) for row in self._db.execute(f"SELECT {', '.join(_song_columns)}, extra FROM songs ORDER BY id")]
+                self._song_ids = [song["id"] for song in data["data"]["songs"]]
+                for category in _categories:
+                    rows = self._db.execute("SELECT name, songs, extra FROM groups WHERE category = ? ORDER BY position", (category,)).fetchall()
+                    data["data"][category] = [dict(name=name, songs=json.loads(songs), **json.loads(extra)) for name, songs, extra in rows]
+                    self._group_rows[category] = [self.__group_key(group) for group in data["data"][category]]
+            self._data = data
+
+    def store_sync(self):
+        # Every change is written when it happens
+        pass
+
+    def store_exists(self, key):
+        return key in self._data
+
+    def store_get(self, key):
+        return self._data[key]
+
+    def store_put(self, key, value):
+        self._data[key] = value
+        self.changed([key])
+        return False
+
+    def store_delete(self, key):
+        with self._lock:
+            self.flush()
+            del self._data[key]
+            with self._db:
+                self.__delete_key(key)
+        return False
+
+    def store_find(self, filters):
+        for key, values in self._data.items():
+            if all(fkey in values and values[fkey] == fvalue for fkey, fvalue in filters.items()):
+                yield key, values
+
+    def store_count(self):
+        return len(self._data)
+
+    def store_keys(self):
+        return list(self._data.keys())
+
+    def store_clear(self):
+        for key in self.store_keys():
+            self.store_delete(key)
+        return True
+
+    def put_path(self, path: list, value) -> None:
+        '''Save a value following a path. eg. store["field1"]["field2"] = value <=> put_path(["field1", "field2"], value)
+
+        Arguments
+        ---------
+        path : list
+            Fields names (or indexes for lists) to navigate. Every field except the last must exist
+        value : Any
+            Value to save
+        '''
+        with self._lock:
+            _set_path(self._data, path, value)
+            self.changed(path)
+
+    def changed(self, *paths: list) -> None:
+        '''Save the values, already changed in memory, found following the paths. The paths are written after flush_delay, in a single transaction.
+        The more specific is a path the less rows are written:
+        ["data", "songs", id] writes one song, ["data", category] writes only the changed groups, ["config", "field"] writes only the leaves under field
+
+        Arguments
+        ---------
+        paths : list
+            Paths of the changed values. eg. ["data", "songs", 3] for the song with id 3
+        '''
+        with self._lock:
+            for path in paths:
+                self._pending[tuple(path)] = None
+        self._schedule_flush()
+
+    def flush(self) -> None:
+        '''Write the pending changes now, in a single transaction'''
+        self._cancel_flush()
+        with self._lock, self._db:
+            paths = _uncovered_paths(self._pending)
+            self._pending = {}
+            self.__write_paths(paths)
+
+    def __write_paths(self, paths):
+        for path in paths:
+            if path[0] != "data":
+                self.__write_tree(path[0], path[1:])
+            elif len(path) == 1:
+                self.__write_all_songs()
+                for category in _categories:
+                    self.__write_groups(category)
+                self._db.execute("DELETE FROM tree_values WHERE key = 'data'")
+                for key in self._data["data"]:
+                    if key != "songs" and key not in _categories:
+                        self.__write_tree("data", [key])
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('data', '1')")
+            elif path[1] == "songs":
+                if len(path) > 2:
+                    self.__write_song(path[2])
+                else:
+                    self.__write_all_songs()
+            elif path[1] in _categories:
+                self.__write_groups(path[1])
+            else:
+                self.__write_tree("data", path[1:])
+
+    def __create_tables(self):
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS songs (
+                id INTEGER PRIMARY KEY, file TEXT NOT NULL, title TEXT, album TEXT, artist TEXT,
+                track INTEGER, duration INTEGER, image TEXT, extra TEXT)""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS songs_file ON songs (file)")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS groups (
+                category TEXT, position INTEGER, name TEXT, songs TEXT, extra TEXT, PRIMARY KEY (category, position))""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS groups_name ON groups (category, name)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS tree_values (key TEXT, path TEXT, value TEXT, PRIMARY KEY (key, path))")
+
+    def __import_json(self):
+        if self.json_file_name is not None and os.path.exists(self.json_file_name):
+            with open(self.json_file_name) as f:
+                content = f.read()
+            if len(content) > 0:
+                self._data = json.loads(content)
+                Logger.info(f"Storage: importing {self.json_file_name} in {self.filename}")
+        with self._lock, self._db:
+            self.__write_paths([[key] for key in self._data])
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('created', '1')")
+        if self.json_file_name is not None:
+            # The database is the data now, the JSON file and its snapshot would only get stale
+            for file_name in (self.json_file_name, os.path.splitext(self.json_file_name)[0] + ".snapshot"):
+                if os.path.exists(file_name):
+                    os.remove(file_name)
+
+    def __delete_key(self, key):
+        if key == "data":
+            self._db.execute("DELETE FROM songs")
+            self._db.execute("DELETE FROM groups")
+            self._db.execute("DELETE FROM meta WHERE key = 'data'")
+            self._db.execute("DELETE FROM tree_values WHERE key = 'data'")
+            self._group_rows = {category: [] for category in _categories}
+            self._song_ids = []
+        else:
+            self._db.execute("DELETE FROM tree_values WHERE key = ?", (key,))
+
+    def __write_tree(self, key, path):
+        prefix = "/".join([str(p) for p in path])
+        value = _get_path(self._data[key], path)
+        if prefix == "":
+            self._db.execute("DELETE FROM tree_values WHERE key = ?", (key,))
+        else:
+            # A leaf replaces its own row, a dictionary replaces the rows under it
+            # Compared as a string, LIKE would take the _ and % of the keys as wildcards
+            self._db.execute("DELETE FROM tree_values WHERE key = ? AND substr(path, 1, ?) = ?", (key, len(prefix) + 1, prefix + "/"))
+        self._db.executemany("INSERT OR REPLACE INTO tree_values VALUES (?, ?, ?)",
+                             [(key, p, json.dumps(v)) for p, v in _flatten(value, prefix)])
+
+    def __write_song(self, row):
+        # The songs are saved by id, _song_ids keeps the id of every row of the songs list for the tombstones (None)
+        song = self._data["data"]["songs"][row]
+        if row < len(self._song_ids) and self._song_ids[row] is not None and (song is None or song["id"] != self._song_ids[row]):
+            self._db.execute("DELETE FROM songs WHERE id = ?", (self._song_ids[row],))
+        if song is not None:
+            self._db.execute(f"INSERT OR REPLACE INTO songs VALUES ({', '.join(['?'] * (len(_song_columns) + 1))})", self.__song_to_row(song))
+        self._song_ids.extend([None] * (row + 1 - len(self._song_ids)))
+        self._song_ids[row] = song["id"] if song is not None else None
+
+    def __write_all_songs(self):
+        songs = [s for s in self._data["data"]["songs"] if s is not None]
+        self._db.execute("DELETE FROM songs")
+        self._db.executemany(f"INSERT INTO songs VALUES ({', '.join(['?'] * (len(_song_columns) + 1))})",
+                             [self.__song_to_row(song) for song in songs])
+        self._song_ids = [s["id"] if s is not None else None for s in self._data["data"]["songs"]]
+
+    def __write_groups(self, category):
+        groups = self._data["data"][category]
+        old_rows = self._group_rows[category]
+        rows = [self.__group_key(group) for group in groups]
+        self._db.executemany("INSERT OR REPLACE INTO groups VALUES (?, ?, ?, ?, ?)",
+                             [(category, position, *row) for position, row in enumerate(rows)
+                              if position >= len(old_rows) or old_rows[position] != row])
+        if len(rows) < len(old_rows):
+            self._db.execute("DELETE FROM groups WHERE category = ? AND position >= ?", (category, len(rows)))
+        self._group_rows[category] = rows
+
+    def __song_to_row(self, song):
+        extra = {k: v for k, v in song.items() if k not in _song_columns}
+        return [song.get(c) for c in _song_columns] + [json.dumps(extra)]
+
+    def __song_from_row(self, row):
+        song = {c: v for c, v in zip(_song_columns, row[:-1]) if v is not None or c in ["title", "album", "artist", "file"]}
+        song.update(json.loads(row[-1]))
+        return song
+
+    def __group_key(self, group):
+        return (group["name"], json.dumps(group["songs"]), json.dumps({k: v for k, v in group.items() if k not in ["name", "songs"]}))
+
+
+def _get_path(base, path):
+    for p in path:
+        base = base[p]
+    return base
+
+
+def _set_path(base, path, value):
+    _get_path(base, path[:-1])[path[-1]] = value
+
+
+def _json_default(value):
+    if isinstance(value, SongTable):
+        return value.to_list()
+    if isinstance(value, SongRow):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _encode_tables(data):
+    # Only the dictionaries are visited, a SongTable is always the value of a key
+    if isinstance(data, dict):
+        return {k: _encode_tables(v) for k, v in data.items()}
+    if isinstance(data, SongTable):
+        return ("SongTable", data.to_columns())
+    return data
+
+
+def _decode_tables(data):
+    if isinstance(data, dict):
+        return {k: _decode_tables(v) for k, v in data.items()}
+    if isinstance(data, tuple) and len(data) == 2 and data[0] == "SongTable":
+        return SongTable.from_columns(data[1])
+    return data
+
+
+def _uncovered_paths(paths):
+    # A path inside another changed path is written with it. eg. a song added before removing a song, that changes all the data
+    return [path for path in paths if not any(path[:i] in paths for i in range(1, len(path)))]
+
+
+def _path_order(path):
+    # The elements added to a list are written in order, so each one is appended after the previous
+    return [(0, p, "") if isinstance(p, int) else (1, 0, str(p)) for p in path]
+
+
+def _flatten(value, prefix):
+    if isinstance(value, dict) and len(value) > 0:
+        for k, v in value.items():
+            yield from _flatten(v, f"{prefix}/{k}" if prefix != "" else str(k))
+    else:
+        yield prefix, value
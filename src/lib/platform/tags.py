@@ -0,0 +1,83 @@
+from mutagen.mp3 import MP3
+from mutagen.flac import FLAC
+from mutagen.wave import WAVE
+from mutagen.id3 import ID3
+
+import os
+
+_id3_fields = {"title": "TIT2", "artist": "TPE1", "album": "TALB", "track": "TRCK"}
+_vorbis_fields = {"title": "title", "artist": "artist", "album": "album", "track": "tracknumber"}
+
+
+def read_tags(file: str, with_picture=False) -> dict:
+    '''Read the tags of a song opening the file only once. The reader is chosen by the extension of the file (MP3, FLAC, WAV)
+    and reads only the header and the metadata blocks, never the audio data
+
+    Arguments
+    ---------
+    file : str
+        Path of the song
+    with_picture : bool
+        If True read also the embedded cover. The front cover is preferred
+
+    Returns
+    -------
+    tags : dict["title": str, "artist": str, "album": str, "track": int, "duration": int, "picture": tuple[str, bytes]]
+        The tags found. "duration" is in milliseconds and is 0 if unknown. "picture" is (mime, data) and is present only if requested and found.
+        Missing tags are not present
+
+    Raises
+    ------
+    Exception
+        If the file can not be read
+    '''
+    extension = os.path.splitext(file)[1].lower()
+    with open(file, "rb") as f:
+        if extension == ".flac":
+            audio = FLAC(f)
+            tags = __read_fields(audio.tags, _vorbis_fields, lambda tags, key: tags[key][0] if key in tags else None)
+            pictures = audio.pictures if with_picture else []
+        else:
+            audio = __read_id3_audio(f, WAVE if extension == ".wav" else MP3)
+            tags = __read_fields(audio.tags, _id3_fields, lambda tags, key: tags[key].text[0] if key in tags and len(tags[key].text) > 0 else None)
+            pictures = audio.tags.getall("APIC") if with_picture and audio.tags is not None else []
+
+    tags["duration"] = int(audio.info.length * 1000) if audio.info is not None else 0
+    if "track" in tags:
+        try:
+            # The track can be in the form "3/12"
+            tags["track"] = int(str(tags["track"]).split("/")[0])
+        except ValueError:
+            del tags["track"]
+    if len(pictures) > 0:
+        picture = next((p for p in pictures if p.type == 3), pictures[0])
+        tags["picture"] = (picture.mime, picture.data)
+    return tags
+
+
+class _TagsOnly():
+    '''Result of __read_id3_audio when the audio header is not readable'''
+    info = None
+
+    def __init__(self, tags):
+        self.tags = tags
+
+
+def __read_id3_audio(f, audio_class):
+    try:
+        return audio_class(f)
+    except Exception:
+        # A file without a valid audio header can still have the tags
+        f.seek(0)
+        return _TagsOnly(ID3(f))
+
+
+def __read_fields(tags, fields, get_field):
+    ret = {}
+    if tags is None:
+        return ret
+    for name, key in fields.items():
+        value = get_field(tags, key)
+        if value is not None and str(value) != "":
+            ret[name] = str(value)
+    return ret
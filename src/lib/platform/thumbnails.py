@@ -0,0 +1,101 @@
+from PIL import Image
+from kivy.logger import Logger
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from hashlib import sha1
+import os
+
+THUMBNAIL_SIZES = [128, 256, 512, 1024]
+'''Sizes in pixel of the thumbnails. A cover is scaled to every size the first time is requested'''
+
+
+class ThumbnailCache():
+    '''Cache on disk of the covers scaled to fixed sizes. The thumbnails of a cover are keyed by its path and mtime, so a changed cover is decoded again
+
+    Attributes
+    ----------
+    folder : str
+        Folder where the thumbnails are saved
+
+    Methods
+    -------
+    get_thumbnail(source: str, size: float, on_created: (str) -> None) -> str|None
+        Get the smallest thumbnail of an image that is not smaller than size
+    '''
+
+    folder: str = None
+    '''Folder where the thumbnails are saved'''
+
+    def __init__(self, folder: str):
+        '''Create a new ThumbnailCache
+
+        Arguments
+        ---------
+        folder : str
+            Folder where the thumbnails are saved. Created if missing
+        '''
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        # A single worker: the images are decoded one at a time, and an image requested twice is decoded once
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def get_thumbnail(self, source: str, size: float, on_created: Callable[[str], None] = None) -> str|None:
+        '''Get the smallest thumbnail of an image that is not smaller than size. The first time an image is requested all its thumbnails are created
+
+        Arguments
+        ---------
+        source : str
+            Path to the image
+        size : float
+            Size in pixel of the widget that show the image
+        on_created : (str) -> None
+            If given the missing thumbnails are created in a background thread, that calls on_created with the path to the thumbnail.
+            If None they are created in the calling thread
+
+        Returns
+        -------
+        Path to the thumbnail. If the thumbnail can not be created return source.
+        None if the thumbnail is being created in background and on_created will get it
+        '''
+        tier = next((s for s in THUMBNAIL_SIZES if s >= size), THUMBNAIL_SIZES[-1])
+        try:
+            key = sha1(f"{source}:{os.stat(source).st_mtime_ns}".encode(errors="surrogateescape")).hexdigest()
+        except OSError:
+            return source
+        thumbnail = self.__thumbnail_path(key, tier)
+        if os.path.exists(thumbnail):
+            return thumbnail
+        if on_created is not None:
+            self._executor.submit(self.__create_in_background, source, key, tier, on_created)
+            return None
+        return thumbnail if self.__create_thumbnails(source, key) else source
+
+    def __create_in_background(self, source, key, tier, on_created):
+        thumbnail = self.__thumbnail_path(key, tier)
+        # Created meanwhile by a previous request of the same image
+        if not os.path.exists(thumbnail) and not self.__create_thumbnails(source, key):
+            thumbnail = source
+        try:
+            on_created(thumbnail)
+        except Exception as e:
+            Logger.error(f"Thumbnail of {source} not shown: {e}")
+
+    def __thumbnail_path(self, key, tier):
+        return os.path.join(self.folder, f"{key}_{tier}.jpg")
+
+    def __create_thumbnails(self, source, key):
+        try:
+            with Image.open(source) as image:
+                # Let the JPEG decoder skip the resolution that is not needed
+                image.draft("RGB", (THUMBNAIL_SIZES[-1], THUMBNAIL_SIZES[-1]))
+                image = image.convert("RGB")
+                for tier in reversed(THUMBNAIL_SIZES):
+                    image.thumbnail((tier, tier))
+                    tmp_file_name = self.__thumbnail_path(key, tier) + ".tmp"
+                    image.save(tmp_file_name, "JPEG", quality=85)
+                    os.replace(tmp_file_name, self.__thumbnail_path(key, tier))
+            return True
+        except Exception as e:
+            Logger.warning(f"Thumbnails of {source} not created: {e}")
+            return False
@@ -0,0 +1,264 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+VECTOR_SEARCH_AVAILABLE = np is not None
+'''True if numpy is installed and the similarities of the search can be computed with numpy'''
+
+VECTOR_TOKEN_WIDTH = 32
+'''Number of characters of a word kept in the encoded arrays. Longer query words are compared one at a time, without numpy'''
+
+VECTOR_MIN_WORDS = 32
+'''Min number of words to compare with a query word to use numpy. With fewer words the setup of the arrays costs more than the loop'''
+
+
+def encode_tokens(tokens: list[str]) -> tuple:
+    '''Encode words in a fixed width array of code points, to compare them with a query word all at once
+
+    Arguments
+    ---------
+    tokens : list[str]
+        The words to encode
+
+    Returns
+    -------
+    codes : numpy.ndarray
+        (words, VECTOR_TOKEN_WIDTH) array with the code points of every word, padded with 0
+    lengths : numpy.ndarray
+        Number of characters of every word, at most VECTOR_TOKEN_WIDTH
+
+    Raises
+    ------
+    ImportError
+        If numpy is not installed
+    '''
+    if np is None:
+        raise ImportError("encode_tokens requires numpy")
+    lengths = np.array([min(len(t), VECTOR_TOKEN_WIDTH) for t in tokens], dtype=np.int32)
+    codes = np.zeros((len(tokens), VECTOR_TOKEN_WIDTH), dtype=np.uint32)
+    for k, token in enumerate(tokens):
+        codes[k, :lengths[k]] = [ord(c) for c in token[:VECTOR_TOKEN_WIDTH]]
+    return codes, lengths
+
+
+def start_similarities(word: str, codes, lengths, p=0.1, max_l=2):
+    '''Get the Jaro-Winkler similarity of a word with the start of many encoded words, one character of the word at a time for all of them.
+    The value is the same of nltk.metrics.distance.jaro_winkler_similarity(word, token[:len(word)], max_l=2)
+
+    Arguments
+    ---------
+    word : str
+        Normalised query word, at most VECTOR_TOKEN_WIDTH characters
+    codes : numpy.ndarray
+        Code points of the words, returned by encode_tokens
+    lengths : numpy.ndarray
+        Lengths of the words, returned by encode_tokens
+    p : float
+        Scaling factor of the common prefix. Default 0.1
+    max_l : int
+        Max length of the common prefix. Default 2
+
+    Returns
+    -------
+    numpy.ndarray with the similarity of every word
+    '''
+    m = len(word)
+    query = np.array([ord(c) for c in word], dtype=np.uint32)
+    prefixes = codes[:, :m]
+    prefix_lengths = np.minimum(lengths, m)
+    # The start of a word is never longer than the query word, so the window is the same for all the words
+    bound = m // 2 - 1
+    matched_query = np.zeros(prefixes.shape, dtype=bool)
+    matched_token = np.zeros(prefixes.shape, dtype=bool)
+    rows = np.arange(len(codes))
+    for i in range(m):
+        low, high = max(0, i - bound), min(i + bound, m - 1)
+        if low > high:
+            continue
+        # The first character of the window equal to query[i] and not matched yet. The padding 0 never matches
+        equal = (prefixes[:, low:high + 1] == query[i]) & ~matched_token[:, low:high + 1]
+        found = equal.any(axis=1)
+        first = equal.argmax(axis=1) + low
+        matched_token[rows[found], first[found]] = True
+        matched_query[:, i] = found
+    matches = matched_query.sum(axis=1)
+    # The k-th matched character of the query word against the k-th matched character of the word
+    query_order = np.argsort(~matched_query, axis=1, kind="stable")
+    token_order = np.argsort(~matched_token, axis=1, kind="stable")
+    different = query[query_order] != np.take_along_axis(prefixes, token_order, axis=1)
+    transpositions = (different & (np.arange(m) < matches[:, None])).sum(axis=1) // 2
+    safe_matches = np.maximum(matches, 1)
+    # Multiplied by 1 / 3 like nltk, so the values are the same to the last bit
+    jaro = np.where(matches > 0, 1 / 3 * (matches / m + matches / np.maximum(prefix_lengths, 1) + (matches - transpositions) / safe_matches), 0.0)
+    jaro[(prefix_lengths == m) & (prefixes == query).all(axis=1)] = 1.0
+    prefix = np.cumprod(prefixes[:, :max_l] == query[:max_l], axis=1).sum(axis=1)
+    return jaro + prefix * p * (1 - jaro)
+
+
+def encode_groups(groups: list[list[int]]) -> tuple:
+    '''Encode lists of ids (eg. the words of every song) in a flat array with the start of every list
+
+    Arguments
+    ---------
+    groups : list[list[int]]
+        The lists to encode
+
+    Returns
+    -------
+    flat : numpy.ndarray
+        The ids of all the lists, one list after the other
+    starts : numpy.ndarray
+        Start of every list in flat, with the length of flat at the end
+    '''
+    if np is None:
+        raise ImportError("encode_groups requires numpy")
+    starts = np.zeros(len(groups) + 1, dtype=np.int64)
+    np.cumsum([len(g) for g in groups], out=starts[1:])
+    flat = np.fromiter((i for g in groups for i in g), dtype=np.int64, count=int(starts[-1]))
+    return flat, starts
+
+
+def group_members(flat, starts, rows):
+    '''Get the ids of some of the lists encoded by encode_groups
+
+    Arguments
+    ---------
+    flat : numpy.ndarray
+        The ids of all the lists
+    starts : numpy.ndarray
+        Start of every list in flat
+    rows : numpy.ndarray | list[int]
+        Positions of the lists
+
+    Returns
+    -------
+    members : numpy.ndarray
+        The ids of the lists, one list after the other
+    offsets : numpy.ndarray
+        Start of every list in members
+    counts : numpy.ndarray
+        Length of every list
+    '''
+    rows = np.asarray(rows, dtype=np.int64)
+    counts = starts[rows + 1] - starts[rows]
+    offsets = np.cumsum(counts) - counts
+    members = flat[np.repeat(starts[rows] - offsets, counts) + np.arange(int(counts.sum()))]
+    return members, offsets, counts
+
+
+def union_rows(parts: list):
+    '''Get the sorted positions in some arrays of positions, without repetitions
+
+    Arguments
+    ---------
+    parts : list[numpy.ndarray]
+        The arrays of positions
+
+    Returns
+    -------
+    numpy.ndarray with the sorted positions
+    '''
+    if len(parts) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.unique(np.concatenate(parts))
+
+
+def group_max(values: dict[int, float], size: int, flat, starts, rows):
+    '''Get the max value of the ids of some of the lists encoded by encode_groups. The ids without a value are 0, like an empty list
+
+    Arguments
+    ---------
+    values : dict[int, float]
+        Value by id
+    size : int
+        Number of ids
+    flat : numpy.ndarray
+        The ids of all the lists
+    starts : numpy.ndarray
+        Start of every list in flat
+    rows : numpy.ndarray
+        Positions of the lists
+
+    Returns
+    -------
+    numpy.ndarray with the max of every list
+    '''
+    dense = np.zeros(size)
+    dense[list(values)] = list(values.values())
+    members, offsets, counts = group_members(flat, starts, rows)
+    result = np.zeros(len(counts))
+    not_empty = counts > 0
+    if not_empty.any():
+        result[not_empty] = np.maximum.reduceat(dense[members], offsets[not_empty])
+    return result
+
+
+def top_rows(similarities: list[list], rows, song_count: int, top: int, accepted_percentage=1) -> list[tuple[int, int]]:
+    '''Rank the candidate songs of a query from the weighted similarities of its words, the same rank of the threshold algorithm of
+    lib.platform.searchindex: for every query word 1 - the best similarity of a field, or 1 if further than accepted_percentage
+
+    Arguments
+    ---------
+    similarities : list[list[numpy.ndarray]]
+        For every query word and every field the best weighted similarity of every candidate song
+    rows : numpy.ndarray
+        Sorted positions of the candidate songs. The other songs match no word
+    song_count : int
+        Number of songs of the library
+    top : int
+        Number of songs to return
+    accepted_percentage : float
+        Max distance of a query word with a word of the song. If further the word counts as not found
+
+    Returns
+    -------
+    Position of the top songs ordered by rank, with the position of the field that matched the most query words.
+    Between songs with the same rank, the first in the songs list come first
+    '''
+    if top <= 0:
+        return []
+    # (fields, rows) array for every query word
+    similarities = [np.stack(word) for word in similarities]
+    not_found = len(similarities)
+    ranks = np.zeros(len(rows))
+    for word in similarities:
+        distance = 1 - word.max(axis=0)
+        ranks += np.where(distance < accepted_percentage, distance, 1)
+    found = np.flatnonzero(ranks < not_found)
+    if len(found) > top:
+        # Only the songs up to the rank of the top-th one are sorted, with the songs tied with it
+        kth = found[np.argpartition(ranks[found], top - 1)[top - 1]]
+        found = found[ranks[found] <= ranks[kth]]
+    order = found[np.lexsort((rows[found], ranks[found]))][:top]
+    results = list(zip(rows[order].tolist(), _best_fields(similarities, order).tolist()))
+    if len(results) < top:
+        # Between the songs that match no word the order is the one of the list
+        taken = set([i for i, _ in results])
+        others = []
+        for i in range(song_count):
+            if len(results) + len(others) >= top:
+                break
+            if i not in taken:
+                others.append(i)
+        k = np.searchsorted(rows, others)
+        candidate = k < len(rows)
+        candidate[candidate] = rows[k[candidate]] == np.asarray(others)[candidate]
+        fields = np.zeros(len(others), dtype=np.int64)
+        fields[candidate] = _best_fields(similarities, k[candidate])
+        results += list(zip(others, fields.tolist()))
+    return results
+
+
+def _best_fields(similarities, columns):
+    # For every candidate the field where its most similar words are found
+    columns = np.asarray(columns, dtype=np.int64)
+    if len(similarities) == 0 or len(columns) == 0:
+        return np.zeros(len(columns), dtype=np.int64)
+    totals = np.zeros((similarities[0].shape[0], len(columns)))
+    positions = np.arange(len(columns))
+    for word in similarities:
+        values = word[:, columns]
+        best = values.argmax(axis=0)
+        totals[best, positions] += values[best, positions]
+    return totals.argmax(axis=0)
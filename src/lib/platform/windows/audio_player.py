@@ -54,6 +54,12 @@ class WindowsAudioPlayer(AudioPlayer):
             self.sound.bind(on_stop=self.on_song_end)
         self.state = not self.state
 
+    def get_position(self) -> int:
+        '''Get the position in the current song in milliseconds. -1 if unknown'''
+        if self.sound is None:
+            return -1
+        return int((self.sound.get_pos() if self.state else self.seektime) * 1000)
+
 
     def on_song_end(self):
         '''Callback called when the song ends. It trigger the on_song_end events'''
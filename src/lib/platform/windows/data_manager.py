@@ -3,6 +3,10 @@ from lib.platform.datamanager import DataManager
 
 class WindowsDataManager(DataManager):
     '''DataManager for Windows OS'''
+
+    storage_backend = "journal"
+    '''The data is saved in a snapshot with a journal of the changes next to the JSON file'''
+
     def __init__(self, data_file_name=os.path.expanduser("~/playlist.json")):
         '''Create a new WindowsDataManager
 
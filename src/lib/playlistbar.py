@@ -58,6 +58,9 @@ class PlaylistBar(MDBoxLayout):
     image = ObjectProperty(None)
     '''Image of the album'''
 
+    cover: str = None
+    '''Path to the image of the current song. Its thumbnail is shown when it is ready'''
+
     next_song = ObjectProperty(None)
     '''Button the reproduce the next song'''
 
@@ -85,11 +88,21 @@ class PlaylistBar(MDBoxLayout):
         data_manager = get_data_manager()
         def wait_for_song(song):
             if song is not None:
-                self.image.source = data_manager.get_image([song["file"]])
+                cover = data_manager.get_image([song["file"]])
+                self.cover = cover
+                # A missing thumbnail is created in background and shown when ready
+                thumbnail = data_manager.get_thumbnail(cover, max(self.image.size), callback=lambda thumbnail: self.__show_thumbnail(cover, thumbnail))
+                if thumbnail is not None:
+                    self.image.source = thumbnail
                 self.song_name.text = truncate_text(song["title"], 2, 15, self.song_name.size[0])
                 self.song_field.text = truncate_text(song["album"], 1, 15, self.song_field.size[0])
 
         self.playlist.get_current_song(wait_for_song)
+
+    def __show_thumbnail(self, cover, thumbnail):
+        # Meanwhile another song can be playing
+        if cover == self.cover:
+            self.image.source = thumbnail
         
 
     def select_playlist(self, data: list[dict["title": str, "album": str, "artist": str, "file": str, "track": int, "id": int]]) -> None: 
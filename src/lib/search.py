@@ -1,82 +1,109 @@
 from kivymd.icon_definitions import md_icons
 from kivy.lang import Builder
 from lib.ui.add_to_playlist_dialog import AddToPlaylistDialog
-from lib.util import search
+from lib.platform.searchworker import SearchWorker
 from kivymd.app import MDApp
 from kivymd.uix.list import TwoLineAvatarIconListItem
 from kivy.uix.screenmanager import Screen
 from lib.platform.datamanager import get_data_manager
 from lib.platform.localization import get_localization
-from kivy.clock import Clock, ClockEvent
+from lib.platform.library import LIBRARY_CATEGORIES
+from kivy.clock import Clock
+from kivy.properties import StringProperty
 
 class Search(Screen):
     '''Screen for searching the song and adding to the playing playlist of add in a custom playlist'''
-    search_event: ClockEvent = None
-    all_songs: list[dict["title": str, "album": str, "artist": str, "file": str, "track": int, "id": int]] = None
+    search_worker: SearchWorker = None
+    '''Thread that ranks the songs. The UI thread only shows the results'''
 
     def __init__(self, **kw):
         super().__init__(**kw)
         self.ids.search_field.hint_text = get_localization()["search"]["search_field_hint"]
-        self.search_event = None
+        self.search_worker = SearchWorker(self.__on_results)
 
     def pressed(self, value):
         '''When a result is selected play it or add to the playing playlist'''
-        # value here is the OneLineListItem
+        # value here is the SearchListItem
         self.ids.container.clear_widgets()
         # set TextField text to selected list item
-        self.ids.search_field.text = value.song["title"]
-        MDApp.get_running_app().front.add_song_to_playlist(value.song)
+        self.ids.search_field.text = value.text
+        value.play()
 
 
     def set_list(self, text=""):
-        '''When the search text field changed re run the search and show the results
+        '''When the search text field changed re run the search in the worker and show the results when ready.
+        The search of the previous text is cancelled
         
         Arguments
         ---------
         text : str
             The text to search
         '''
-        if self.search_event is not None:
-            self.search_event.cancel()
-        self.search_event = Clock.schedule_once(lambda _: self.__search(), .8)
+        if len(text.replace(" ", "")) > 0:
+            self.search_worker.submit(text, get_data_manager().get_library())
+        else:
+            self.search_worker.cancel()
 
     
     def set_focus_to_search(self):
         self.ids.search_field.focus = True
         
     
-    def __search(self):
-        text = self.ids.search_field.text
-        if len(text.replace(" ", "")) > 0:
-            self.ids.container.clear_widgets() # refresh list
-            if self.all_songs == None:
-               data_manager = get_data_manager()
-               self.all_songs = data_manager.store["data"]["songs"]
-            results = search(self.ids.search_field.text, self.all_songs)
-            for value in results:
-                # using casefold() to make the input case insensitve
+    def __on_results(self, sequence, results):
+        # Called in the worker thread: the widgets are created in the UI thread, if no newer text was typed in the meantime
+        Clock.schedule_once(lambda _: self.__show_results(sequence, results))
+
+    def __show_results(self, sequence, results):
+        if self.search_worker.is_stale(sequence):
+            return
+        self.ids.container.clear_widgets() # refresh list
+        shown_groups = set()
+        for value, field in results:
+            if field in LIBRARY_CATEGORIES and (field, value[field]) not in shown_groups:
+                # The artist or the album matched: offer to play all its songs before the song
+                shown_groups.add((field, value[field]))
                 self.ids.container.add_widget(
-                    SearchListItem(value, on_press=self.pressed)
+                    SearchListItem(value, field, on_press=self.pressed)
                 )
+            self.ids.container.add_widget(
+                SearchListItem(value, on_press=self.pressed)
+            )
     
     def cancel(self):
         '''Close the screen and return to the front page'''
+        self.search_worker.cancel()
         self.ids.container.clear_widgets()
         self.ids.search_field.text = ""
         self.manager.switch_to(MDApp.get_running_app().front, direction="up")
 
 class SearchListItem(TwoLineAvatarIconListItem):
-    '''Item of the search list. Allow to add the song to the playlist and open the dialog to customize the playlists'''
-    def __init__(self, song, *args, **kwargs):
+    '''Item of the search list. Allow to add the song to the playlist and open the dialog to customize the playlists.
+    If the field is a category (artist, album) the item is the group of the song and play all its songs'''
+
+    field = StringProperty("title")
+    '''Field of the song shown by the item. "title" for the song, "artist" or "album" for its group'''
+
+    def __init__(self, song, field="title", *args, **kwargs):
         self.song = song
-        super().__init__(text=song["title"], secondary_text=song["artist"], *args, **kwargs)
+        if field == "title":
+            super().__init__(text=song["title"], secondary_text=song["artist"], *args, **kwargs)
+        else:
+            super().__init__(text=song[field], secondary_text=get_localization()["category_names"][field], *args, **kwargs)
+        self.field = field
 
     def open_dialog(self):
         '''Show the dialog to customize the playlists'''
-        AddToPlaylistDialog(self.song["id"], on_dialog_ended=lambda:None).show_dialog()
+        if self.field == "title":
+            AddToPlaylistDialog(self.song["id"], on_dialog_ended=lambda:None).show_dialog()
 
     def play(self):
-        '''Play this song'''
-        MDApp.get_running_app().front.add_song_to_playlist(self.song)
+        '''Play this song, or start the playlist of its artist or album'''
+        if self.field == "title":
+            MDApp.get_running_app().front.add_song_to_playlist(self.song)
+        else:
+            library = get_data_manager().get_library()
+            group = library.get_group(self.field, self.song[self.field])
+            if group is not None:
+                MDApp.get_running_app().start_playlist(library.get_songs(group["songs"]))
         
         
\ No newline at end of file
@@ -67,10 +67,12 @@ class AddToPlaylistDialog():
         '''
         super().__init__(**kwargs)
         datamanager = get_data_manager()
-        self.song = datamanager.store["data"]["songs"][id_song]
+        self.song = datamanager.get_song(id_song)
         self._on_dialog_ended = on_dialog_ended
         if playlist_list is None:
-            self._playlists, self._playlists_indexes = self.__get_playlist(datamanager.store["data"]["playlist"])
+            # The playlists of the library are read only, the changed ones are saved with put_data
+            playlists = [{**p, "songs": list(p["songs"])} for p in datamanager.get_library().get_category("playlist")]
+            self._playlists, self._playlists_indexes = self.__get_playlist(playlists)
         else:
             self._playlists, self._playlists_indexes = self.__get_playlist(playlist_list)
 
@@ -21,6 +21,8 @@ class PlaylistItem(MDCard):
     Methods
     -------
 
+    set_data(data: dict["name": str, "songs": list[int]]) -> None
+        Show a playlist
     on_press() -> None
         Callback that occur when the card is clicked. It start playing the playlist
     '''
@@ -33,6 +35,12 @@ class PlaylistItem(MDCard):
     data: dict["name": str, "songs": list[dict]] = None
     '''The data of the shown playlist'''
 
+    song_ids: tuple[int] = None
+    '''Ids of the songs of the shown playlist, in order'''
+
+    cover: str = None
+    '''Path to the image of the shown playlist. Its thumbnail is shown when it is ready'''
+
     def __init__(self, data:dict["name": str, "songs": list[int]], *args, **kwargs):
         '''Create new PlaylistItem
 
@@ -42,14 +50,37 @@ class PlaylistItem(MDCard):
             The data of the playlist. If the image field is empty try to estimate the image calling the :py:meth:`lib.ui.platform.datamanager.DataManager.get_image`
         '''
         super().__init__(*args, **kwargs)
+        self.set_data(data)
+
+    def set_data(self, data:dict["name": str, "songs": list[int]]) -> None:
+        '''Show a playlist. Used also to refresh the card when the songs of the playlist changed
+
+        Attributes
+        ----------
+        data : dict["name": str, "songs": list[str]]
+            The data of the playlist
+        '''
         data_manager = get_data_manager()
         self.name.text = data["name"]
-        self.data = [data_manager.store["data"]["songs"][i] for i in data["songs"]]
+        # Copied, the groups of the data manager are changed in place
+        self.song_ids = tuple(data["songs"])
+        self.data = data_manager.get_songs(data["songs"])
         if len(data["songs"]) > 0:
-            self.image.source = get_data_manager().get_image([s["file"] for s in self.data])
+            cover = data_manager.get_image([s["file"] for s in self.data])
+            self.cover = cover
+            # A missing thumbnail is created in background and shown when ready
+            thumbnail = data_manager.get_thumbnail(cover, max(self.size), callback=lambda thumbnail: self.__show_thumbnail(cover, thumbnail))
+            if thumbnail is not None:
+                self.image.source = thumbnail
         else:
+            self.cover = None
             self.image.source = ""
 
+    def __show_thumbnail(self, cover, thumbnail):
+        # Meanwhile the card can be showing another playlist
+        if cover == self.cover:
+            self.image.source = thumbnail
+
     def on_press(self, *args) -> None:
         '''Callback that occur when the card is clicked. It start playing the playlist'''
         if len(self.data) > 0:
@@ -5,6 +5,7 @@ from kivy.properties import NumericProperty
 from lib.ui.playlistitem import PlaylistItem
 from kivy.clock import Clock
 from lib.platform.datamanager import get_data_manager
+import bisect
 
 loading_element_per_second = 300 # Used to set the 
 '''Number of elements to show per second'''
@@ -42,11 +43,16 @@ class MyMDList(MDList):
         Hide images not visible or show visible ones
     set_data(data: list[dict["name":str, "songs": list[str]]]) -> None
         Set the playlists to show. Order them by pinned and name
+    update_data(data: list[dict["name":str, "songs": list[str]]]) -> bool
+        Add the new playlists and refresh the changed ones without reloading the others
     '''
 
     load_space = NumericProperty(2)
     '''Number of images above, below and not visible to load in order to not show the empty image. If set to 0 does not unload images. Default 2'''
 
+    _loaded_count = 0
+    '''Value of _set_data_count when the last call of set_data finished to add the widgets'''
+
     def on_scroll_stop(self, parent: ScrollView) -> None:
         '''Hide images not visible or show visible ones
         
@@ -83,22 +89,61 @@ class MyMDList(MDList):
         global loading_element_per_second
         global _set_data_count
         _set_data_count += 1
+        self._loaded_count = -1
         
         Clock.schedule_once(lambda _: self.clear_widgets())
         if len(data) == 0:
+            self._loaded_count = _set_data_count
             return 1 / loading_element_per_second
-        for i, playlist in enumerate(sorted(data, key=self.__key_order)):
+        data = sorted(data, key=self.__key_order)
+        for i, playlist in enumerate(data):
 
             # Create function in order to not intersect with
             # the change of playlist during for set_data_count
-            def create_func(pl, set_data):
+            def create_func(pl, set_data, last):
                 def tmp(_):
                     if set_data == _set_data_count:
                         self.add_widget(PlaylistItem(pl))
+                        if last:
+                            self._loaded_count = set_data
                 return tmp
             
-            Clock.schedule_once(create_func(playlist, _set_data_count),  (i+1) // loading_element_per_second + ((i+1) % loading_element_per_second) / loading_element_per_second)
+            Clock.schedule_once(create_func(playlist, _set_data_count, i == len(data) - 1),  (i+1) // loading_element_per_second + ((i+1) % loading_element_per_second) / loading_element_per_second)
         return (i+1) // loading_element_per_second + ((i+1) % loading_element_per_second) / loading_element_per_second
+
+    def update_data(self, data: list[dict["name":str, "songs": list[int]]]) -> bool:
+        '''Add the new playlists in order and refresh the ones whose songs changed, without reloading the others. Must be called in the kivy thread
+
+        Attributes
+        ----------
+        data : list[dict["name":str, "songs": list[int]]]
+            The playlist list to show.
+
+        Returns
+        -------
+        bool
+            False if the list is still loading from set_data and was not updated
+        '''
+        if self._loaded_count != _set_data_count:
+            return False
+        shown = {child.name.text: child for child in self.children}
+        names = set([playlist["name"] for playlist in data])
+        for name, child in list(shown.items()):
+            if name not in names:
+                self.remove_widget(child)
+                del shown[name]
+        # The children are in reversed order: the first shown is the last child
+        keys = sorted([self.__key_order(playlist) for playlist in data if playlist["name"] in shown])
+        for playlist in data:
+            child = shown.get(playlist["name"])
+            if child is None:
+                key = self.__key_order(playlist)
+                position = bisect.bisect(keys, key)
+                keys.insert(position, key)
+                self.add_widget(PlaylistItem(playlist), index=len(keys) - 1 - position)
+            elif child.song_ids != tuple(playlist["songs"]):
+                child.set_data(playlist)
+        return True
     
     def __key_order(self, x):
         if "pinned" in x.keys() and x["pinned"]:
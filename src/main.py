@@ -6,6 +6,7 @@ from lib.menu import Menu
 from kivy.core.window import Window
 import kivymd
 from kivy.logger import Logger
+from lib.platform.datamanager import flush_data_manager, stop_data_manager
 
 class MusicApp(MDApp):
     '''MDApp: entrypoint for the application. Run the application using "run()"
@@ -19,6 +20,10 @@ class MusicApp(MDApp):
     -------
     on_start() -> None
         Callback called when the application completed the starting process
+    on_pause() -> bool
+        Callback called when the application is paused. Write the pending changes of the data
+    on_stop() -> None
+        Callback called when the application is closing. Stop the library watcher and write the pending changes of the data
     start_playlist(data: list[dict["title": str, "album": str, "artist": str, "file": str, "track": int, "id": int]]) -> None
         Start a playlist by passing its data
     '''
@@ -50,6 +55,15 @@ class MusicApp(MDApp):
         '''Callback called when the application completed the starting process'''
         self.front.on_start(**kwargs)
 
+    def on_pause(self):
+        '''Callback called when the application is paused. Write the pending changes of the data, the application may be killed while paused'''
+        flush_data_manager()
+        return True
+
+    def on_stop(self):
+        '''Callback called when the application is closing. Stop the library watcher and write the pending changes of the data'''
+        stop_data_manager()
+
     def start_playlist(self, data: list[dict["title": str, "album": str, "artist": str, "file": str, "track": int, "id": int]]) -> None:
         '''Start a playlist by passing its data
 
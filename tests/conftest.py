@@ -0,0 +1,22 @@
+import os
+import sys
+import pytest
+
+# The application imports its modules from src, like main.py does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+
+def write_file(path, size):
+    '''Write a file of random bytes, creating its folders. The content is different at every write, so is its content hash'''
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(os.urandom(size))
+
+
+@pytest.fixture
+def data_manager_class(monkeypatch):
+    '''DataManager that writes every change immediately and does not need the localization files'''
+    from lib.platform import datamanager
+    monkeypatch.setattr(datamanager, "get_localization", lambda *args: {"favorites": "Favorites"})
+    monkeypatch.setattr(datamanager.DataManager, "store_flush_delay", 0)
+    return datamanager.DataManager
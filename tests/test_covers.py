@@ -0,0 +1,24 @@
+from lib.platform.covers import CoverCache
+import os
+
+
+def test_same_cover_is_saved_once(tmp_path):
+    cache = CoverCache(str(tmp_path / "covers"))
+    path = cache.save(b"front cover", "image/jpeg")
+    assert os.path.dirname(path) == cache.folder and path.endswith(".jpg")
+    with open(path, "rb") as f:
+        assert f.read() == b"front cover"
+    mtime = os.stat(path).st_mtime_ns
+    # eg. the same cover embedded in every song of an album
+    assert cache.save(b"front cover", "image/jpeg") == path
+    assert os.stat(path).st_mtime_ns == mtime
+    assert os.listdir(cache.folder) == [os.path.basename(path)]
+
+
+def test_cover_extension_follows_the_mime(tmp_path):
+    cache = CoverCache(str(tmp_path / "covers"))
+    assert cache.save(b"png", "image/PNG").endswith(".png")
+    assert cache.save(b"webp", "image/webp").endswith(".webp")
+    # Unknown or missing mime types are saved as JPEG
+    assert cache.save(b"other", "").endswith(".jpg")
+    assert len(set([cache.save(b"a", "image/jpeg"), cache.save(b"b", "image/jpeg")])) == 2
@@ -0,0 +1,143 @@
+from lib.platform import datamanager
+from lib.platform.datamanager import DataManager
+from lib.platform.scanner import LibraryRoot
+from conftest import write_file
+import os
+import pytest
+import shutil
+import threading
+import time
+
+
+@pytest.fixture
+def library(tmp_path, data_manager_class):
+    music = str(tmp_path / "music")
+    for album in range(2):
+        for track in range(3):
+            write_file(os.path.join(music, "Artist", f"Album{album}", f"{track + 1:02} - Song {album}{track}.mp3"), 3000 + album * 10 + track)
+    os.makedirs(tmp_path / "data")
+    manager = DataManager(music, str(tmp_path / "data" / "playlist.json"))
+    assert manager.check_and_run_update()
+    return music, manager
+
+
+def _song(manager, title):
+    return next(s for s in manager.get_library().get_all_songs() if s["title"] == title)
+
+
+def test_first_scan(library):
+    music, manager = library
+    songs = manager.get_library().get_all_songs()
+    assert len(songs) == 6
+    assert sorted([s["id"] for s in songs]) == list(range(6))
+    assert [g["name"] for g in manager.get_library().get_category("album")] == ["Album0", "Album1"]
+    assert not manager.check_and_run_update()
+
+
+def test_moved_song_keeps_its_id_and_playlists(library):
+    music, manager = library
+    song = _song(manager, "Song 01")
+    manager.put_data(["data", "playlist"], [{"name": "Favorites", "pinned": True, "songs": [song["id"]]}])
+    shutil.move(os.path.join(music, "Artist", "Album0"), os.path.join(music, "Artist", "Album0 renamed"))
+
+    assert manager.check_and_run_update()
+    moved = manager.get_library().get_song(song["id"])
+    assert moved["file"] == os.path.join(music, "Artist", "Album0 renamed", "02 - Song 01.mp3")
+    assert len(manager.get_library().get_all_songs()) == 6
+    assert manager.get_library().get_group("playlist", "Favorites")["songs"] == (song["id"],)
+
+
+def test_changed_and_removed_songs(library):
+    music, manager = library
+    changed = _song(manager, "Song 10")
+    removed = _song(manager, "Song 12")
+    time.sleep(0.01)
+    write_file(changed["file"], 5000)
+    os.remove(removed["file"])
+
+    assert manager.check_and_run_update()
+    library = manager.get_library()
+    assert library.get_song(changed["id"])["file"] == changed["file"]
+    assert library.get_song(removed["id"]) is None
+    assert len(library.get_all_songs()) == 5
+    assert removed["id"] not in library.get_group("album", "Album1")["songs"]
+    assert removed["id"] not in library.get_group("artist", "Artist")["songs"]
+    assert len(library.get_group("artist", "Artist")["songs"]) == 5
+    # The next song gets a new id, the removed one is not reused
+    write_file(os.path.join(music, "Artist", "Album1", "04 - Song 13.mp3"), 7000)
+    assert manager.check_and_run_update()
+    assert _song(manager, "Song 13")["id"] == 6
+
+
+def test_library_is_reloaded(library, tmp_path):
+    music, manager = library
+    manager.flush()
+    reopened = DataManager(music, str(tmp_path / "data" / "playlist.json"))
+    assert sorted([s["title"] for s in reopened.get_library().get_all_songs()]) == sorted([s["title"] for s in manager.get_library().get_all_songs()])
+    assert not reopened.check_and_run_update()
+
+
+def test_album_added_in_more_batches_keeps_the_track_order(library):
+    music, manager = library
+    files = [os.path.join(music, "Artist", "Album2", f"{track + 1:02} - Song 2{track}.mp3") for track in range(4)]
+    for k, f in enumerate(files):
+        write_file(f, 4000 + k)
+    assert manager.apply_changes(set(files[2:]), set())
+    assert manager.apply_changes(set(files[:2]), set())
+
+    library = manager.get_library()
+    assert [library.get_song(i)["title"] for i in library.get_group("album", "Album2")["songs"]] == ["Song 20", "Song 21", "Song 22", "Song 23"]
+    assert [library.get_song(i)["title"] for i in library.get_group("artist", "Artist")["songs"]][-4:] == ["Song 20", "Song 21", "Song 22", "Song 23"]
+
+
+def test_tags_are_read_without_the_lock(library, monkeypatch):
+    music, manager = library
+    reading = threading.Event()
+    release = threading.Event()
+    read_songs = datamanager.read_songs
+
+    def slow_read_songs(*args, **kwargs):
+        reading.set()
+        release.wait(5)
+        return read_songs(*args, **kwargs)
+
+    monkeypatch.setattr(datamanager, "read_songs", slow_read_songs)
+    new_song = os.path.join(music, "Artist", "Album2", "01 - Song 20.mp3")
+    write_file(new_song, 4000)
+    scan = threading.Thread(target=manager.apply_changes, args=(set([new_song]), set()))
+    scan.start()
+    assert reading.wait(5)
+    # The UI is not blocked while the file system is slow
+    writer = threading.Thread(target=manager.put_data, args=(["config", "shuffle"], True))
+    writer.start()
+    writer.join(2)
+    assert not writer.is_alive()
+    release.set()
+    scan.join()
+    assert _song(manager, "Song 20")["file"] == new_song
+
+
+def test_root_that_hangs_is_skipped(library, tmp_path, monkeypatch):
+    music, manager = library
+    manager.flush()
+    card = str(tmp_path / "card")
+    write_file(os.path.join(card, "Other", "Album", "01 - Song 30.mp3"), 6000)
+    write_file(os.path.join(music, "Artist", "Album2", "01 - Song 20.mp3"), 4000)
+    release = threading.Event()
+    is_available = LibraryRoot.is_available
+
+    def hanging_is_available(root):
+        # eg. a network share that does not answer
+        if root.path == card:
+            release.wait(5)
+        return is_available(root)
+
+    monkeypatch.setattr(LibraryRoot, "is_available", hanging_is_available)
+    monkeypatch.setattr(DataManager, "scan_root_timeout", 0.5)
+    reopened = DataManager(music, str(tmp_path / "data" / "playlist.json"), library_roots=[card])
+    started = time.monotonic()
+    assert reopened.check_and_run_update()
+    release.set()
+    assert time.monotonic() - started < 5
+    titles = [s["title"] for s in reopened.get_library().get_all_songs()]
+    assert "Song 20" in titles and "Song 30" not in titles
@@ -0,0 +1,53 @@
+from lib.platform.library import LibrarySnapshot, LIBRARY_CATEGORIES
+from lib.platform.songtable import SongTable
+import pytest
+
+
+def _songs():
+    return SongTable([{"title": "A", "album": "X", "artist": "Y", "id": 0}, None, {"title": "C", "album": "X", "artist": "Y", "id": 2}])
+
+
+def test_empty():
+    library = LibrarySnapshot()
+    assert library.generation == 0
+    assert library.get_all_songs() == []
+    assert all([library.get_category(category) == () for category in LIBRARY_CATEGORIES])
+    assert library.get_song(0) is None
+
+
+def test_next_copies_the_changes():
+    songs = _songs()
+    album = [{"name": "X", "songs": [0, 2]}]
+    library = LibrarySnapshot().next(songs, {0: 0, 2: 2}, {"album": album})
+    assert library.generation == 1
+    assert library.get_song(2)["title"] == "C"
+    assert library.get_songs([2, 1, 0]) == [songs[2], songs[0]]
+    assert [s["id"] for s in library.get_all_songs()] == [0, 2]
+    assert library.get_group("album", "X")["songs"] == (0, 2)
+    assert library.get_group("album", "Z") is None
+
+    # The writer keeps changing its data, the snapshot does not
+    songs[0]["title"] = "Changed"
+    songs.append({"title": "D", "id": 3})
+    album[0]["songs"].append(3)
+    assert library.get_song(0)["title"] == "A"
+    assert len(library.songs) == 3
+    assert library.get_group("album", "X")["songs"] == (0, 2)
+
+
+def test_snapshot_is_read_only():
+    library = LibrarySnapshot().next(_songs(), {0: 0, 2: 2}, {"album": [{"name": "X", "songs": [0, 2]}]})
+    with pytest.raises(TypeError):
+        library.get_song(0)["title"] = "Changed"
+    with pytest.raises(TypeError):
+        library.get_group("album", "X")["name"] = "Z"
+
+
+def test_next_shares_what_did_not_change():
+    first = LibrarySnapshot().next(_songs(), {0: 0, 2: 2}, {"album": [{"name": "X", "songs": [0, 2]}]})
+    second = first.next(groups={"playlist": [{"name": "Favorites", "songs": [2]}]})
+    assert second.generation == 2
+    assert second.songs is first.songs
+    assert second.get_category("album") is first.get_category("album")
+    assert second.get_group("playlist", "Favorites")["songs"] == (2,)
+    assert first.get_category("playlist") == ()
@@ -0,0 +1,84 @@
+from lib.platform.linux.library_watcher import LibraryWatcher
+from conftest import write_file
+import os
+import re
+import sys
+import threading
+import time
+import pytest
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is available only on Linux")
+
+
+def _watcher(folder, batches):
+    changed = threading.Event()
+
+    def on_changes(added, removed):
+        batches.append((added, removed))
+        changed.set()
+
+    watcher = LibraryWatcher(folder, on_changes, lambda: None, regex=re.compile(r"\.mp3$"))
+    watcher.debounce = 0.3
+    watcher.max_delay = 5
+    return watcher, changed
+
+
+def test_changes_are_debounced_in_one_batch(tmp_path):
+    folder = str(tmp_path)
+    write_file(os.path.join(folder, "old.mp3"), 100)
+    batches = []
+    watcher, changed = _watcher(folder, batches)
+    watcher.start()
+    try:
+        write_file(os.path.join(folder, "Album", "01.mp3"), 100)
+        write_file(os.path.join(folder, "02.mp3"), 100)
+        write_file(os.path.join(folder, "cover.jpg"), 100)
+        os.remove(os.path.join(folder, "old.mp3"))
+        assert changed.wait(5)
+        time.sleep(0.5)
+    finally:
+        watcher.stop()
+    assert batches == [(set([os.path.join(folder, "Album", "01.mp3"), os.path.join(folder, "02.mp3")]), set([os.path.join(folder, "old.mp3")]))]
+
+
+def test_stop_ends_the_thread(tmp_path):
+    folder = str(tmp_path)
+    batches = []
+    watcher, changed = _watcher(folder, batches)
+    watcher.debounce = 3
+    watcher.start()
+    assert watcher.is_alive()
+    write_file(os.path.join(folder, "01.mp3"), 100)
+    time.sleep(0.2)
+    watcher.stop()
+    for _ in range(30):
+        if not watcher.is_alive():
+            break
+        time.sleep(0.1)
+    assert not watcher.is_alive()
+    # The pending batch is dropped, the next scan finds it
+    write_file(os.path.join(folder, "02.mp3"), 100)
+    time.sleep(0.5)
+    assert batches == []
+
+
+def test_data_manager_stops_its_watchers(tmp_path, monkeypatch, data_manager_class):
+    from lib.platform.linux.data_manager import LinuxDataManager
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(LibraryWatcher, "debounce", 0.3)
+    music = os.path.join(str(tmp_path), "Music")
+    write_file(os.path.join(music, "Artist", "Album", "01 - Song 1.mp3"), 1000)
+    manager = LinuxDataManager(str(tmp_path / "playlist.json"))
+    assert manager.check_and_run_update()
+    changed = threading.Event()
+    assert manager.start_watcher(changed.set)
+    watchers = manager.watchers
+
+    write_file(os.path.join(music, "Artist", "Album", "02 - Song 2.mp3"), 2000)
+    assert changed.wait(5)
+    assert sorted([s["title"] for s in manager.get_library().get_all_songs()]) == ["Song 1", "Song 2"]
+
+    manager.stop_watcher()
+    assert manager.watchers is None
+    time.sleep(1.5)
+    assert not any([watcher.is_alive() for watcher in watchers])
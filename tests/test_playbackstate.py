@@ -0,0 +1,46 @@
+from lib.platform.playbackstate import PlaybackState, PLAYBACK_STATE_SIZE, PLAYBACK_STATE_TEXT_SIZE
+import os
+
+
+def test_round_trip(tmp_path):
+    file_name = str(tmp_path / "playlist.state")
+    state = PlaybackState(file_name)
+    state.save(12, 3456, "album", "Nevermind")
+    state.save(position=4000)
+    assert os.path.getsize(file_name) == PLAYBACK_STATE_SIZE
+
+    loaded = PlaybackState(file_name)
+    assert loaded.load()
+    assert (loaded.song_id, loaded.position, loaded.playlist, loaded.playlist_name, loaded.sequence) == (12, 4000, "album", "Nevermind", 2)
+
+
+def test_long_names_are_truncated_on_a_character(tmp_path):
+    file_name = str(tmp_path / "playlist.state")
+    PlaybackState(file_name).save(1, 0, "playlist", "è" * PLAYBACK_STATE_TEXT_SIZE)
+    loaded = PlaybackState(file_name)
+    assert loaded.load()
+    assert loaded.playlist_name == "è" * (PLAYBACK_STATE_TEXT_SIZE // 2)
+
+
+def test_missing_file_uses_the_fallback(tmp_path):
+    state = PlaybackState(str(tmp_path / "playlist.state"))
+    assert not state.load({"last_song": "7", "last_song_time": 1500, "last_playlist": "artist", "last_playlist_name": "Queen"})
+    assert (state.song_id, state.position, state.playlist, state.playlist_name) == (7, 1500, "artist", "Queen")
+    state = PlaybackState(str(tmp_path / "playlist.state"))
+    assert not state.load({"last_song": "", "last_song_time": -1})
+    assert state.song_id == -1
+
+
+def test_corrupted_file_is_ignored(tmp_path):
+    file_name = str(tmp_path / "playlist.state")
+    PlaybackState(file_name).save(12, 3456, "album", "Nevermind")
+    with open(file_name, "r+b") as f:
+        f.seek(30)
+        f.write(b"\xff")
+    state = PlaybackState(file_name)
+    assert not state.load({"last_song": "3", "last_song_time": 10})
+    assert state.song_id == 3
+
+    with open(file_name, "wb") as f:
+        f.write(b"NMPS")
+    assert not PlaybackState(file_name).load()
@@ -0,0 +1,113 @@
+from lib.platform import scanner
+from lib.platform.scanner import FingerprintCache, LibraryRoot, read_songs
+from conftest import write_file
+import os
+import re
+import shutil
+import time
+
+_regex = re.compile(r"\.mp3$")
+
+
+def test_fingerprints(tmp_path):
+    song = str(tmp_path / "a.mp3")
+    write_file(song, 1000)
+    cache = FingerprintCache(str(tmp_path / "fingerprints.json"))
+    assert not cache.has(song)
+    assert not cache.is_changed(song, os.stat(song))
+    cache.update(song, os.stat(song))
+    cache.set_content_hash(song, FingerprintCache.content_hash(song, 1000))
+    cache.save()
+
+    loaded = FingerprintCache(str(tmp_path / "fingerprints.json"))
+    assert loaded.has(song)
+    assert not loaded.is_changed(song, os.stat(song))
+    assert loaded.sizes() == {1000}
+    write_file(song, 1001)
+    assert loaded.is_changed(song, os.stat(song))
+    loaded.remove(song)
+    assert not loaded.has(song)
+
+
+def test_content_hash_follows_the_content(tmp_path):
+    song = str(tmp_path / "a.mp3")
+    write_file(song, 20000)
+    content_hash = FingerprintCache.content_hash(song, 20000)
+    moved = str(tmp_path / "moved" / "b.mp3")
+    os.makedirs(os.path.dirname(moved))
+    shutil.move(song, moved)
+    assert FingerprintCache.content_hash(moved, 20000) == content_hash
+    write_file(moved, 20000)
+    assert FingerprintCache.content_hash(moved, 20000) != content_hash
+
+
+def _root(tmp_path):
+    root = LibraryRoot(str(tmp_path / "music"), str(tmp_path / "playlist"))
+    for name, size in [("old.mp3", 1000), ("changed.mp3", 1100), ("unknown.mp3", 1200), ("moved.mp3", 1300)]:
+        write_file(os.path.join(root.path, "Artist", name), size)
+    for name in ["old.mp3", "changed.mp3", "moved.mp3"]:
+        file = os.path.join(root.path, "Artist", name)
+        root.fingerprints.update(file, os.stat(file))
+    root.save()
+    return root
+
+
+def test_scan_finds_every_kind_of_file(tmp_path):
+    root = _root(tmp_path)
+    old = set([os.path.join(root.path, "Artist", name) for name in ["old.mp3", "changed.mp3", "unknown.mp3", "moved.mp3"]])
+    time.sleep(0.01)
+    write_file(os.path.join(root.path, "Artist", "changed.mp3"), 1101)
+    os.makedirs(os.path.join(root.path, "Other"))
+    shutil.move(os.path.join(root.path, "Artist", "moved.mp3"), os.path.join(root.path, "Other", "moved.mp3"))
+    for k in range(5):
+        write_file(os.path.join(root.path, "New", f"{k}.mp3"), 2000 + k)
+    write_file(os.path.join(root.path, "New", "cover.jpg"), 10)
+
+    batches = []
+    result = root.scan(_regex, old, {1000, 1100, 1200, 1300}, lambda files: batches.append(set(files)), 2, 4)
+    all_files, new_files, maybe_moved_files, changed_files, unknown_files = result
+    path = lambda *names: os.path.join(root.path, *names)
+    assert len(all_files) == 9
+    assert maybe_moved_files == {path("Other", "moved.mp3")}
+    assert changed_files == {path("Artist", "changed.mp3")}
+    assert unknown_files == {path("Artist", "unknown.mp3")}
+    # The new files are passed in growing batches, the last ones are returned
+    assert [len(b) for b in batches] == [2]
+    assert set().union(new_files, *batches) == set([path("New", f"{k}.mp3") for k in range(5)])
+
+
+def test_scan_of_a_missing_root(tmp_path):
+    root = _root(tmp_path)
+    shutil.rmtree(root.path)
+    assert not root.is_available()
+    assert root.scan(_regex, set(), set(), lambda files: None, 2, 4) is None
+
+
+def _fake_read(delays):
+    def read_song(file, music_folder, with_picture=False):
+        time.sleep(delays[file])
+        return {"title": file, "album": "", "artist": "", "track": 0, "file": file, "duration": 0}
+    return read_song
+
+
+def test_read_songs_timeout_starts_with_the_read(monkeypatch):
+    # With one worker the reads queue up: every read is shorter than the timeout, all of them together are not
+    delays = {f"{k}": 0.05 for k in range(8)}
+    monkeypatch.setattr(scanner, "read_song", _fake_read(delays))
+    songs = read_songs(list(delays), "/", lambda files: "image", workers=1, timeout=0.2)
+    assert sorted([s["title"] for s in songs]) == sorted(delays)
+    assert [s["id"] for s in songs] == list(range(8))
+
+
+def test_read_songs_skips_the_slow_reads(monkeypatch):
+    delays = {"slow": 2, "a": 0.01, "b": 0.01}
+    monkeypatch.setattr(scanner, "read_song", _fake_read(delays))
+    start = time.monotonic()
+    songs = read_songs(list(delays), "/", lambda files: "image", workers=2, timeout=0.2)
+    assert sorted([s["title"] for s in songs]) == ["a", "b"]
+    assert time.monotonic() - start < 1.5
+
+    # When every worker is stuck the files not read yet are skipped too
+    delays = {"slow1": 2, "slow2": 2, "a": 0.01}
+    monkeypatch.setattr(scanner, "read_song", _fake_read(delays))
+    assert read_songs(list(delays), "/", lambda files: "image", workers=2, timeout=0.2) == []
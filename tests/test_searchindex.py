@@ -0,0 +1,104 @@
+from lib.platform.searchindex import SearchIndex, MultiFieldSearchIndex, IncrementalSearch, SearchCancelled, normalise
+from lib.platform.vectorsearch import VECTOR_SEARCH_AVAILABLE
+from nltk.metrics.distance import jaro_winkler_similarity
+import random
+import pytest
+
+_syllables = ["la", "ve", "mo", "ri", "ta", "ne", "so", "ka", "lu", "di", "ba", "che", "tro", "ma", "ni"]
+
+
+@pytest.fixture(params=[False, True] if VECTOR_SEARCH_AVAILABLE else [False], ids=lambda vectorized: "numpy" if vectorized else "python")
+def vectorized(request, monkeypatch):
+    monkeypatch.setattr(SearchIndex, "vectorized", request.param)
+    return request.param
+
+
+def _library(count=400, seed=1):
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choice(_syllables) for _ in range(rng.randint(1, 3))) for _ in range(200)]
+    return [{"title": " ".join(rng.choices(vocabulary, k=rng.randint(1, 4))), "artist": " ".join(rng.choices(vocabulary, k=2)),
+             "album": " ".join(rng.choices(vocabulary, k=rng.randint(1, 2))), "id": i} for i in range(count)]
+
+
+def _full_scan_ranks(query, songs, field):
+    # The rank of the search before the index: for every word 1 - the best similarity with the start of a word of the song
+    words = normalise(query)
+    return [sum([1 - max([jaro_winkler_similarity(w, o[:len(w)], max_l=2) for o in normalise(s[field])], default=0.0) for w in words]) for s in songs]
+
+
+def test_normalise():
+    assert normalise("  Hello  World ") == ["hello", "world"]
+
+
+def test_exact_title_is_found(vectorized):
+    songs = _library()
+    index = SearchIndex(songs)
+    for song in songs[:15]:
+        # Every song whose words start with the query words has rank 0, the first in the list comes first
+        first = next(s for s, rank in zip(songs, _full_scan_ranks(song["title"], songs, "title")) if rank == 0)
+        assert index.search(song["title"], 3)[0] is first
+
+
+def test_ranks_match_the_full_scan(vectorized):
+    songs = _library()
+    index = SearchIndex(songs)
+    for query in ["lave", "chetro ma", "rila", "tami", "x"]:
+        ranks = _full_scan_ranks(query, songs, "title")
+        found = index.search(query, 5)
+        expected = sorted(ranks)[:len(found)]
+        assert [ranks[s["id"]] for s in found] == pytest.approx(expected)
+
+
+def test_empty_query_and_top(vectorized):
+    songs = _library(20)
+    assert SearchIndex(songs).search("", 3) == songs[:3]
+    assert SearchIndex(songs).search("la", 0) == []
+    assert MultiFieldSearchIndex(songs).search("", 2) == [(songs[0], "title"), (songs[1], "title")]
+
+
+def test_multi_field_matches_the_best_field(vectorized):
+    songs = [{"title": "yellow submarine", "artist": "beatles", "album": "revolver", "id": 0},
+             {"title": "help", "artist": "beatles", "album": "help", "id": 1},
+             {"title": "paranoid", "artist": "black sabbath", "album": "paranoid", "id": 2}]
+    index = MultiFieldSearchIndex(songs)
+    assert index.search("paranoid", 1) == [(songs[2], "title")]
+    assert index.search("sabbath", 1) == [(songs[2], "artist")]
+    assert index.search("revolver", 1) == [(songs[0], "album")]
+    assert index.search("help beatles", 2) == [(songs[1], "title"), (songs[0], "artist")]
+
+
+def test_field_weights(vectorized):
+    songs = [{"title": "other", "artist": "queen", "album": "x", "id": 0},
+             {"title": "queen", "artist": "other", "album": "x", "id": 1}]
+    assert MultiFieldSearchIndex(songs).search("queen", 2)[0][0]["id"] == 1
+    assert MultiFieldSearchIndex(songs, {"title": 0.5, "artist": 1.0}).search("queen", 2)[0][0]["id"] == 0
+
+
+def test_indexes_are_reused():
+    songs = _library(50)
+    title = SearchIndex(songs, "title")
+    index = MultiFieldSearchIndex(songs, indexes={"title": title, "artist": SearchIndex(songs[:10], "artist")})
+    assert index.indexes["title"] is title
+    assert index.indexes["artist"].songs is songs
+    assert MultiFieldSearchIndex(songs).indexes["title"] is not title
+
+
+def test_incremental_search_while_typing(vectorized):
+    songs = _library()
+    search = IncrementalSearch(MultiFieldSearchIndex(songs))
+    target = songs[7]
+    query = target["title"] + " " + target["artist"]
+    for k in range(1, len(query) + 1):
+        results = search.search(query[:k], 5)
+        assert len(results) == 5
+    assert results[0][0] is target
+    # Deleting letters searches the changed words again
+    assert search.search(target["title"], 5) == MultiFieldSearchIndex(songs).search(target["title"], 5)
+    assert search.search("", 2) == [(songs[0], "title"), (songs[1], "title")]
+
+
+def test_cancelled_search(vectorized):
+    search = IncrementalSearch(MultiFieldSearchIndex(_library()))
+    with pytest.raises(SearchCancelled):
+        search.search("la ve", 5, cancelled=lambda: True)
+    assert len(search.search("la ve", 5, cancelled=lambda: False)) == 5
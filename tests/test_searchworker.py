@@ -0,0 +1,51 @@
+from lib.platform.library import LibrarySnapshot
+from lib.platform.searchworker import SearchWorker
+from lib.platform.songtable import SongTable
+from threading import Event
+
+
+def _library(generation_titles):
+    library = LibrarySnapshot()
+    for titles in generation_titles:
+        songs = SongTable([{"title": t, "artist": "", "album": "", "id": i} for i, t in enumerate(titles)])
+        library = library.next(songs, {i: i for i in range(len(titles))})
+    return library
+
+
+def _worker():
+    results = {}
+    done = Event()
+
+    def on_results(sequence, found):
+        results[sequence] = found
+        done.set()
+    return SearchWorker(on_results), results, done
+
+
+def test_results_of_the_last_query():
+    worker, results, done = _worker()
+    library = _library([["yellow submarine", "help", "paranoid"]])
+    sequence = worker.submit("help", library)
+    assert done.wait(10)
+    assert not worker.is_stale(sequence)
+    assert results[sequence][0][0]["title"] == "help"
+    worker.stop()
+
+
+def test_index_follows_the_generation():
+    worker, results, done = _worker()
+    worker.submit("help", _library([["help"]]))
+    assert done.wait(10)
+    done.clear()
+    sequence = worker.submit("paranoid", _library([["help"], ["help", "paranoid"]]))
+    assert done.wait(10)
+    assert results[sequence][0][0]["title"] == "paranoid"
+    worker.stop()
+
+
+def test_cancel_makes_the_query_stale():
+    worker, results, done = _worker()
+    sequence = worker.submit("help", _library([["help"]]))
+    worker.cancel()
+    assert worker.is_stale(sequence)
+    worker.stop()
@@ -0,0 +1,83 @@
+from array import array
+from lib.platform.songtable import SongTable
+import marshal
+import pytest
+
+
+def _songs():
+    return [
+        {"title": "Song 1", "album": "Album", "artist": "Artist", "track": 1, "file": "/music/Artist/Album/01.mp3", "duration": 200, "image": "/music/Artist/Album/cover.jpg", "id": 0},
+        None,
+        {"title": "Song 2", "album": "Album", "artist": "Artist", "track": 2, "file": "C:\\music\\Album\\02.mp3", "duration": 180, "image": "assets/gelbe_Note.png", "id": 2},
+        {"title": "Other", "album": "Other", "artist": "Someone", "track": "A1", "file": "/music/other.flac", "duration": 5.5, "image": "", "id": 3, "extra": [1, 2]},
+    ]
+
+
+def test_round_trip():
+    table = SongTable(_songs())
+    assert len(table) == 4
+    assert table.to_list() == _songs()
+    assert table == _songs()
+    assert table[1] is None
+    assert table[-1]["extra"] == [1, 2]
+
+
+def test_row_without_id_is_not_a_tombstone():
+    table = SongTable([{"title": "a", "file": "/x/a.mp3"}])
+    assert table[0] is not None
+    assert dict(table[0]) == {"title": "a", "file": "/x/a.mp3"}
+    table[0] = None
+    assert table[0] is None
+    table[0] = {"title": "b"}
+    assert dict(table[0]) == {"title": "b"}
+
+
+def test_row_view_writes_the_columns():
+    table = SongTable(_songs())
+    row = table[0]
+    row["title"] = "Renamed"
+    row["album"] = "Other"
+    del row["duration"]
+    assert table[0]["title"] == "Renamed"
+    assert table[0]["album"] == "Other"
+    assert "duration" not in table[0]
+    with pytest.raises(KeyError):
+        table[0]["duration"]
+    table.append({"title": "New", "id": 4})
+    assert table[4].copy() == {"title": "New", "id": 4}
+
+
+def test_compact_and_copy():
+    table = SongTable(_songs())
+    assert table.compact().to_list() == [s for s in _songs() if s is not None]
+    snapshot = table.copy(read_only=True)
+    table[0]["title"] = "Changed"
+    assert snapshot[0]["title"] == "Song 1"
+    with pytest.raises(TypeError):
+        snapshot[0]["title"] = "Changed"
+    with pytest.raises(TypeError):
+        snapshot.append({"id": 5})
+
+
+def test_columns_round_trip():
+    table = SongTable(_songs())
+    loaded = SongTable.from_columns(marshal.loads(marshal.dumps(table.to_columns())))
+    assert loaded.to_list() == _songs()
+    loaded.append({"title": "New", "album": "Album", "id": 4})
+    assert loaded[4]["album"] == "Album"
+
+
+def test_columns_of_another_version():
+    columns = list(SongTable(_songs()).to_columns())
+    columns[0] = 99
+    with pytest.raises(ValueError):
+        SongTable.from_columns(tuple(columns))
+
+
+def test_columns_of_version_1():
+    # In version 1 a song without an id was a tombstone
+    columns = list(SongTable([{"title": "a", "id": 0}, None]).to_columns())
+    columns[0] = 1
+    columns[1] = dict(columns[1], id=array("q", [0, -(2 ** 62)]).tobytes())
+    loaded = SongTable.from_columns(tuple(columns))
+    assert loaded.to_list() == [{"title": "a", "id": 0}, None]
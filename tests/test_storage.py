@@ -0,0 +1,178 @@
+from lib.platform.storage import open_store, to_json, BinarySnapshot, JournalStore
+from lib.platform.songtable import SongTable
+import json
+import os
+import pytest
+
+
+def _song(i, album="Album"):
+    return {"title": f"Song {i}", "album": album, "artist": "Artist", "track": i, "file": f"/music/{album}/{i:02}.mp3", "duration": 100 + i, "image": "", "id": i}
+
+
+def _fill(store):
+    store.put("data", songs=[_song(i) for i in range(4)], artist=[{"name": "Artist", "songs": [0, 1, 2, 3]}],
+              album=[{"name": "Album", "songs": [0, 1, 2, 3]}], playlist=[{"name": "Favorites", "pinned": True, "songs": []}], next_song_id=4)
+    store.put("config", base_path="/music", shuffle=True, last_data={"last_song": "", "last_song_time": -1})
+
+
+def _change(store):
+    data = store["data"]
+    data["songs"][1]["title"] = "Renamed"
+    data["songs"].append(_song(4, "Other"))
+    data["next_song_id"] = 5
+    data["album"].append({"name": "Other", "songs": [4]})
+    data["artist"][0]["songs"].append(4)
+    data["playlist"][0]["songs"].append(1)
+    store.changed(["data", "songs", 1], ["data", "songs", 4], ["data", "next_song_id"], ["data", "album", 1], ["data", "artist", 0], ["data", "playlist", 0])
+    store.put_path(["config", "last_data", "last_song_time"], 42)
+    # The first album becomes empty
+    del data["album"][0]
+    store.removed(["data", "album", 0])
+
+
+def _plain(store):
+    return json.loads(to_json({key: store[key] for key in ["data", "config"]}))
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite", "journal"])
+def test_round_trip(tmp_path, backend):
+    file_name = str(tmp_path / "playlist.json")
+    store = open_store(file_name, backend, flush_delay=0)
+    _fill(store)
+    _change(store)
+    store.flush()
+    expected = _plain(store)
+    assert expected["data"]["album"] == [{"name": "Other", "songs": [4]}]
+    assert expected["config"]["last_data"]["last_song_time"] == 42
+
+    reopened = open_store(file_name, backend, flush_delay=0)
+    assert _plain(reopened) == expected
+
+
+def test_sqlite_imports_and_removes_the_json(tmp_path):
+    file_name = str(tmp_path / "playlist.json")
+    legacy = open_store(file_name, "json", flush_delay=0)
+    _fill(legacy)
+    expected = _plain(legacy)
+
+    store = open_store(file_name, "sqlite", flush_delay=0)
+    assert _plain(store) == expected
+    assert not os.path.exists(file_name)
+    assert _plain(open_store(file_name, "sqlite", flush_delay=0)) == expected
+
+
+def test_sqlite_keys_are_not_patterns(tmp_path):
+    file_name = str(tmp_path / "playlist.json")
+    store = open_store(file_name, "sqlite", flush_delay=0)
+    store.put("config", **{"a_b": {"x": 1}, "aXb": {"y": 2}, "a%": {"z": 3}, "ab": {"w": 4}})
+    store.put_path(["config", "a_b"], {"x": 5})
+    store.put_path(["config", "a%"], {"z": 6})
+    assert open_store(file_name, "sqlite", flush_delay=0)["config"] == {"a_b": {"x": 5}, "aXb": {"y": 2}, "a%": {"z": 6}, "ab": {"w": 4}}
+
+
+def test_write_behind_coalesces(tmp_path):
+    file_name = str(tmp_path / "playlist.json")
+    store = open_store(file_name, "json", flush_delay=60)
+    _fill(store)
+    store.flush()
+    store["data"]["songs"][0]["title"] = "Renamed"
+    store.changed(["data", "songs", 0])
+    with open(file_name) as f:
+        assert json.load(f)["data"]["songs"][0]["title"] == "Song 0"
+    store.flush()
+    with open(file_name) as f:
+        assert json.load(f)["data"]["songs"][0]["title"] == "Renamed"
+
+
+def test_binary_snapshot_follows_the_json(tmp_path):
+    file_name = str(tmp_path / "playlist.json")
+    store = open_store(file_name, "json", flush_delay=0)
+    _fill(store)
+    store.flush()
+    snapshot = BinarySnapshot(str(tmp_path / "playlist.snapshot"))
+    store["data"]["songs"] = SongTable(store["data"]["songs"])
+    store.changed(["data", "songs"])
+    store.flush()
+    data = snapshot.load(file_name)
+    assert isinstance(data["data"]["songs"], SongTable)
+    assert json.loads(to_json(data)) == _plain(store)
+
+    # A JSON file changed by someone else is never shadowed by the snapshot
+    with open(file_name, "w") as f:
+        json.dump({"data": {"songs": []}}, f)
+    assert snapshot.load(file_name) is None
+
+
+def test_journal_appends_only_the_changes(tmp_path):
+    file_name = str(tmp_path / "playlist.json")
+    store = JournalStore(file_name, flush_delay=0)
+    _fill(store)
+    store.compact()
+    assert os.path.getsize(store.journal_file_name) == 0
+    snapshot_size = os.path.getsize(file_name)
+
+    _change(store)
+    with open(store.journal_file_name) as f:
+        records = [json.loads(line) for line in f]
+    assert os.path.getsize(store.journal_file_name) < snapshot_size
+    assert {"path": ["data", "album", 0], "remove": True} in records
+    # The changed groups are written, not the whole lists
+    assert not any([r["path"] in (["data"], ["data", "album"], ["data", "artist"], ["data", "songs"]) for r in records])
+
+    replayed = JournalStore(file_name, flush_delay=0)
+    assert _plain(replayed) == _plain(store)
+
+
+def test_journal_removals_move_the_pending_changes(tmp_path):
+    file_name = str(tmp_path / "playlist.json")
+    store = JournalStore(file_name, flush_delay=60)
+    _fill(store)
+    store.flush()
+    groups = store["data"]["playlist"]
+    groups.extend([{"name": "A", "songs": [1]}, {"name": "B", "songs": [2]}])
+    store.changed(["data", "playlist", 1], ["data", "playlist", 2])
+    groups[2]["songs"].append(3)
+    store.changed(["data", "playlist", 2])
+    del groups[1]
+    store.removed(["data", "playlist", 1])
+    store.flush()
+    assert _plain(JournalStore(file_name, flush_delay=0)) == _plain(store)
+
+
+def test_journal_discards_a_torn_record(tmp_path):
+    file_name = str(tmp_path / "playlist.json")
+    store = JournalStore(file_name, flush_delay=0)
+    _fill(store)
+    store.put_path(["config", "shuffle"], False)
+    expected = _plain(store)
+    with open(store.journal_file_name, "a") as f:
+        f.write('{"path": ["config", "shuffle"], "val')
+
+    replayed = JournalStore(file_name, flush_delay=0)
+    assert _plain(replayed) == expected
+    # The torn record is dropped by the compaction at startup
+    with open(replayed.journal_file_name) as f:
+        assert f.read() == ""
+    assert _plain(JournalStore(file_name, flush_delay=0)) == expected
+
+
+def test_journal_skips_the_journals_of_an_interrupted_compaction(tmp_path):
+    file_name = str(tmp_path / "playlist.json")
+    store = JournalStore(file_name, flush_delay=0)
+    store.put("data", playlist=[{"name": "a"}, {"name": "b"}, {"name": "c"}])
+    store.compact()
+    del store["data"]["playlist"][0]
+    store.removed(["data", "playlist", 0])
+    store.flush()
+    with open(store.journal_file_name) as f:
+        journal = f.read()
+    store.compact()
+    # A crash after the snapshot was written, before the old journal was removed
+    with open(store.journal_file_name + ".2.old", "w") as f:
+        f.write(journal)
+
+    replayed = JournalStore(file_name, flush_delay=0)
+    assert [p["name"] for p in replayed["data"]["playlist"]] == ["b", "c"]
+    assert "__journal_generation__" not in replayed
+    assert not os.path.exists(store.journal_file_name + ".2.old")
+    assert [p["name"] for p in JournalStore(file_name, flush_delay=0)["data"]["playlist"]] == ["b", "c"]
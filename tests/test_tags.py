@@ -0,0 +1,65 @@
+from lib.platform.tags import read_tags
+from conftest import write_file
+from mutagen.flac import FLAC, Picture
+from mutagen.wave import WAVE
+from mutagen.id3 import ID3, TIT2, TPE1, TALB, TRCK, APIC
+import struct
+import wave
+import pytest
+
+
+def _flac(path):
+    # Only the STREAMINFO block: 44100 Hz, 2 channels, 16 bits, 441000 samples (10 seconds)
+    info = struct.pack(">HH", 4096, 4096) + b"\0" * 6 + ((44100 << 44) | (1 << 41) | (15 << 36) | 441000).to_bytes(8, "big") + b"\0" * 16
+    with open(path, "wb") as f:
+        f.write(b"fLaC" + bytes([0x80]) + len(info).to_bytes(3, "big") + info)
+    audio = FLAC(path)
+    audio.update({"title": "Title", "artist": "Artist", "album": "Album", "tracknumber": "3/12"})
+    for kind, data in [(0, b"other"), (3, b"front")]:
+        picture = Picture()
+        picture.type, picture.mime, picture.data = kind, "image/png", data
+        audio.add_picture(picture)
+    audio.save()
+    return path
+
+
+def test_flac_tags(tmp_path):
+    file = _flac(str(tmp_path / "song.flac"))
+    assert read_tags(file) == {"title": "Title", "artist": "Artist", "album": "Album", "track": 3, "duration": 10000}
+    # The front cover is preferred
+    assert read_tags(file, with_picture=True)["picture"] == ("image/png", b"front")
+
+
+def test_wav_tags(tmp_path):
+    file = str(tmp_path / "song.wav")
+    with wave.open(file, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(8000)
+        w.writeframes(b"\0\0" * 4000)
+    audio = WAVE(file)
+    audio.add_tags()
+    audio.tags.add(TIT2(encoding=3, text="Title"))
+    audio.tags.add(TRCK(encoding=3, text="7"))
+    audio.save()
+    assert read_tags(file, with_picture=True) == {"title": "Title", "track": 7, "duration": 500}
+
+
+def test_mp3_with_only_the_tags(tmp_path):
+    # No audio frames: the tags are read anyway and the duration is unknown
+    file = str(tmp_path / "song.mp3")
+    tags = ID3()
+    for frame in [TIT2(encoding=3, text="Title"), TPE1(encoding=3, text="Artist"), TALB(encoding=3, text=""), TRCK(encoding=3, text="x")]:
+        tags.add(frame)
+    tags.add(APIC(encoding=3, mime="image/jpeg", type=3, desc="front", data=b"front"))
+    tags.save(file)
+    # The empty album and the track that is not a number are missing
+    assert read_tags(file) == {"title": "Title", "artist": "Artist", "duration": 0}
+    assert read_tags(file, with_picture=True)["picture"] == ("image/jpeg", b"front")
+
+
+def test_file_without_tags(tmp_path):
+    file = str(tmp_path / "song.mp3")
+    write_file(file, 1000)
+    with pytest.raises(Exception):
+        read_tags(file)
@@ -0,0 +1,73 @@
+from lib.platform import thumbnails
+from lib.platform.thumbnails import ThumbnailCache, THUMBNAIL_SIZES
+from PIL import Image
+import os
+import threading
+import time
+
+
+def _image(path, size=(2000, 1000)):
+    Image.new("RGB", size, (200, 100, 50)).save(path, "JPEG")
+    return path
+
+
+def test_thumbnails_are_created_once(tmp_path, monkeypatch):
+    cache = ThumbnailCache(str(tmp_path / "thumbnails"))
+    source = _image(str(tmp_path / "cover.jpg"))
+    thumbnail = cache.get_thumbnail(source, 100)
+    with Image.open(thumbnail) as image:
+        assert image.size == (128, 64)
+    assert len(os.listdir(cache.folder)) == len(THUMBNAIL_SIZES)
+    with Image.open(cache.get_thumbnail(source, 300)) as image:
+        assert image.size == (512, 256)
+    # Bigger than every size: the biggest thumbnail
+    with Image.open(cache.get_thumbnail(source, 5000)) as image:
+        assert image.size == (1024, 512)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("decoded again")
+
+    monkeypatch.setattr(thumbnails.Image, "open", fail)
+    assert cache.get_thumbnail(source, 100) == thumbnail
+
+
+def test_changed_image_is_decoded_again(tmp_path):
+    cache = ThumbnailCache(str(tmp_path / "thumbnails"))
+    source = _image(str(tmp_path / "cover.jpg"))
+    thumbnail = cache.get_thumbnail(source, 100)
+    time.sleep(0.01)
+    _image(source, (100, 400))
+    changed = cache.get_thumbnail(source, 100)
+    assert changed != thumbnail
+    with Image.open(changed) as image:
+        assert image.size == (32, 128)
+
+
+def test_unreadable_image_is_returned_as_it_is(tmp_path):
+    cache = ThumbnailCache(str(tmp_path / "thumbnails"))
+    source = str(tmp_path / "cover.jpg")
+    assert cache.get_thumbnail(source, 100) == source
+    with open(source, "wb") as f:
+        f.write(b"not an image")
+    assert cache.get_thumbnail(source, 100) == source
+    assert os.listdir(cache.folder) == []
+
+
+def test_missing_thumbnail_is_created_in_background(tmp_path):
+    cache = ThumbnailCache(str(tmp_path / "thumbnails"))
+    source = _image(str(tmp_path / "cover.jpg"))
+    created = []
+    done = threading.Event()
+
+    def on_created(thumbnail):
+        created.append((thumbnail, threading.current_thread()))
+        done.set()
+
+    assert cache.get_thumbnail(source, 100, on_created) is None
+    assert done.wait(5)
+    thumbnail, thread = created[0]
+    assert thread is not threading.current_thread()
+    assert os.path.exists(thumbnail)
+    # Already created: returned at once, on_created is not called
+    assert cache.get_thumbnail(source, 100, on_created) == thumbnail
+    assert len(created) == 1
@@ -0,0 +1,61 @@
+from lib.platform.searchindex import SearchIndex, MultiFieldSearchIndex, IncrementalSearch
+from lib.platform.vectorsearch import encode_tokens, encode_groups, group_max, start_similarities, top_rows, union_rows, VECTOR_TOKEN_WIDTH
+from nltk.metrics.distance import jaro_winkler_similarity
+import random
+import pytest
+
+np = pytest.importorskip("numpy")
+
+
+def _words(rng, count):
+    return ["".join(rng.choice("abcdeèlmnorst") for _ in range(rng.randint(1, 12))) for _ in range(count)]
+
+
+def test_jaro_winkler_same_of_nltk():
+    rng = random.Random(1)
+    tokens = _words(rng, 1000) + ["a" * 40]
+    codes, lengths = encode_tokens(tokens)
+    for word in _words(rng, 60) + ["a", "ab", "ba", "a" * VECTOR_TOKEN_WIDTH]:
+        values = start_similarities(word, codes, lengths)
+        assert values.tolist() == [jaro_winkler_similarity(word, t[:len(word)], max_l=2) for t in tokens]
+
+
+def test_groups():
+    flat, starts = encode_groups([[0, 2], [], [1], [2, 1, 0]])
+    assert flat.tolist() == [0, 2, 1, 2, 1, 0]
+    assert starts.tolist() == [0, 2, 2, 3, 6]
+    rows = np.array([3, 1, 0])
+    assert group_max({0: 0.5, 1: 0.25}, 3, flat, starts, rows).tolist() == [0.5, 0.0, 0.5]
+    assert union_rows([np.array([3, 1]), np.array([1, 0])]).tolist() == [0, 1, 3]
+    assert union_rows([]).tolist() == []
+
+
+def test_top_rows_keeps_the_ties_in_list_order():
+    # Two fields (eg. title and artist) for one query word, 6 candidate songs out of 10
+    rows = np.array([1, 2, 4, 5, 7, 9])
+    title = np.array([0.9, 0.5, 0.9, 0.2, 0.9, 0.0])
+    artist = np.array([0.1, 0.8, 0.1, 0.3, 0.1, 0.0])
+    assert top_rows([[title, artist]], rows, 10, 2) == [(1, 0), (4, 0)]
+    assert top_rows([[title, artist]], rows, 10, 4) == [(1, 0), (4, 0), (7, 0), (2, 1)]
+    # The songs that match no word follow in list order
+    assert top_rows([[title, artist]], rows, 10, 8) == [(1, 0), (4, 0), (7, 0), (2, 1), (5, 1), (0, 0), (3, 0), (6, 0)]
+
+
+def _library(rng, count):
+    vocabulary = _words(rng, count // 2)
+    return [{"title": " ".join(rng.choices(vocabulary, k=rng.randint(1, 4))), "artist": " ".join(rng.choices(vocabulary, k=2)),
+             "album": " ".join(rng.choices(vocabulary, k=rng.randint(0, 2))), "id": i} for i in range(count)]
+
+
+def test_same_results_with_and_without_numpy(monkeypatch):
+    rng = random.Random(2)
+    songs = _library(rng, 600)
+    monkeypatch.setattr(SearchIndex, "vectorized", False)
+    python = IncrementalSearch(MultiFieldSearchIndex(songs))
+    monkeypatch.setattr(SearchIndex, "vectorized", True)
+    vectorized = IncrementalSearch(MultiFieldSearchIndex(songs))
+    queries = [" ".join(w[:rng.randint(1, len(w))] for w in rng.choice(songs)["title"].split(" ")[:2]) for _ in range(20)] + ["zzzz", "a b"]
+    for query in queries:
+        for k in range(1, len(query) + 1):
+            for top, accepted_percentage in [(5, 1), (8, 0.3), (3, 0.05)]:
+                assert vectorized.search(query[:k], top, accepted_percentage) == python.search(query[:k], top, accepted_percentage)